@@ -0,0 +1,35 @@
+import sys
+import argparse
+from storage.ledgerpartitions import PartitionedLedgerRepository
+from storage.ledgerarchive import LedgerArchive
+from utils.config import Config
+
+def archive(months=None, codec=None):
+    """ Compress the ledger partitions of old months into archives, returns (success, message) """
+    ledger = PartitionedLedgerRepository()
+    try:
+        return ledger.archive(months, codec)
+    finally:
+        ledger.close()
+
+def main():
+    """ Entry point: python Tam-Bank/archive.py [--months N] [--codec zlib|lzma] """
+    parser = argparse.ArgumentParser(description="Compress the .csv ledger partitions of closed months into "
+                                                 "block-indexed archives, reads of their transactions stay the same. "
+                                                 "Only the csv storage backend keeps a partitioned ledger.")
+    parser.add_argument("--months", type=int, default=None,
+                        help=f"archive the months that ended more than this many months ago, "
+                             f"defaults to TAMBANK_LEDGER_ARCHIVE_MONTHS ({Config.ledgerArchiveMonths})")
+    parser.add_argument("--codec", choices=tuple(LedgerArchive.codecs), default=None,
+                        help=f"compression, defaults to TAMBANK_LEDGER_ARCHIVE_CODEC ({Config.ledgerArchiveCodec})")
+    args = parser.parse_args()
+    if args.months is not None and args.months < 0:
+        parser.error("--months cannot be negative")
+
+    success, message = archive(args.months, args.codec)
+    print(message)
+    if not success:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
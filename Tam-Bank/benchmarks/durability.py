@@ -0,0 +1,65 @@
+import os
+import sys
+import csv
+import time
+import argparse
+
+# run as python Tam-Bank/benchmarks/durability.py, the bank's packages are imported from Tam-Bank
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.workspace import Workspace
+from utils.filehandling import FileHandling
+from utils.atomicfile import AtomicFile
+from utils.config import Config
+
+def plainSave(accounts):
+    """ Rewrite accounts.csv in place with "w", the way saveFile did before AtomicFile """
+    with open(FileHandling.accountFile, "w", newline='') as csvfile:
+        save = csv.writer(csvfile)
+        save.writerow(FileHandling.accountHeader)
+        for account in accounts:
+            save.writerow(FileHandling.accountToRow(account))
+    return True, f"Accounts saved to {FileHandling.accountFile}"
+
+def rewriteCost(accounts, rewrites):
+    """ Milliseconds per rewrite of accounts.csv for plain "w" and each durability mode """
+    costs = {}
+    durability = Config.durability
+    try:
+        for mode in ('plain "w"',) + AtomicFile.modes:
+            if mode in AtomicFile.modes:
+                Config.durability = mode
+                save = FileHandling.saveFile
+            else:
+                save = plainSave
+            started = time.perf_counter()
+            for i in range(rewrites):
+                success, message = save(accounts)
+                if not success:
+                    raise RuntimeError(message)
+            costs[mode] = (time.perf_counter() - started) / rewrites * 1000
+            # batched mode leaves the directory syncs to the background, they are not part of a rewrite
+            AtomicFile.flush()
+    finally:
+        Config.durability = durability
+    return costs
+
+def main():
+    """ Entry point: python Tam-Bank/benchmarks/durability.py [--accounts N ...] [--rewrites N] """
+    parser = argparse.ArgumentParser(description="Time rewriting accounts.csv with FileHandling.saveFile in each "
+                                                 "TAMBANK_DURABILITY mode against a plain in-place rewrite.")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 1000], help="account counts to time")
+    parser.add_argument("--rewrites", type=int, default=200, help="rewrites per mode")
+    args = parser.parse_args()
+
+    columns = ('plain "w"',) + AtomicFile.modes
+    print(f"ms per rewrite, {args.rewrites} rewrites per mode")
+    print(f"{'accounts':>9} " + " ".join(f"{column:>10}" for column in columns))
+    with Workspace():
+        for count in args.accounts:
+            accounts = [FileHandling.accountFromRow(row) for row in Workspace.accountRows(count)]
+            costs = rewriteCost(accounts, args.rewrites)
+            print(f"{count:>9} " + " ".join(f"{costs[column]:>10.2f}" for column in columns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+
+# run as python Tam-Bank/benchmarks/groupcommit.py, the bank's packages are imported from Tam-Bank
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.workspace import Workspace
+from storage.repository import createRepositories
+from storage.ledgerwriter import LedgerWriter
+
+def commitRows(threads, rowsPerThread, grouped, sync=True, backend=None):
+    """ Append rows from many threads at once, each thread waiting for its row before the next one. With grouped
+        the rows go through a LedgerWriter, otherwise every row is appended on its own. Returns (rows per second,
+        latencies in seconds). """
+    with Workspace():
+        accountNumbers = Workspace.writeAccounts(1000)
+        accountRepo, ledgerRepo, applicationRepo = createRepositories(backend)
+        writer = LedgerWriter(ledgerRepo, sync=sync) if grouped else None
+        latencies = [[] for index in range(threads)]
+
+        def work(index):
+            rows = list(Workspace.ledgerRows(rowsPerThread, accountNumbers, seed=index))
+            for row in rows:
+                row['transacId'] = f"{index:04d}{row['transacId']}"
+                row['date'] = datetime.now()
+                started = time.perf_counter()
+                if writer:
+                    success, message = writer.submit(row).wait()
+                    if not success:
+                        raise RuntimeError(message)
+                else:
+                    ledgerRepo.appendMany([row], sync=sync)
+                latencies[index].append(time.perf_counter() - started)
+
+        workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        if writer:
+            writer.close()
+        Workspace.closeLedger(ledgerRepo)
+        latencies = sorted(latency for thread in latencies for latency in thread)
+        return len(latencies) / elapsed, latencies
+
+def percentile(values, fraction):
+    """ Value below which the given fraction of the sorted values fall """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    """ Entry point: python Tam-Bank/benchmarks/groupcommit.py [--threads N] [--rows N] [--no-sync] [--backend csv|sqlite] """
+    parser = argparse.ArgumentParser(description="Compare the throughput and commit latency of ledger rows written "
+                                                 "through the group-commit LedgerWriter with rows appended one by one.")
+    parser.add_argument("--threads", type=int, default=16, help="threads committing rows at the same time")
+    parser.add_argument("--rows", type=int, default=500, help="rows committed by each thread")
+    parser.add_argument("--no-sync", action="store_true", help="do not fsync the rows, like TAMBANK_LEDGER_FSYNC=0")
+    parser.add_argument("--backend", choices=("csv", "sqlite"), default="csv", help="storage backend of the ledger")
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.rows} rows, {args.backend} ledger, fsync {'off' if args.no_sync else 'on'}")
+    print(f"{'':>12} {'rows/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, grouped in (("per row", False), ("group", True)):
+        rate, latencies = commitRows(args.threads, args.rows, grouped, not args.no_sync, args.backend)
+        print(f"{name:>12} {rate:>9.0f} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}")
+
+if __name__ == "__main__":
+    main()
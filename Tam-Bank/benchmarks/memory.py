@@ -0,0 +1,54 @@
+import os
+import sys
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+# run as python Tam-Bank/benchmarks/memory.py, the bank's packages are imported from Tam-Bank
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.transactionhistory import TransactionHistory
+
+descriptions = ["Deposit", "Withdrawal", "Transfer", "Received transfer", "Initial Deposit"]
+
+def transactions(count, accountNumber="30000000"):
+    """ count transaction dictionaries in the Account.transactions format, one a minute """
+    start = datetime(2025, 1, 1)
+    balance = 0
+    for i in range(count):
+        cents = (i * 7919) % 500000 - 200000
+        balance += cents
+        yield {
+            'date': start + timedelta(minutes=i),
+            'description': descriptions[i % len(descriptions)],
+            'amount': cents / 100,
+            'balance': balance / 100,
+            'accountNumber': accountNumber
+        }
+
+def measure(build):
+    """ Bytes still allocated by what build returns, measured with tracemalloc """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+def main():
+    """ Entry point: python Tam-Bank/benchmarks/memory.py [--transactions N] """
+    parser = argparse.ArgumentParser(description="Measure the memory one transaction takes as a list of dictionaries "
+                                                 "and in the column-wise TransactionHistory.")
+    parser.add_argument("--transactions", type=int, default=1000000, help="transactions to keep in memory")
+    args = parser.parse_args()
+    count = args.transactions
+
+    listBytes = measure(lambda: list(transactions(count)))
+    historyBytes = measure(lambda: TransactionHistory("30000000", transactions(count)))
+    print(f"{count} transactions")
+    print(f"{'list of dicts':>20} {listBytes / 2 ** 20:>9.1f} MiB {listBytes / count:>7.1f} bytes each")
+    print(f"{'TransactionHistory':>20} {historyBytes / 2 ** 20:>9.1f} MiB {historyBytes / count:>7.1f} bytes each")
+
+if __name__ == "__main__":
+    main()
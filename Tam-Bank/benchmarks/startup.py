@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+
+# run as python Tam-Bank/benchmarks/startup.py, the bank's packages are imported from Tam-Bank
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.workspace import Workspace
+from utils.filehandling import FileHandling
+
+def startup(ledgerRows, accounts=1000, repeat=3):
+    """ Seconds FileHandling.loadFile takes to load the accounts with their transactions from a ledger of
+        ledgerRows rows, the best of repeat runs """
+    with Workspace():
+        accountNumbers = Workspace.writeAccounts(accounts)
+        Workspace.writeLedger(ledgerRows, accountNumbers)
+        best = None
+        for i in range(repeat):
+            started = time.perf_counter()
+            loaded = FileHandling.loadFile()
+            elapsed = time.perf_counter() - started
+            if len(loaded) != accounts:
+                raise RuntimeError(f"Loaded {len(loaded)} of {accounts} accounts")
+            best = elapsed if best is None else min(best, elapsed)
+            del loaded
+        return best
+
+def main():
+    """ Entry point: python Tam-Bank/benchmarks/startup.py [--rows N ...] [--accounts N] [--repeat N] """
+    parser = argparse.ArgumentParser(description="Time loading the accounts and their transactions for growing "
+                                                 "ledgers. The ledger is read once, so the time per row stays flat.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="ledger sizes to time")
+    parser.add_argument("--accounts", type=int, default=1000, help="accounts the rows are spread over")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the fastest is reported")
+    args = parser.parse_args()
+
+    print(f"{'ledger rows':>12} {'seconds':>9} {'us per row':>11}")
+    for rows in args.rows:
+        elapsed = startup(rows, args.accounts, args.repeat)
+        print(f"{rows:>12} {elapsed:>9.3f} {elapsed / rows * 1e6:>11.2f}")
+
+if __name__ == "__main__":
+    main()
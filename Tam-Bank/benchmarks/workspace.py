@@ -0,0 +1,97 @@
+import os
+import csv
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from utils.filehandling import FileHandling
+from utils.atomicfile import AtomicFile
+from models.transactionhistory import TransactionCache
+from storage.ledgerschema import LedgerSchema
+
+class Workspace:
+    """ Temporary directory laid out like the repository root. While it is entered the relative Tam-Bank/userinfo
+        paths of the bank point into it, so a benchmark never touches the real account files. """
+    firstNames = ["Juan", "Maria", "Jose", "Ana", "Pedro", "Rosa", "Carlo", "Liza", "Mark", "Joy", "Paolo", "Grace"]
+    lastNames = ["Santos", "Reyes", "Cruz", "Bautista", "Garcia", "Mendoza", "Torres", "Flores", "Ramos", "Villanueva"]
+
+    def __init__(self):
+        self.directory = None
+        self.startDirectory = None
+
+    def __enter__(self):
+        self.startDirectory = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="tambank-bench-")
+        os.makedirs(os.path.join(self.directory, os.path.dirname(FileHandling.accountFile)))
+        os.chdir(self.directory)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        # the ledger the FileHandling helpers created and the cached histories belong to this directory
+        if FileHandling.ledger is not None:
+            Workspace.closeLedger(FileHandling.ledger)
+            FileHandling.ledger = None
+        TransactionCache.clear()
+        AtomicFile.flush()
+        os.chdir(self.startDirectory)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return False
+
+    @staticmethod
+    def closeLedger(ledger):
+        """ Close a ledger repository, a sqlite ledger is closed with the database it shares """
+        getattr(ledger, 'database', ledger).close()
+
+    @staticmethod
+    def accountRows(count, seed=1):
+        """ .csv rows of count generated accounts, numbered from 30000000 """
+        rand = random.Random(seed)
+        for i in range(count):
+            opened = datetime(2020, 1, 1) + timedelta(seconds=rand.randrange(5 * 365 * 86400))
+            yield [str(30000000 + i), rand.choice(Workspace.firstNames), rand.choice(Workspace.lastNames),
+                   f"09{rand.randint(100000000, 999999999)}", f"user{i}@tambank.ph",
+                   f"{rand.randint(0, 10 ** 7) / 100:.2f}", opened.strftime('%Y-%m-%d %H:%M:%S'),
+                   rand.choice(["Active", "Active", "Active", "Inactive", "Suspended"]), "ab" * 32,
+                   rand.choice(["Savings", "Current"])]
+
+    @staticmethod
+    def writeAccounts(count, seed=1):
+        """ Write accounts.csv with count generated accounts, returns their account numbers """
+        accountNumbers = []
+        with open(FileHandling.accountFile, "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(FileHandling.accountHeader)
+            for row in Workspace.accountRows(count, seed):
+                writer.writerow(row)
+                accountNumbers.append(row[0])
+        return accountNumbers
+
+    @staticmethod
+    def ledgerRows(count, accountNumbers, seed=1):
+        """ count generated ledger rows between the accounts, a mix of deposits, withdrawals and transfers made over
+            the last two years """
+        rand = random.Random(seed)
+        start = datetime.now() - timedelta(days=730)
+        for i in range(count):
+            accountNumber = rand.choice(accountNumbers)
+            choice = rand.random()
+            if choice < 0.5:
+                toAccount, description = rand.choice(accountNumbers), "Transfer"
+            elif choice < 0.75:
+                toAccount, description = accountNumber, "Deposit"
+            else:
+                toAccount, description = "CASH", "Withdrawal"
+            yield {
+                'transacId': f"{i:019d}", 'date': start + timedelta(seconds=rand.randrange(730 * 86400)),
+                'from_account': accountNumber, 'to_account': toAccount,
+                'amount': rand.randint(100, 500000), 'description': description
+            }
+
+    @staticmethod
+    def writeLedger(count, accountNumbers, seed=1):
+        """ Write transactions.csv with count generated rows, the single-file ledger the csv backend reads in place """
+        with open(FileHandling.transactionFile, "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerows(LedgerSchema.preamble())
+            for row in Workspace.ledgerRows(count, accountNumbers, seed):
+                writer.writerow(LedgerSchema.toValues(row))
@@ -0,0 +1,61 @@
+import sys
+import csv
+import time
+import argparse
+from services.bank import TamBank
+from services.postings import PostingReader
+from utils.money import Money
+
+def ingest(path, batchSize=None, reportFile=None, backend=None):
+    """ Post every posting of a .csv or .jsonl file, writing failed rows to reportFile if one is given """
+    bank = TamBank(backend)
+    report = None
+    reportHandle = open(reportFile, "w", newline='') if reportFile else None
+    try:
+        writer = csv.writer(reportHandle) if reportHandle else None
+        if writer:
+            writer.writerow(['row', 'message'])
+
+        started = time.perf_counter()
+
+        def onResult(rowNumber, success, message):
+            if not success and writer:
+                writer.writerow([rowNumber, message])
+            if rowNumber % 100000 == 0:
+                print(f"{rowNumber} rows read in {time.perf_counter() - started:.1f}s")
+
+        report = bank.postMany(PostingReader.read(path), batchSize=batchSize, onResult=onResult)
+        elapsed = time.perf_counter() - started
+        print(f"Posted {report.posted} rows (PHP {Money.format(report.totalCents)}), {report.failed} failed, "
+              f"{report.batches} batches in {elapsed:.1f}s")
+        if report.failed and not writer:
+            for rowNumber, message in report.errors[:20]:
+                print(f"Row {rowNumber}: {message}")
+            if report.failed > 20:
+                print(f"... {report.failed - 20} more, pass --report to write every failed row")
+        return report
+    finally:
+        if reportHandle:
+            reportHandle.close()
+        bank.close()
+
+def main():
+    """ Entry point: python Tam-Bank/ingest.py postings.csv [--batch N] [--report failed.csv] [--backend csv|sqlite] """
+    parser = argparse.ArgumentParser(description="Post deposits, withdrawals and transfers in bulk from a .csv or .jsonl file. "
+                                                 "Columns/keys: " + ", ".join(PostingReader.header))
+    parser.add_argument("file", help="postings file, .csv with a header row or .jsonl")
+    parser.add_argument("--batch", type=int, default=None, help="postings written per batch")
+    parser.add_argument("--report", default=None, help="write the failed rows and their errors to this .csv file")
+    parser.add_argument("--backend", choices=("csv", "sqlite"), default=None, help="storage backend, defaults to TAMBANK_STORAGE")
+    args = parser.parse_args()
+
+    try:
+        report = ingest(args.file, args.batch, args.report, args.backend)
+    except (OSError, ValueError) as e:
+        print(f"Error reading postings: {e}")
+        sys.exit(1)
+    if report.failed:
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
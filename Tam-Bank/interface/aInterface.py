@@ -1,13 +1,17 @@
 from tkinter import *
 from tkinter import messagebox, ttk
+from interface.virtualtree import VirtualTreeview
+from interface.tasks import TaskRunner
 import datetime
 
 class AdminGUIinterface:
     """Admin GUI interface for managing the banking system"""
     
-    def __init__(self, bankService):
+    def __init__(self, bankService, tasks=None):
         self.bank = bankService
         self.mainWindow = None
+        # bank calls run on a worker so the window keeps responding while storage is busy
+        self.tasks = tasks or TaskRunner()
         
     def start(self, username="admin"):
         """Start the admin interface with the given username"""
@@ -22,9 +26,6 @@ class AdminGUIinterface:
         except:
             self.titleLogo = None
         
-        # reload accounts
-        accounts = self.bank.getAllAccounts()
-        
         # Header frame with admin info and formatted date/time
         headerFrame = Frame(self.mainWindow, bg="#333333", height=60)
         headerFrame.pack(fill=X)
@@ -42,6 +43,13 @@ class AdminGUIinterface:
                             bg="#333333", fg="white")
         self.timeLabel.pack(side=RIGHT, padx=20, pady=10)
 
+        self.statusLabel = Label(headerFrame, 
+                            text="", 
+                            font=('Helvetica', 12, 'italic'), 
+                            bg="#333333", fg="#ffcc00")
+        self.statusLabel.pack(side=RIGHT, padx=20, pady=10)
+        self.tasks.attach(self.mainWindow, self.statusLabel)
+
         self._updateClock()
         
         # Nav Bar
@@ -103,7 +111,10 @@ class AdminGUIinterface:
         treeFrame.pack(fill=BOTH, expand = True, padx = 20, pady = 10)
         
         columns = ('application_id', 'name', 'bank_type', 'status', 'date')
-        applicationsTree = ttk.Treeview(treeFrame, columns=columns, show='headings')
+        applicationsTree = VirtualTreeview(treeFrame, columns=columns, show='headings',
+                                           tags={'pending': {'background': '#fff9c4'},
+                                                 'accepted': {'background': '#c8e6c9'},
+                                                 'declined': {'background': '#ffcdd2'}})
 
         applicationsTree.heading('application_id', text = 'Application ID')
         applicationsTree.heading('name', text = 'Applicant Name')
@@ -118,7 +129,7 @@ class AdminGUIinterface:
         applicationsTree.column('date', width=150)
 
         yScrollBar = ttk.Scrollbar(treeFrame, orient=VERTICAL, command = applicationsTree.yview)
-        applicationsTree.configure(yscrollcommand=yScrollBar.set)
+        applicationsTree.attachScrollbar(yScrollBar)
 
         applicationsTree.pack(side=LEFT, fill=BOTH, expand=True)
         yScrollBar.pack(side=RIGHT, fill=Y)
@@ -139,48 +150,33 @@ class AdminGUIinterface:
 
     def _loadApplications(self, tree, statusFilter = "ALL"):
         """ Load applications """
-        for item in tree.get_children():
-            tree.delete(item)
-        
-        try:
-            from utils.filehandling import FileHandling
-            
-            # Load all applications
-            applications = FileHandling.loadApplications()
-            
-            # Filter by status if needed
-            if statusFilter != "All":
-                applications = [app for app in applications if app['status'] == statusFilter]
-            
-            if not applications:
-                tree.insert('', 'end', values=('', 'No applications found', '', '', ''))
-                return
-            
-            # Custom coloring based on status
-            tree.tag_configure('pending', background='#fff9c4')
-            tree.tag_configure('accepted', background='#c8e6c9')
-            tree.tag_configure('declined', background='#ffcdd2')
-            
-            for app in applications:
-                name = f"{app['fName']} {app['lName']}"
-                date = app['applicationDate'].strftime("%Y-%m-%d %H:%M:%S")
-                
-                item_id = tree.insert('', 'end', values=(
-                    app['applicationId'],
-                    name,
-                    app['bankType'],
-                    app['status'],
-                    date
-                ))
-                
-                status_tag = app['status'].lower()
-                if status_tag in ['pending', 'accepted', 'declined']:
-                    tree.item(item_id, tags=(status_tag,))
-        
-        except Exception as e:
+        # Filter by status in the repository if needed
+        status = None if statusFilter.lower() == "all" else statusFilter
+
+        def loaded(applications):
+            # only the first page is rendered, the tree fetches the rest as it is scrolled
+            tree.setSource(applications, self._applicationRow,
+                           emptyValues=('', 'No applications found', '', '', ''))
+
+        def failed(e):
+            tree.clear()
             messagebox.showerror("Error", f"Could not load applications: {str(e)}")
             tree.insert('', 'end', values=('', f'Error: {str(e)}', '', '', ''))
 
+        # a newer filter replaces a load that is still pending
+        self.tasks.run(self.bank.getApplications, status, onDone=loaded, onError=failed,
+                       key='applications', status="Loading applications...")
+
+    def _applicationRow(self, app):
+        """ Treeview values and tags of an application """
+        name = f"{app['fName']} {app['lName']}"
+        date = app['applicationDate'].strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Custom coloring based on status
+        status_tag = app['status'].lower()
+        tags = (status_tag,) if status_tag in ['pending', 'accepted', 'declined'] else ()
+        return (app['applicationId'], name, app['bankType'], app['status'], date), tags
+
     def _viewApplicationDetails(self, tree):
         """ view details of applicant """
         selected = tree.selection()
@@ -190,65 +186,61 @@ class AdminGUIinterface:
 
         application_ID= tree.item(selected[0])['values'][0]
 
-        try:
-            from utils.filehandling import FileHandling
-            applications = FileHandling.loadApplications()
-
-            application = None
-            for app in applications:
-                if app['applicationId'] == application_ID:
-                    application = app
-                    break
-            
-            if not application:
-                messagebox.showerror("Error", f"Application {application_ID} not found")
-                return
+        def loaded(application):
+            try:
+                if not application:
+                    messagebox.showerror("Error", f"Application {application_ID} not found")
+                    return
 
-            detailWindow = Toplevel(self.mainWindow)
-            detailWindow.title(f"Application Details - {application_ID}")
-            detailWindow.geometry("500x400")
-            detailWindow.grab_set()
+                detailWindow = Toplevel(self.mainWindow)
+                detailWindow.title(f"Application Details - {application_ID}")
+                detailWindow.geometry("500x400")
+                detailWindow.grab_set()
 
-            Label(detailWindow, text = "Application Details", font = ('Helvetica', 16 , 'bold'))
+                Label(detailWindow, text = "Application Details", font = ('Helvetica', 16 , 'bold'))
 
-            detailsFrame = Frame(detailWindow)
-            detailsFrame.pack(fill=BOTH, expand = True , padx=20, pady=10)
+                detailsFrame = Frame(detailWindow)
+                detailsFrame.pack(fill=BOTH, expand = True , padx=20, pady=10)
 
-            fields = [
-                ('Application ID', application['applicationId']),
-                ('Full Name', f"{application['fName']} {application['lName']}"),
-                ('Phone Number', application['mobileNo']),
-                ('Email', application['email']),
-                ('Initial Balance', f"PHP{application['initialBal']:.2f}"),
-                ('Account Type', application['bankType']),
-                ('Status', application['status']),
-                ('Application Date', application['applicationDate'].strftime("%Y-%m-%d %H:%M:%S"))
-            ]
+                fields = [
+                    ('Application ID', application['applicationId']),
+                    ('Full Name', f"{application['fName']} {application['lName']}"),
+                    ('Phone Number', application['mobileNo']),
+                    ('Email', application['email']),
+                    ('Initial Balance', f"PHP{application['initialBal']:.2f}"),
+                    ('Account Type', application['bankType']),
+                    ('Status', application['status']),
+                    ('Application Date', application['applicationDate'].strftime("%Y-%m-%d %H:%M:%S"))
+                ]
 
-            for i, (field, value) in enumerate(fields):
-                Label(detailsFrame, text=field, font=('Helvetica', 12, 'bold')).grid(row=i, column=0, sticky=W, pady=5)
-                Label(detailsFrame, text=value, font=('Helvetica', 12)).grid(row=i, column=1, sticky=W, pady=5)
+                for i, (field, value) in enumerate(fields):
+                    Label(detailsFrame, text=field, font=('Helvetica', 12, 'bold')).grid(row=i, column=0, sticky=W, pady=5)
+                    Label(detailsFrame, text=value, font=('Helvetica', 12)).grid(row=i, column=1, sticky=W, pady=5)
             
-            btnFrame = Frame(detailWindow)
-            btnFrame.pack(fill=X, pady=10)
+                btnFrame = Frame(detailWindow)
+                btnFrame.pack(fill=X, pady=10)
             
-            if application['status'] == "Pending":
-                approveBtn = Button(btnFrame, text="Approve", font=('Helvetica', 12),
-                                bg='#4CAF50', fg='white',
-                                command=lambda: self._processApplicationApproval(application, detailWindow, tree))
-                approveBtn.pack(side=LEFT, padx=10)
+                if application['status'] == "Pending":
+                    approveBtn = Button(btnFrame, text="Approve", font=('Helvetica', 12),
+                                    bg='#4CAF50', fg='white',
+                                    command=lambda: self._processApplicationApproval(application, detailWindow, tree))
+                    approveBtn.pack(side=LEFT, padx=10)
                 
-                declineBtn = Button(btnFrame, text="Decline", font=('Helvetica', 12),
-                                bg='#f44336', fg='white',
-                                command=lambda: self._processApplicationDecline(application, detailWindow, tree))
-                declineBtn.pack(side=LEFT, padx=10)
+                    declineBtn = Button(btnFrame, text="Decline", font=('Helvetica', 12),
+                                    bg='#f44336', fg='white',
+                                    command=lambda: self._processApplicationDecline(application, detailWindow, tree))
+                    declineBtn.pack(side=LEFT, padx=10)
             
-            closeBtn = Button(btnFrame, text="Close", font=('Helvetica', 12),
-                            command=detailWindow.destroy)
-            closeBtn.pack(side=RIGHT, padx=10)
+                closeBtn = Button(btnFrame, text="Close", font=('Helvetica', 12),
+                                command=detailWindow.destroy)
+                closeBtn.pack(side=RIGHT, padx=10)
     
-        except Exception as e:
-            messagebox.showerror("Error", f"Error viewing application: {str(e)}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Error viewing application: {str(e)}")
+
+        # the application store is read on the worker, the window opens once it is loaded
+        self.tasks.run(self.bank.getApplication, application_ID, onDone=loaded, status="Loading application...",
+                       onError=lambda e: messagebox.showerror("Error", f"Error viewing application: {str(e)}"))
             
     def _approveApplication(self, tree):
         """ Approves selected application id. """
@@ -264,24 +256,15 @@ class AdminGUIinterface:
             messagebox.showwarning("Cannot approve!", "Only pending applications can be approved")
             return
         
-        try:
-            from utils.filehandling import FileHandling
-            applications = FileHandling.loadApplications()
-            
-            application = None
-            for app in applications:
-                if app['applicationId'] == app_id:
-                    application = app
-                    break
-            
+        def loaded(application):
             if not application:
                 messagebox.showerror("Error", f"Application {app_id} not found")
                 return
             
             self._processApplicationApproval(application, None, tree)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error approving application: {str(e)}")
+
+        self.tasks.run(self.bank.getApplication, app_id, onDone=loaded, status="Loading application...",
+                       onError=lambda e: messagebox.showerror("Error", f"Error approving application: {str(e)}"))
     
     def _declineApplication(self, tree):
         """Decline the selected application"""
@@ -297,24 +280,15 @@ class AdminGUIinterface:
             messagebox.showwarning("Cannot Decline", "Only pending applications can be declined")
             return
         
-        try:
-            from utils.filehandling import FileHandling
-            applications = FileHandling.loadApplications()
-            
-            application = None
-            for app in applications:
-                if app['applicationId'] == app_id:
-                    application = app
-                    break
-            
+        def loaded(application):
             if not application:
                 messagebox.showerror("Error", f"Application {app_id} not found")
                 return
             
             self._processApplicationDecline(application, None, tree)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error declining application: {str(e)}")
+
+        self.tasks.run(self.bank.getApplication, app_id, onDone=loaded, status="Loading application...",
+                       onError=lambda e: messagebox.showerror("Error", f"Error declining application: {str(e)}"))
 
     def _processApplicationApproval(self, application, detailWindow=None, tree=None):
         """Process application approval and create new account"""
@@ -325,15 +299,15 @@ class AdminGUIinterface:
         if not confirm:
             return
         
-        try:
-            from utils.filehandling import FileHandling
-            success, message = FileHandling.updateApplicationStatus(application['applicationId'], "Accepted")
-            
+        defaultPin = 'TamBank123@!'
+
+        def approve():
+            # fails if another admin handled the application in the meantime, so only one account is created
+            success, message = self.bank.updateApplicationStatus(application['applicationId'], "Accepted",
+                                                                 application['status'])
             if not success:
-                messagebox.showerror("Error", f"Failed to update application status: {message}")
-                return
+                return success, message, None
             
-            defaultPin = 'TamBank123@!'
             account = self.bank.createAccount(
                 application['fName'],
                 application['lName'],
@@ -342,6 +316,13 @@ class AdminGUIinterface:
                 application['email'],
                 defaultPin
             )
+            return success, message, account
+
+        def approved(result):
+            success, message, account = result
+            if not success:
+                messagebox.showerror("Error", f"Failed to update application status: {message}")
+                return
             
             if account:
                 messagebox.showinfo("Success", 
@@ -373,9 +354,9 @@ class AdminGUIinterface:
                     self._refreshSystemStats()
             else:
                 messagebox.showerror("Error", "Failed to create account")
-        
-        except Exception as e:
-            messagebox.showerror("Error", f"Error processing approval: {str(e)}")
+
+        self.tasks.run(approve, onDone=approved, status="Creating account...",
+                       onError=lambda e: messagebox.showerror("Error", f"Error processing approval: {str(e)}"))
 
     def _processApplicationDecline(self, application, detailWindow=None, tree=None):
         """Process application decline"""
@@ -385,11 +366,8 @@ class AdminGUIinterface:
         if not confirm:
             return
         
-        try:
-            # Update application status
-            from utils.filehandling import FileHandling
-            success, message = FileHandling.updateApplicationStatus(application['applicationId'], "Declined")
-            
+        def declined(result):
+            success, message = result
             if success:
                 messagebox.showinfo("Success", "Application declined successfully")
                 
@@ -402,9 +380,11 @@ class AdminGUIinterface:
                     self._loadApplications(tree)
             else:
                 messagebox.showerror("Error", f"Failed to update application status: {message}")
-        
-        except Exception as e:
-            messagebox.showerror("Error", f"Error processing decline: {str(e)}")
+
+        # Update application status
+        self.tasks.run(self.bank.updateApplicationStatus, application['applicationId'], "Declined",
+                       application['status'], onDone=declined,
+                       onError=lambda e: messagebox.showerror("Error", f"Error processing decline: {str(e)}"))
 
 
 
@@ -436,7 +416,7 @@ class AdminGUIinterface:
         treeFrame.pack(fill=BOTH, expand=True, padx=20, pady=10)
         
         columns = ('account_number', 'name', 'balance', 'status', 'date_opened')
-        accountsTree = ttk.Treeview(treeFrame, columns=columns, show='headings')
+        accountsTree = VirtualTreeview(treeFrame, columns=columns, show='headings')
         
         accountsTree.heading('account_number', text='Account Number')
         accountsTree.heading('name', text='Name')
@@ -451,7 +431,7 @@ class AdminGUIinterface:
         accountsTree.column('date_opened', width=120)
         
         yScrollbar = ttk.Scrollbar(treeFrame, orient=VERTICAL, command=accountsTree.yview)
-        accountsTree.configure(yscrollcommand=yScrollbar.set)
+        accountsTree.attachScrollbar(yScrollbar)
         
         accountsTree.pack(side=LEFT, fill=BOTH, expand=True)
         yScrollbar.pack(side=RIGHT, fill=Y)
@@ -477,27 +457,21 @@ class AdminGUIinterface:
         self._loadAccounts(accountsTree)
     
     def _loadAccounts(self, tree):
-        """Load accounts into the treeview"""
-        for item in tree.get_children():
-            tree.delete(item)
-        
-        accounts = self.bank.getAllAccounts()
+        """Load accounts into the treeview, rows are rendered page by page as the tree is scrolled"""
+        def loaded(accounts):
+            tree.setSource((account for account in accounts if account.accountNumber.lower() != 'admin'),
+                           self._accountRow)
+
+        # shares its key with searches, whichever was asked for last is the one shown
+        self.tasks.run(self.bank.getAllAccounts, onDone=loaded, key='accounts', status="Loading accounts...")
+
+    def _accountRow(self, account):
+        """Treeview values and tags of an account"""
+        name = f"{account.fName} {account.lName}"
+        balance = f"PHP {account.balance:.2f}"
+        date = account.dateOpened.strftime("%Y-%m-%d")
         
-        for account in accounts:
-            if account.accountNumber.lower() == 'admin':
-                continue
-                
-            name = f"{account.fName} {account.lName}"
-            balance = f"PHP {account.balance:.2f}"
-            date = account.dateOpened.strftime("%Y-%m-%d")
-            
-            tree.insert('', 'end', values=(
-                account.accountNumber,
-                name,
-                balance,
-                account.status,
-                date
-            ))
+        return (account.accountNumber, name, balance, account.status, date), ()
 
     def _setupTransactionsTab(self, frame):
         """Set up the transactions history tab"""
@@ -517,7 +491,10 @@ class AdminGUIinterface:
         treeFrame = Frame(frame)
         treeFrame.pack(fill=BOTH, expand=True, padx=20, pady=10)
         columns = ('date', 'description', 'amount', 'transacId')
-        transTree = ttk.Treeview(treeFrame, columns=columns, show='headings')
+        # later pages are read from the ledger on the worker
+        transTree = VirtualTreeview(treeFrame, columns=columns, show='headings', tasks=self.tasks,
+                                    tags={'positive': {'foreground': 'green'},
+                                          'negative': {'foreground': 'red'}})
         transTree.heading('date', text='Date')
         transTree.heading('description', text='Description')
         transTree.heading('amount', text='Amount')
@@ -528,7 +505,7 @@ class AdminGUIinterface:
         transTree.column('transacId', width=100)
         
         yScrollbar = ttk.Scrollbar(treeFrame, orient=VERTICAL, command=transTree.yview)
-        transTree.configure(yscrollcommand=yScrollbar.set)
+        transTree.attachScrollbar(yScrollbar)
         transTree.pack(side=LEFT, fill=BOTH, expand=True)
         yScrollbar.pack(side=RIGHT, fill=Y)
 
@@ -704,21 +681,21 @@ class AdminGUIinterface:
 
     def _refreshSystemStats(self):
         """Refresh the system statistics display with detailed account status counts"""
-        try:
-            stats = self._getCustomerStats()
-            
-            self.statsLabels['total_accounts'].config(text=str(stats['total_accounts']))
-            self.statsLabels['active_accounts'].config(text=str(stats['active_accounts']))
-            self.statsLabels['inactive_accounts'].config(text=str(stats['inactive_accounts']))
-            self.statsLabels['suspended_accounts'].config(text=str(stats['suspended_accounts']))
-            self.statsLabels['closed_accounts'].config(text=str(stats['closed_accounts']))
-            self.statsLabels['total_balance'].config(text=f"PHP {stats['total_balance']:.2f}")
-            self.statsLabels['recent_transactions'].config(text=str(stats['recent_transactions']))
-            
-            currentTime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.statsLabels['update_time'].config(text=currentTime)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load system statistics: {str(e)}")
+        self.tasks.run(self._getCustomerStats, onDone=self._showSystemStats, key='stats',
+                       onError=lambda e: messagebox.showerror("Error", f"Failed to load system statistics: {str(e)}"))
+
+    def _showSystemStats(self, stats):
+        """Show statistics computed by _getCustomerStats"""
+        self.statsLabels['total_accounts'].config(text=str(stats['total_accounts']))
+        self.statsLabels['active_accounts'].config(text=str(stats['active_accounts']))
+        self.statsLabels['inactive_accounts'].config(text=str(stats['inactive_accounts']))
+        self.statsLabels['suspended_accounts'].config(text=str(stats['suspended_accounts']))
+        self.statsLabels['closed_accounts'].config(text=str(stats['closed_accounts']))
+        self.statsLabels['total_balance'].config(text=f"PHP {stats['total_balance']:.2f}")
+        self.statsLabels['recent_transactions'].config(text=str(stats['recent_transactions']))
+        
+        currentTime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.statsLabels['update_time'].config(text=currentTime)
 
     def _getCustomerStats(self):
         """Get detailed system statistics with account status breakdown"""
@@ -734,40 +711,8 @@ class AdminGUIinterface:
         }
         
         try:
-            # Get all accounts from the system
-            accounts = self.bank.getAllAccounts()
-            
-            # Filter out admin accounts
-            customer_accounts = [acc for acc in accounts if acc.accountNumber.lower() != 'admin']
-            
-            # Count total customer accounts
-            stats['total_accounts'] = len(customer_accounts)
-            
-            # Count accounts by status with case-insensitive comparison
-            for account in customer_accounts:
-                status = account.status.lower()
-                
-                # Add balance to total
-                stats['total_balance'] += account.balance
-                
-                # Count accounts by status
-                if status == 'active':
-                    stats['active_accounts'] += 1
-                elif status == 'inactive':
-                    stats['inactive_accounts'] += 1
-                elif status == 'suspended':
-                    stats['suspended_accounts'] += 1
-                elif status == 'closed':
-                    stats['closed_accounts'] += 1
-            
-            # Get transaction statistics from bank service
-            try:
-                bank_stats = self.bank.getSystemStats()
-                stats['recent_transactions'] = bank_stats.get('recent_transactions', 0)
-            except Exception:
-                # Handle missing transaction data gracefully
-                pass
-                
+            # Counters are kept up to date by the bank service, so this does not rescan accounts or transactions
+            stats.update(self.bank.getCustomerStats())
             return stats
             
         except Exception as e:
@@ -777,46 +722,8 @@ class AdminGUIinterface:
 
     def _findAccount(self, accountId):
         """Efficient account lookup function"""
-        import csv
-        from datetime import datetime
-        from models.account import Account
-        
-        targetId = str(accountId).strip()
-        
         try:
-            account = self.bank.getAccount(accountId)
-            if account:
-                return account
-                
-            with open('Tam-Bank/userinfo/accounts.csv', 'r') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    rowId = str(row['Account Number']).strip()                    
-                    if (rowId == targetId or 
-                        rowId.replace(" ", "") == targetId.replace(" ", "")):
-                        account = Account(
-                            rowId,
-                            row['First Name'],
-                            row['Last Name'],
-                            float(row['Balance']),
-                            row['Mobile Number'],
-                            row['Email']
-                        )
-                        
-                        account.status = row['Status']
-                        try:
-                            account.dateOpened = datetime.strptime(row['Date Opened'], '%Y-%m-%d %H:%M:%S')
-                        except (ValueError, KeyError):
-                            account.dateOpened = datetime.now()
-                        
-                        if 'Password Hash' in row:
-                            account.passHash = row['Password Hash']
-                        
-                        return account
-            
-            return None
-            
+            return self.bank.findAccount(str(accountId).strip())
         except Exception as e:
             return None
 
@@ -996,16 +903,20 @@ class AdminGUIinterface:
             if '@' not in email or '.' not in email:
                 messagebox.showerror('Error', 'Invalid email address.')
                 return
-            
-            if newId != originalId and newId in [acc.accountNumber for acc in self.bank.getAllAccounts() if acc.accountNumber != originalId]:
-                messagebox.showerror('Error', f'Account ID {newId} already exists. Please choose another ID.')
-                return
+        except Exception as e:
+            messagebox.showerror("Error", f"Error updating account: {str(e)}")
+            return
 
-            success = self.bank.adminUpdateAccount(
-                originalId, newId, fname, lname, mobile, email, status, password
-            )
-            
-            if success:
+        def save():
+            # findAccount reads storage for an account number it does not know, so the check runs on the worker
+            if newId != originalId and self.bank.findAccount(newId):
+                return None
+            return self.bank.adminUpdateAccount(originalId, newId, fname, lname, mobile, email, status, password)
+
+        def saved(success):
+            if success is None:
+                messagebox.showerror('Error', f'Account ID {newId} already exists. Please choose another ID.')
+            elif success:
                 messagebox.showinfo("Success", "Account updated successfully")
                 window.destroy()
                 
@@ -1026,8 +937,9 @@ class AdminGUIinterface:
                     self._refreshSystemStats()
             else:
                 messagebox.showerror("Error", "Failed to update account")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error updating account: {str(e)}")
+
+        self.tasks.run(save, onDone=saved, status="Saving account...",
+                       onError=lambda e: messagebox.showerror("Error", f"Error updating account: {str(e)}"))
     
     def _deleteAccount(self, tree):
         """Delete selected account"""
@@ -1043,9 +955,7 @@ class AdminGUIinterface:
                                    "This action cannot be undone.")
         
         if confirm:
-            try:
-                success = self.bank.adminDeleteAccount(accountId)
-                
+            def deleted(success):
                 if success:
                     messagebox.showinfo("Success", f"Account {accountId} deleted successfully")
                     self._loadAccounts(tree)
@@ -1054,57 +964,43 @@ class AdminGUIinterface:
                         self._refreshSystemStats()
                 else:
                     messagebox.showerror("Error", "Failed to delete account")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error deleting account: {str(e)}")
+
+            self.tasks.run(self.bank.adminDeleteAccount, accountId, onDone=deleted, status="Deleting account...",
+                           onError=lambda e: messagebox.showerror("Error", f"Error deleting account: {str(e)}"))
     
     def _loadTransactions(self, accountId, tree):
-        """Load transactions for specified account"""
+        """Load transactions for specified account, newest first, streaming pages from the ledger as the tree is scrolled"""
         if not accountId:
             messagebox.showwarning("No Account", "Please enter an account number")
             return
-            
-        for item in tree.get_children():
-            tree.delete(item)
         
-        try:
-            transactions = self.bank.getAccountTransactions(accountId)
-            
-            if not transactions:
-                tree.insert('', 'end', values=('', 'No transactions found', '', ''))
-            else:
-                for transaction in transactions:
-                    try:
-                        if hasattr(transaction['date'], 'strftime'):
-                            dateStr = transaction['date'].strftime('%Y-%m-%d %H:%M:%S')
-                        else:
-                            dateStr = str(transaction['date'])
-                        
-                        if float(transaction['amount']) >= 0:
-                            amountStr = f"PHP +{float(transaction['amount']):.2f}"
-                            tag = 'positive'
-                        else:
-                            amountStr = f"PHP {float(transaction['amount']):.2f}"
-                            tag = 'negative'
-                        
-                        transacId = transaction.get('transacId', 
-                                             transaction.get('transaction_id', ''))
-                        description = transaction.get('description', 'Transaction')
-                        
-                        itemId = tree.insert('', 'end', values=(
-                            dateStr, description, amountStr, transacId
-                        ))
-                        
-                        if tag == 'positive':
-                            tree.tag_configure('positive', foreground='green')
-                            tree.item(itemId, tags=('positive',))
-                        elif tag == 'negative':
-                            tree.tag_configure('negative', foreground='red')
-                            tree.item(itemId, tags=('negative',))
-                            
-                    except (KeyError, ValueError, AttributeError):
-                        continue
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not load transactions: {str(e)}")
+        def loaded(transactions):
+            tree.setSource(transactions, self._transactionRow, emptyValues=('', 'No transactions found', '', ''))
+
+        # the first page is read on the worker, a newer account number replaces a load that is still pending
+        self.tasks.run(lambda: TaskRunner.prefetch(self.bank.iterAccountTransactions(accountId), tree.pageSize),
+                       onDone=loaded, key='transactions', status="Loading transactions...",
+                       onError=lambda e: messagebox.showerror("Error", f"Could not load transactions: {str(e)}"))
+
+    def _transactionRow(self, transaction):
+        """Treeview values and tags of a transaction"""
+        if hasattr(transaction['date'], 'strftime'):
+            dateStr = transaction['date'].strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            dateStr = str(transaction['date'])
+        
+        if float(transaction['amount']) >= 0:
+            amountStr = f"PHP +{float(transaction['amount']):.2f}"
+            tag = 'positive'
+        else:
+            amountStr = f"PHP {float(transaction['amount']):.2f}"
+            tag = 'negative'
+        
+        transacId = transaction.get('transacId', 
+                             transaction.get('transaction_id', ''))
+        description = transaction.get('description', 'Transaction')
+        
+        return (dateStr, description, amountStr, transacId), (tag,)
     
     def _searchAccounts(self, searchTerm, tree):
         """Search for accounts matching the search term"""
@@ -1112,35 +1008,9 @@ class AdminGUIinterface:
             self._loadAccounts(tree)
             return
             
-        for item in tree.get_children():
-            tree.delete(item)
-        
-        accounts = self.bank.getAllAccounts()
-        
-        searchTerm = searchTerm.lower()
-        filteredAccounts = []
-        
-        for account in accounts:
-            if account.accountNumber.lower() == 'admin':
-                continue
-                
-            if (searchTerm in account.accountNumber.lower() or
-                searchTerm in account.fName.lower() or
-                searchTerm in account.lName.lower()):
-                filteredAccounts.append(account)
-        
-        for account in filteredAccounts:
-            name = f"{account.fName} {account.lName}"
-            balance = f"PHP {account.balance:.2f}"
-            date = account.dateOpened.strftime("%Y-%m-%d")
-            
-            tree.insert('', 'end', values=(
-                account.accountNumber,
-                name,
-                balance,
-                account.status,
-                date
-            ))
+        # every search replaces the previous one, only the results of the last term are shown
+        self.tasks.run(self.bank.searchAccounts, searchTerm, onDone=lambda accounts: tree.setSource(accounts, self._accountRow),
+                       key='accounts', status="Searching...")
     
     def _changeAdminPassword(self, oldPassword, newPassword, confirmPassword):
         """Change admin password with comprehensive debugging"""
@@ -1160,20 +1030,19 @@ class AdminGUIinterface:
             messagebox.showerror("Error", "Password must be at least 8 characters long and contain at least one digit, one letter, and one special character")
             return
         
-        try:
-            success = self.bank.updateAdminPassword(oldPassword, newPassword)
-            
+        def changed(success):
             if success:
                 messagebox.showinfo("Success", f"Admin password changed successfully to: {newPassword}\n\nPlease remember this password for your next login.")
             else:
                 messagebox.showerror("Error", "Failed to change password. The current password may be incorrect.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error changing password: {str(e)}")
+
+        self.tasks.run(self.bank.updateAdminPassword, oldPassword, newPassword, onDone=changed,
+                       onError=lambda e: messagebox.showerror("Error", f"Error changing password: {str(e)}"))
     
     def _logout(self):
         """Log out and return to login screen"""
         self.mainWindow.destroy()
         
         from interface.interface import GUIinterface
-        gui = GUIinterface(self.bank)
+        gui = GUIinterface(self.bank, self.tasks)
         gui.start()
\ No newline at end of file
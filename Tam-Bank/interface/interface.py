@@ -1,17 +1,21 @@
 from tkinter import *
 from tkinter import messagebox  # for pop-up message windows
 from tkinter import ttk
+from interface.virtualtree import VirtualTreeview
+from interface.tasks import TaskRunner
 
 class GUIinterface:
     """ GUI interface """
 
-    def __init__(self, bankService):
+    def __init__(self, bankService, tasks=None):
         """ Initialize the GUI interface with a reference to the TAMBANK object """
         self.bank = bankService
         self.activeAccount = None
         self.mainWindow = None
         self.frames = {}
         self.navigator = {}
+        # bank calls run on a worker so the window keeps responding while storage is busy
+        self.tasks = tasks or TaskRunner()
 
     def start(self):
         """ Start the GUI with the login screen """    
@@ -32,6 +36,7 @@ class GUIinterface:
         self.mainWindow.title('TamBank')
         self.mainWindow.geometry("800x600+400+100")
         self.mainWindow.resizable(False,False)
+        self.tasks.attach(self.mainWindow)
 
         # load images using try except block so that if there is no images found just set the title_logo to none to not confuse users
         try:
@@ -76,37 +81,43 @@ class GUIinterface:
         accountId = txtID.get()
         password = txtPass.get()
 
-        if accountId == "admin":
+        def login():
+            # authPass reads storage and may record the account as inactive, so it runs on the worker.
+            # Returns (success, message, account), success is None when the password was not checked.
+            if accountId == "admin":
+                success, message = self.bank.authPass(accountId, password)
+                return success, message, None
+
+            account = self.bank.getAccount(accountId)
+            if not account:
+                return None, 'Account not found.', None
+
+            if account.status.lower() == 'closed':
+                return None, 'Account is closed.', None
+            
+            if account.status.lower() == 'suspended':
+                return None, 'Account is suspended.', None
+            
             success, message = self.bank.authPass(accountId, password)
-            if success:
-                self.mainWindow.destroy()
-                self._adminInterface()
-            else:
+            return success, message, self.bank.getAccount(accountId) if success else None
+
+        def loggedIn(result):
+            success, message, account = result
+            if not success:
                 messagebox.showerror('Login Failed', message)
-                txtPass.delete(0, END)
-            return
-        
-        account = self.bank.getAccount(accountId)
-        if not account:
-            messagebox.showerror('Login Failed', 'Account not found.')
-            return
+                if success is not None:
+                    txtPass.delete(0, END)
+                return
 
-        if account.status.lower() == 'closed':
-            messagebox.showerror('Login Failed', 'Account is closed.')
-            return
-        
-        if account.status.lower() == 'suspended':
-            messagebox.showerror('Login Failed', 'Account is suspended.')
-            return
-        
-        success, message = self.bank.authPass(txtID.get(), txtPass.get())
-        if success:
-            self.activeAccount = self.bank.getAccount(txtID.get())
             self.mainWindow.destroy()
-            self.showUserScreen()
-        else:
-            messagebox.showerror('Login Failed', message)
-            txtPass.delete(0, END)
+            if accountId == "admin":
+                self._adminInterface()
+            else:
+                self.activeAccount = account
+                self.showUserScreen()
+
+        self.tasks.run(login, onDone=loggedIn, key='login', busy=[txtID, txtPass], status='Logging in...',
+                       onError=lambda e: messagebox.showerror('Login Failed', f'An error occurred: {str(e)}'))
 
     def _showApplyScreen(self):
         """Display the account application screen with minimum balance requirements"""
@@ -273,16 +284,13 @@ class GUIinterface:
             messagebox.showerror('Error', 'Initial balance must be a valid number.')
             return
 
-        try:
-            # Save application
-            from utils.filehandling import FileHandling
+        # Save application
+        from utils.filehandling import FileHandling
 
-            FileHandling.minBal = minBalRequired
-            
-            success, applicationId = FileHandling.saveApplication(
-                fName, lName, phone, email, initialBal, bankType
-            )
-            
+        FileHandling.minBal = minBalRequired
+
+        def submitted(result):
+            success, applicationId = result
             if success:
                 messagebox.showinfo('Application Submitted', 
                                 f'Your application has been submitted successfully!\n\n'
@@ -292,8 +300,10 @@ class GUIinterface:
                 window.destroy()
             else:
                 messagebox.showerror('Error', f'Failed to submit application: {applicationId}')
-        except Exception as e:
-            messagebox.showerror('Error', f'Failed to submit application: {str(e)}')
+
+        self.tasks.run(self.bank.submitApplication, fName, lName, phone, email, initialBal, bankType,
+                       onDone=submitted, busy=list(fields.values()),
+                       onError=lambda e: messagebox.showerror('Error', f'Failed to submit application: {str(e)}'))
 
     def _depositFunds(self, txtAmount):
         """ Handle deposit action """
@@ -303,11 +313,8 @@ class GUIinterface:
                 messagebox.showerror('Error', 'Deposit amount must be greater than zero.')
                 return
     
-            success, message = self.bank.deposit(self.activeAccount.accountNumber, amount)
-            if success:
-                messagebox.showinfo('Success', message)
-            else:
-                messagebox.showerror('Error', message)
+            self.tasks.run(self.bank.deposit, self.activeAccount.accountNumber, amount,
+                           onDone=self._showResult, busy=[txtAmount])
         except ValueError:
             messagebox.showerror('Error', 'Invalid amount entered.')
     
@@ -319,11 +326,8 @@ class GUIinterface:
                 messagebox.showerror('Error', 'Withdrawal amount must be greater than zero.')
                 return
     
-            success, message = self.bank.withdraw(self.activeAccount.accountNumber, amount)
-            if success:
-                messagebox.showinfo('Success', message)
-            else:
-                messagebox.showerror('Error', message)
+            self.tasks.run(self.bank.withdraw, self.activeAccount.accountNumber, amount,
+                           onDone=self._showResult, busy=[txtAmount])
         except ValueError:
             messagebox.showerror('Error', 'Invalid amount entered.')
 
@@ -349,14 +353,23 @@ class GUIinterface:
             messagebox.showerror('Error', 'Password must be at least 8 characters long and contain at least one letter, number, and special character.')
             return
 
-        try:
-            success = self.bank.changePass(self.activeAccount.accountNumber, oldPass, newPass)
+        def changed(success):
             if success:
                 messagebox.showinfo('Success', "Password successfully changed.")
             else:
                 messagebox.showerror('Error', "Failed to change password.")
-        except Exception as e:
-            messagebox.showerror('Error', f'Failed to change password: {str(e)}')
+
+        self.tasks.run(self.bank.changePass, self.activeAccount.accountNumber, oldPass, newPass,
+                       onDone=changed, busy=[txtOldPass, txtNewPass, txtConfirmPass],
+                       onError=lambda e: messagebox.showerror('Error', f'Failed to change password: {str(e)}'))
+
+    def _showResult(self, result):
+        """ Show the (success, message) result of a bank call """
+        success, message = result
+        if success:
+            messagebox.showinfo('Success', message)
+        else:
+            messagebox.showerror('Error', message)
 
     def showUserScreen(self):
         """ Display the user dashboard with button-based navigation """
@@ -364,6 +377,7 @@ class GUIinterface:
         self.mainWindow.title(f'Tambank - Welcome {self.activeAccount.fName}!')
         self.mainWindow.geometry('1024x768')
         self.mainWindow.resizable(True, True)
+        self.tasks.attach(self.mainWindow)
 
         # try except block for images
         try:
@@ -572,17 +586,23 @@ class GUIinterface:
                 messagebox.showerror("Error", "Amount must be greater than 0.")
                 return
                 
-            success, message = self.bank.deposit(self.activeAccount.accountNumber, amount_value)
-
-            if success:
-                messagebox.showinfo("Success", message)
-                self.activeAccount = self.bank.getAccount(self.activeAccount.accountNumber)
-                balanceLabel.config(text=f"PHP {self.activeAccount.balance:.2f}")
-                amount_entry.delete(0, END)  
-            else:
-                messagebox.showerror("Error", message)
+            self.tasks.run(self.bank.deposit, self.activeAccount.accountNumber, amount_value,
+                           onDone=lambda result: self._afterBalanceChange(result, balanceLabel, [amount_entry]),
+                           busy=[amount_entry], status='Processing...')
         except ValueError:
             messagebox.showerror("Error", "Enter a valid amount.")
+
+    def _afterBalanceChange(self, result, balanceLabel, entries):
+        """ Show the result of a deposit, withdrawal or transfer and refresh the balance shown """
+        success, message = result
+        if success:
+            messagebox.showinfo("Success", message)
+            self.activeAccount = self.bank.getAccount(self.activeAccount.accountNumber)
+            balanceLabel.config(text=f"PHP {self.activeAccount.balance:.2f}")
+            for entry in entries:
+                entry.delete(0, END)
+        else:
+            messagebox.showerror("Error", message)
                 
     def _processWithdraw(self, amount_entry, balanceLabel):
         """ withdraw transaction backend """
@@ -594,15 +614,9 @@ class GUIinterface:
                 messagebox.showerror("Error", "Amount must be greater than 0.")
                 return
                 
-            success, message = self.bank.withdraw(self.activeAccount.accountNumber, amount_value)
-
-            if success:
-                messagebox.showinfo("Success", message)
-                self.activeAccount = self.bank.getAccount(self.activeAccount.accountNumber)
-                balanceLabel.config(text=f"PHP {self.activeAccount.balance:.2f}")
-                amount_entry.delete(0, END)
-            else:
-                messagebox.showerror("Error", message)
+            self.tasks.run(self.bank.withdraw, self.activeAccount.accountNumber, amount_value,
+                           onDone=lambda result: self._afterBalanceChange(result, balanceLabel, [amount_entry]),
+                           busy=[amount_entry], status='Processing...')
         except ValueError:
             messagebox.showerror("Error", "Enter a valid amount.")
 
@@ -671,19 +685,10 @@ class GUIinterface:
             if not confirm:
                 return
             
-            success, message = self.bank.transaction(
-                self.activeAccount.accountNumber, toAcc_number, amount_value, description
-            )
-
-            if success:
-                messagebox.showinfo("Success", message)
-                self.activeAccount = self.bank.getAccount(self.activeAccount.accountNumber)
-                balVal.config(text=f"PHP {self.activeAccount.balance:.2f}")
-                toAccEntry.delete(0, END)
-                amountEntry.delete(0, END)
-                descEntry.delete(0, END)
-            else:
-                messagebox.showerror("Error", message)
+            entries = [toAccEntry, amountEntry, descEntry]
+            self.tasks.run(self.bank.transaction, self.activeAccount.accountNumber, toAcc_number, amount_value, description,
+                           onDone=lambda result: self._afterBalanceChange(result, balVal, entries),
+                           busy=entries, status='Processing...')
 
         except ValueError:
             messagebox.showerror("Error", "Enter a valid amount.")
@@ -750,7 +755,10 @@ class GUIinterface:
         treeFrame.pack(fill=BOTH, expand=True, padx=20, pady=10)
         
         columns = ('date', 'description', 'amount', 'transacId')
-        tree = ttk.Treeview(treeFrame, columns=columns, show='headings')
+        # later pages are read from the ledger on the worker
+        tree = VirtualTreeview(treeFrame, columns=columns, show='headings', tasks=self.tasks,
+                               tags={'positive': {'foreground': 'green'},
+                                     'negative': {'foreground': 'red'}})
         
         tree.heading('date', text='Date')
         tree.heading('description', text='Description')
@@ -763,55 +771,47 @@ class GUIinterface:
         tree.column('transacId', width=150)
         
         y_scrollbar = ttk.Scrollbar(treeFrame, orient=VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=y_scrollbar.set)
+        tree.attachScrollbar(y_scrollbar)
         
         y_scrollbar.pack(side=RIGHT, fill=Y)
         tree.pack(side=LEFT, fill=BOTH, expand=True)
         
-        try:
-            transactions = self.bank.getAccountTransactions(self.activeAccount.accountNumber)
-            
-            if not transactions:
-                tree.insert('', 'end', values=('', 'No transactions found', '', ''))
-            else:
-                for transaction in transactions:
-                    try:
-                        if hasattr(transaction['date'], 'strftime'):
-                            date_str = transaction['date'].strftime('%Y-%m-%d %H:%M:%S')
-                        else:
-                            date_str = str(transaction['date'])
-                        
-                        if float(transaction['amount']) >= 0:
-                            amount_str = f"PHP +{float(transaction['amount']):.2f}"
-                            tag = 'positive'
-                        else:
-                            amount_str = f"PHP {float(transaction['amount']):.2f}"
-                            tag = 'negative'
-                        
-                        transacId = transaction.get('transacId', '')
-                        description = transaction.get('description', 'Transaction')
-                        
-                        item_id = tree.insert('', 'end', values=(date_str, description, 
-                                                    amount_str, transacId))
-                        
-                        if tag == 'positive':
-                            tree.tag_configure('positive', foreground='green')
-                            tree.item(item_id, tags=('positive',))
-                        elif tag == 'negative':
-                            tree.tag_configure('negative', foreground='red')
-                            tree.item(item_id, tags=('negative',))
-                            
-                    except (KeyError, ValueError, AttributeError) as e:
-                        print(f"Error processing transaction: {e}")
-                        continue
-        except Exception as e:
+        def loaded(transactions):
+            tree.setSource(transactions, self._historyRow, emptyValues=('', 'No transactions found', '', ''))
+
+        def failed(e):
             messagebox.showerror("Error", f"Could not load transaction history: {e}")
+            tree.clear()
             tree.insert('', 'end', values=('', f'Error: {str(e)}', '', ''))
+
+        # newest first, the first page is read on the worker and the rest streamed from the ledger as the tree is scrolled
+        accountNumber = self.activeAccount.accountNumber
+        self.tasks.run(lambda: TaskRunner.prefetch(self.bank.iterAccountTransactions(accountNumber), tree.pageSize),
+                       onDone=loaded, onError=failed, key='history')
         
         refreshBtn = Button(frame, text="Refresh History", font=('Helvetica', 12),
                         command=lambda: self._refreshHistory(frame))
         refreshBtn.pack(pady=10)
 
+    def _historyRow(self, transaction):
+        """ Treeview values and tags of a transaction """
+        if hasattr(transaction['date'], 'strftime'):
+            date_str = transaction['date'].strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            date_str = str(transaction['date'])
+        
+        if float(transaction['amount']) >= 0:
+            amount_str = f"PHP +{float(transaction['amount']):.2f}"
+            tag = 'positive'
+        else:
+            amount_str = f"PHP {float(transaction['amount']):.2f}"
+            tag = 'negative'
+        
+        transacId = transaction.get('transacId', '')
+        description = transaction.get('description', 'Transaction')
+        
+        return (date_str, description, amount_str, transacId), (tag,)
+
     def _refreshHistory(self, frame):
         """Refresh the transaction history"""
         try:
@@ -870,7 +870,7 @@ class GUIinterface:
         """ Starting The Admin Interface """
         from interface.aInterface import AdminGUIinterface
         
-        adminGUI = AdminGUIinterface(self.bank)
+        adminGUI = AdminGUIinterface(self.bank, self.tasks)
         adminGUI.start()
 
 
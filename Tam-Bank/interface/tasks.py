@@ -0,0 +1,147 @@
+import itertools
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox, TclError, DISABLED, NORMAL
+
+class TaskRunner:
+    """ Runs bank calls on a worker thread so the window keeps redrawing while storage is busy.
+        Tk may only be touched from the thread running mainloop(), so workers put their results on a queue that
+        the window polls with after(), and the callbacks run there. Calls made with the same key supersede each
+        other: an older call that has not started is cancelled and the result of one already running is dropped. """
+    # milliseconds between two polls of the result queue
+    pollInterval = 30
+
+    def __init__(self, workers=1):
+        """ One worker by default so bank calls still run one at a time, in the order they were made """
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="TamBankTask")
+        self.results = queue.Queue()
+        self.latest = {}
+        self.generation = 0
+        self.pending = 0
+        self.window = None
+        self.statusLabel = None
+        self.pollId = 0
+
+    def attach(self, window, statusLabel=None):
+        """ Deliver results on the main loop of a window, called every time the GUI opens a new Tk window.
+            statusLabel is an optional Label showing what is running. """
+        self.window = window
+        self.statusLabel = statusLabel
+        self.pollId += 1
+        self._poll(self.pollId)
+
+    def run(self, function, *args, onDone=None, onError=None, key=None, busy=(), status="Working..."):
+        """ Call function(*args) on a worker. onDone(result) or onError(exception) run on the window's thread,
+            without onError the exception is shown in an error box. The busy widgets are disabled until the
+            call finishes. Returns the future of the call. """
+        self.generation += 1
+        generation = self.generation
+
+        if key is not None:
+            previous = self.latest.get(key)
+            if previous is not None:
+                previous[1].cancel()
+
+        for widget in busy:
+            TaskRunner._setState(widget, DISABLED)
+        self.pending += 1
+        self._showBusy(status)
+
+        future = self.executor.submit(function, *args)
+        if key is not None:
+            self.latest[key] = (generation, future)
+        future.add_done_callback(lambda done: self.results.put((generation, key, done, onDone, onError, busy)))
+        return future
+
+    def cancel(self, key):
+        """ Forget the pending call of a key, its result will not be delivered """
+        previous = self.latest.pop(key, None)
+        if previous is not None:
+            previous[1].cancel()
+
+    def isCurrent(self, key, generation):
+        """ True if generation is the latest call made with key """
+        latest = self.latest.get(key)
+        return latest is not None and latest[0] == generation
+
+    def _poll(self, pollId):
+        """ Run the callbacks of finished calls, then poll again. A poll of a window that was replaced stops. """
+        if pollId != self.pollId:
+            return
+
+        while True:
+            try:
+                generation, key, future, onDone, onError, busy = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(generation, key, future, onDone, onError, busy)
+
+        try:
+            self.window.after(TaskRunner.pollInterval, self._poll, pollId)
+        except (TclError, RuntimeError):
+            # the window was destroyed, the next attach() starts polling again
+            pass
+
+    def _deliver(self, generation, key, future, onDone, onError, busy):
+        """ Hand the outcome of one call to its callback unless a newer call with the same key replaced it """
+        self.pending -= 1
+        for widget in busy:
+            TaskRunner._setState(widget, NORMAL)
+
+        stale = key is not None and not self.isCurrent(key, generation)
+        if key is not None and not stale:
+            del self.latest[key]
+        if not stale and not future.cancelled():
+            error = future.exception()
+            try:
+                if error is not None:
+                    if onError:
+                        onError(error)
+                    else:
+                        print(f"Error in background task: {error}")
+                        messagebox.showerror('Error', f'An error occurred: {error}')
+                elif onDone:
+                    onDone(future.result())
+            except TclError as e:
+                # the widgets of the callback were closed while the call was running
+                print(f"Error delivering task result: {e}")
+        self._showBusy()
+
+    def _showBusy(self, status=None):
+        """ Show a busy cursor and the status text while calls are pending """
+        busy = self.pending > 0
+        try:
+            if self.window is not None:
+                self.window.config(cursor="watch" if busy else "")
+            if self.statusLabel is not None:
+                self.statusLabel.config(text=(status or self.statusLabel.cget('text')) if busy else "")
+        except TclError:
+            pass
+
+    @staticmethod
+    def _setState(widget, state):
+        """ Enable or disable a widget that may already be destroyed """
+        try:
+            widget.config(state=state)
+        except TclError:
+            pass
+
+    @staticmethod
+    def prefetch(items, count):
+        """ Read the first count items of an iterable now, meant to be called on the worker so the first page of a
+            table is read off the main loop. Returns an iterator over every item, closing it closes the source. """
+        items = iter(items)
+        first = list(itertools.islice(items, count))
+
+        def rows():
+            try:
+                yield from first
+                yield from items
+            finally:
+                if hasattr(items, 'close'):
+                    items.close()
+        return rows()
+
+    def shutdown(self):
+        """ Stop the worker once the calls already made have finished """
+        self.executor.shutdown(wait=True)
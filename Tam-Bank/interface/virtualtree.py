@@ -0,0 +1,135 @@
+import threading
+from itertools import islice
+from tkinter import ttk
+
+class VirtualTreeview(ttk.Treeview):
+    """ Treeview that is filled page by page from an iterator as it is scrolled, instead of inserting every row up front.
+        Opening a table only reads and renders the first page, the next page is fetched once the view is scrolled
+        within a page of the end. Tags are configured once when the table is created.
+        With a TaskRunner the pages after the first are read on its worker and inserted when they arrive, so a source
+        that reads storage never blocks the main loop. The source is closed when the tree is cleared or destroyed. """
+    # fetch the next page once the bottom of the view passes this fraction of the loaded rows
+    fetchThreshold = 0.9
+
+    def __init__(self, master=None, pageSize=100, tags=None, tasks=None, **kw):
+        super().__init__(master, **kw)
+        self.pageSize = pageSize
+        self.tasks = tasks
+        self.source = None
+        self.formatRow = None
+        self.scrollbar = None
+        self.fetchPending = False
+        # held while the worker reads a page, a source is only closed when no page is being read from it
+        self.sourceLock = threading.Lock()
+
+        for tag, options in (tags or {}).items():
+            self.tag_configure(tag, **options)
+        super().configure(yscrollcommand=self._onScroll)
+        self.bind('<Destroy>', self._onDestroy, add='+')
+
+    def attachScrollbar(self, scrollbar):
+        """ Forward the scroll position to a scrollbar, use this instead of configure(yscrollcommand=...) """
+        self.scrollbar = scrollbar
+
+    def clear(self):
+        """ Remove every row and stop reading from the current source """
+        self._closeSource()
+        children = self.get_children()
+        if children:
+            self.delete(*children)
+
+    def _closeSource(self):
+        """ Release the current source, generators reading from storage are closed. One the worker is reading a
+            page from is closed on the worker once the page is read, without a TaskRunner it is closed here once the
+            page is read. """
+        source = self.source
+        self.source = None
+        self.fetchPending = False
+        if source is None or not hasattr(source, 'close'):
+            return
+        if self.sourceLock.acquire(blocking=False):
+            try:
+                source.close()
+            finally:
+                self.sourceLock.release()
+        elif self.tasks is None:
+            self._close(source)
+        else:
+            self.tasks.run(self._close, source)
+
+    def _close(self, source):
+        """ Close a source on the worker, after the page being read from it """
+        with self.sourceLock:
+            source.close()
+
+    def _onDestroy(self, event):
+        """ Close the source when the tree goes away with its window """
+        if event.widget is self:
+            self._closeSource()
+
+    def setSource(self, items, formatRow, emptyValues=None):
+        """ Show the rows of an iterable. formatRow(item) returns (values, tags).
+            emptyValues is shown as a single row when the iterable has no items.
+            The first page is read right away, callers with a source that reads storage prefetch it on the worker. """
+        self.clear()
+        source = self.source = iter(items)
+        self.formatRow = formatRow
+        # nothing else has the new source yet, so it is read without the lock
+        if self._insertPage(source, list(islice(source, self.pageSize))) == 0 and emptyValues is not None:
+            self.insert('', 'end', values=emptyValues)
+
+    def _readPage(self, source):
+        """ The next page of items of a source, fewer than pageSize once it runs out """
+        with self.sourceLock:
+            return list(islice(source, self.pageSize))
+
+    def fetchPage(self):
+        """ Append the next page of rows, returns the number of rows added. With a TaskRunner the page is read on
+            the worker and 0 is returned, no other page is fetched until it was inserted. """
+        source = self.source
+        if source is None:
+            self.fetchPending = False
+            return 0
+        if self.tasks is None:
+            return self._insertPage(source, self._readPage(source))
+
+        self.fetchPending = True
+        self.tasks.run(self._readPage, source, status="Loading rows...",
+                       onDone=lambda page: self._insertPage(source, page),
+                       onError=lambda e: self._pageFailed(source, e))
+        return 0
+
+    def _insertPage(self, source, page):
+        """ Insert the rows of a page read from source, returns the number of rows added. A page of a source the
+            tree no longer shows is dropped. """
+        if source is not self.source:
+            return 0
+        self.fetchPending = False
+        if len(page) < self.pageSize:
+            self._closeSource()
+
+        added = 0
+        for item in page:
+            try:
+                values, tags = self.formatRow(item)
+            except (KeyError, ValueError, AttributeError) as e:
+                print(f"Error formatting row: {e}")
+                continue
+            self.insert('', 'end', values=values, tags=tags)
+            added += 1
+        return added
+
+    def _pageFailed(self, source, error):
+        """ Stop reading a source whose page could not be read """
+        print(f"Error reading rows: {error}")
+        if source is self.source:
+            self._closeSource()
+
+    def _onScroll(self, first, last):
+        """ yscrollcommand: update the scrollbar and fetch the next page when the view nears the end """
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if self.source is not None and not self.fetchPending and float(last) >= VirtualTreeview.fetchThreshold:
+            # fetched after the current redraw so scrolling stays responsive
+            self.fetchPending = True
+            self.after_idle(self.fetchPage)
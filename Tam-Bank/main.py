@@ -6,7 +6,10 @@ def main():
     bank = TamBank()
 
     app = GUIinterface(bank)
-    app.start()
+    try:
+        app.start()
+    finally:
+        bank.close()
         
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,79 @@
+import sys
+import argparse
+from storage.csvstore import CsvAccountRepository, CsvApplicationRepository, CsvLedgerRepository
+from storage.ledgerpartitions import PartitionedLedgerRepository
+from storage.sqlitestore import SqliteDatabase, SqliteAccountRepository, SqliteLedgerRepository, SqliteApplicationRepository
+from utils.config import Config
+
+def migrate(databaseFile):
+    """ Copy the accounts, ledger and applications from the userinfo .csv files into a sqlite database """
+    database = SqliteDatabase(databaseFile)
+    try:
+        ledger = SqliteLedgerRepository(database)
+        if database.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]:
+            print(f"{databaseFile} already has transactions, refusing to migrate twice")
+            return False
+
+        accounts = CsvAccountRepository().loadAll(withTransactions=False)
+        success, message = SqliteAccountRepository(database).saveAll(accounts)
+        if not success:
+            print(message)
+            return False
+        print(f"Migrated {len(accounts)} accounts")
+
+        ledger.appendMany(PartitionedLedgerRepository().scan())
+        count = database.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        print(f"Migrated {count} transactions")
+
+        applications = CsvApplicationRepository().loadAll()
+        SqliteApplicationRepository(database).importAll(applications)
+        print(f"Migrated {len(applications)} applications")
+        return True
+    finally:
+        database.close()
+
+def splitLedger():
+    """ Move the rows of the single-file transactions.csv into the monthly ledger partitions, returns (success, message) """
+    ledger = PartitionedLedgerRepository()
+    try:
+        return ledger.splitLegacy()
+    finally:
+        ledger.close()
+
+def upgradeLedger():
+    """ Rewrite a transactions.csv in an older ledger layout in the current one, returns (success, message) """
+    ledger = CsvLedgerRepository()
+    try:
+        return ledger.upgrade()
+    finally:
+        ledger.close()
+
+def main():
+    """ Entry point: python Tam-Bank/migrate.py [database file], python Tam-Bank/migrate.py --split-ledger or
+        python Tam-Bank/migrate.py --upgrade-ledger """
+    parser = argparse.ArgumentParser(description="Copy the userinfo .csv files into a sqlite database, or split the "
+                                                 "single-file transactions.csv into the monthly ledger partitions "
+                                                 "the csv storage backend reads.")
+    parser.add_argument("databaseFile", nargs="?", default=Config.databaseFile,
+                        help=f"sqlite database to create, defaults to {Config.databaseFile}")
+    parser.add_argument("--split-ledger", action="store_true",
+                        help="move the rows of transactions.csv into the ledger partitions and remove it, "
+                             "until then it is read in place")
+    parser.add_argument("--upgrade-ledger", action="store_true",
+                        help="rewrite a transactions.csv in an older ledger layout in the current one, "
+                             "until then it is read as it is")
+    args = parser.parse_args()
+
+    if args.split_ledger or args.upgrade_ledger:
+        success, message = splitLedger() if args.split_ledger else upgradeLedger()
+        print(message)
+        if not success:
+            sys.exit(1)
+        return
+
+    if not migrate(args.databaseFile):
+        sys.exit(1)
+    print(f"Done, start TamBank with TAMBANK_STORAGE=sqlite to use {args.databaseFile}")
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,67 @@
 from datetime import datetime
 from utils.password import Password
 from utils.filehandling import FileHandling
-import random
+from utils.accountnumbers import AccountNumberAllocator
+from models.transactionhistory import TransactionHistory, TransactionCache
+from utils.money import Money
 
 class Account:
     """ Class account that will register and handle operations of the account management and transaction processing system, as well as record the transactions per account. """
+    # no per-instance __dict__, accountType is only set for accounts loaded from storage
+    __slots__ = ('accountNumber', 'fName', 'lName', 'mobileNo', 'email', 'cents', 'dateOpened',
+                 '_transactions', 'status', 'passHash', 'bankType', 'accountType')
+
     def __init__(self, accountNumber=None, fName="", lName="", initialBal=0.0, mobileNo="", email="", passHash=None, bankType = 'Savings'):
         """ Initialize the account with the following details: """
-        self.accountNumber = accountNumber if accountNumber else str(random.randint(20210000, 20230000))
+        self.accountNumber = accountNumber if accountNumber else AccountNumberAllocator().allocate()
         self.fName = fName
         self.lName = lName
         self.mobileNo = mobileNo
         self.email = email
         
-        initialBal = float(initialBal) if not isinstance(initialBal, float) else initialBal
-        if initialBal < 0:
+        initialCents = Money.toCents(initialBal)
+        if initialCents < 0:
             raise ValueError("Initial balance cannot be negative")
             
-        self.balance = initialBal
+        self.cents = initialCents
         self.dateOpened = datetime.now()
-        self.transactions = []
+        # loaded from the ledger on first access
+        self._transactions = None
         self.status = "Active"
         self.passHash = passHash
         self.bankType = bankType
-        if initialBal > 0:
-            self._recordTransaction("Initial Deposit", initialBal)
+        if initialCents > 0:
+            # a new account has no ledger rows to read, its history starts out loaded and empty
+            TransactionCache.put(self, TransactionHistory(self.accountNumber))
+            self._recordTransaction("Initial Deposit", Money.toUnits(initialCents))
+
+    @property
+    def balance(self):
+        """ Balance in pesos, the exact amount is kept in integer cents """
+        return Money.toUnits(self.cents)
+
+    @balance.setter
+    def balance(self, amount):
+        """ Set the balance from an amount in pesos """
+        self.cents = Money.toCents(amount)
+
+    @property
+    def transactions(self):
+        """ Transaction history of the account, a TransactionHistory that reads like a list of dictionaries.
+            It is loaded on first access and kept in the TransactionCache LRU. """
+        history = self._transactions
+        if history is None:
+            return TransactionCache.load(self)
+        TransactionCache.touch(self.accountNumber)
+        history.accountNumber = self.accountNumber
+        return history
+
+    @transactions.setter
+    def transactions(self, transactions):
+        """ Store a list of transaction dictionaries column by column """
+        if not isinstance(transactions, TransactionHistory):
+            transactions = TransactionHistory(self.accountNumber, transactions)
+        self._transactions = transactions
 
     def setPassword(self, password):
         """ Password setting for account """
@@ -50,13 +87,13 @@ class Account:
             bank = Bank()
             return bank.deposit(self.accountNumber, amount)
         except ImportError:
-            amount = float(amount) if not isinstance(amount, float) else amount
-            if amount <= 0:
+            cents = Money.toCents(amount)
+            if cents <= 0:
                 return False, "Deposit amount must be greater than 0"
             
-            self.balance += amount
-            self._recordTransaction("Deposit", amount)
-            return True, f"Deposited PHP {amount:.2f}."
+            self.cents += cents
+            self._recordTransaction("Deposit", Money.toUnits(cents))
+            return True, f"Deposited PHP {Money.format(cents)}."
         
     def withdrawAcc(self, amount):
         """Delegate to Bank withdraw method"""
@@ -65,16 +102,16 @@ class Account:
             bank = Bank()
             return bank.withdraw(self.accountNumber, amount)
         except ImportError:
-            amount = float(amount) if not isinstance(amount, float) else amount
-            if amount <= 0:
+            cents = Money.toCents(amount)
+            if cents <= 0:
                 return False, "Withdrawal amount must be greater than 0"
                 
-            if self.balance < amount:
+            if self.cents < cents:
                 return False, "Insufficient funds"
                 
-            self.balance -= amount
-            self._recordTransaction("Withdrawal", -amount)
-            return True, f"Withdrew PHP {amount:.2f}."
+            self.cents -= cents
+            self._recordTransaction("Withdrawal", -Money.toUnits(cents))
+            return True, f"Withdrew PHP {Money.format(cents)}."
 
     def _recordTransaction(self, description, amount):
         """ Record the transaction """
@@ -99,11 +136,24 @@ class Account:
     
     def closeAcc(self):
         """ Delete the account from the .csv file but maintain the transactions especially bank transfers. """
-        if self.balance > 0:
+        if self.cents > 0:
             return False, "Cannot close account with positive balance."
         self.status = "Closed"
         return True, "Account closed successfully"
 
+    def copyFrom(self, other):
+        """ Take the stored details of another copy of this account, keeping the loaded transactions.
+            Returns True if any detail changed. """
+        changed = False
+        for slot in Account.__slots__:
+            if slot in ('accountNumber', '_transactions'):
+                continue
+            value = getattr(other, slot, None)
+            if getattr(self, slot, None) != value:
+                setattr(self, slot, value)
+                changed = True
+        return changed
+
     def __str__(self):
         """ String representation of the account """
         return (f"Account Number: {self.accountNumber}\n"
@@ -0,0 +1,160 @@
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from utils.money import Money
+from utils.config import Config
+from utils.filehandling import FileHandling
+
+class TransactionHistory:
+    """ Transactions of one account stored column by column in arrays: epoch seconds, amounts and balances in
+        integer cents, and description codes. It behaves like the list of transaction dictionaries it replaces,
+        each item is built on access as {'date', 'description', 'amount', 'balance', 'accountNumber'}. """
+    __slots__ = ('accountNumber', 'dates', 'amounts', 'balances', 'descriptions')
+
+    # descriptions repeat a lot, every history stores a code into this shared table instead of the text
+    descriptionCodes = {}
+    descriptionTexts = []
+    # histories load on TaskRunner threads, two of them adding the same new description must not get two codes
+    descriptionLock = threading.Lock()
+
+    def __init__(self, accountNumber="", transactions=()):
+        self.accountNumber = accountNumber
+        self.dates = array('q')
+        self.amounts = array('q')
+        self.balances = array('q')
+        self.descriptions = array('I')
+        self.extend(transactions)
+
+    @staticmethod
+    def _descriptionCode(description):
+        """ Code of a description in the shared table, adding it if it is new. Known descriptions are looked up
+            without the lock, a code is only published once its text is in the table. """
+        code = TransactionHistory.descriptionCodes.get(description)
+        if code is None:
+            with TransactionHistory.descriptionLock:
+                code = TransactionHistory.descriptionCodes.get(description)
+                if code is None:
+                    TransactionHistory.descriptionTexts.append(description)
+                    code = len(TransactionHistory.descriptionTexts) - 1
+                    TransactionHistory.descriptionCodes[description] = code
+        return code
+
+    def append(self, transaction):
+        """ Add a transaction dictionary """
+        self.appendCents(transaction.get('date'), transaction.get('description', ''),
+                         Money.toCents(transaction.get('amount', 0)), Money.toCents(transaction.get('balance', 0)))
+
+    def appendCents(self, date, description, cents, balanceCents=0):
+        """ Add a transaction whose amount and balance are already in cents, the way ledger rows are read """
+        self.dates.append(int((date or datetime.now()).timestamp()))
+        self.amounts.append(cents)
+        self.balances.append(balanceCents)
+        self.descriptions.append(TransactionHistory._descriptionCode(str(description)))
+
+    def fillBalances(self, closingCents):
+        """ Set the running balance of every transaction, counting back from the balance after the last one.
+            The ledger does not keep running balances, and an account can hold money no ledger row put there. """
+        balances = [0] * len(self.amounts)
+        balance = closingCents
+        for index in range(len(balances) - 1, -1, -1):
+            balances[index] = balance
+            balance -= self.amounts[index]
+        self.balances = array('q', balances)
+
+    def extend(self, transactions):
+        """ Add transaction dictionaries """
+        for transaction in transactions:
+            self.append(transaction)
+
+    def _row(self, index):
+        """ Transaction dictionary of one position """
+        return {
+            'date': datetime.fromtimestamp(self.dates[index]),
+            'description': TransactionHistory.descriptionTexts[self.descriptions[index]],
+            'amount': Money.toUnits(self.amounts[index]),
+            'balance': Money.toUnits(self.balances[index]),
+            'accountNumber': self.accountNumber
+        }
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transaction index out of range")
+        return self._row(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._row(index)
+
+    def __repr__(self):
+        return f"TransactionHistory({self.accountNumber!r}, {len(self)} transactions)"
+
+
+class TransactionCache:
+    """ Bounded LRU of the transaction histories loaded on demand by Account.transactions.
+        loader(accountNumber) returns the transaction dictionaries of an account, or a TransactionHistory of its
+        ledger rows whose running balances are then counted back from the account balance. The bank installs one
+        that reads through the ledger index. When an account falls out of the cache its history is dropped and loaded again
+        on its next access. """
+    loader = None
+    capacity = Config.transactionCacheSize
+
+    entries = OrderedDict()
+    lock = threading.RLock()
+
+    @staticmethod
+    def load(account):
+        """ Load the history of an account and put the account at the front of the cache """
+        loader = TransactionCache.loader or FileHandling.loadTransactions
+        try:
+            transactions = loader(account.accountNumber)
+        except Exception as e:
+            print(f"Error loading transactions for {account.accountNumber}: {e}")
+            transactions = []
+        if isinstance(transactions, TransactionHistory):
+            transactions.fillBalances(account.cents)
+        else:
+            transactions = TransactionHistory(account.accountNumber, transactions)
+        return TransactionCache.put(account, transactions)
+
+    @staticmethod
+    def put(account, history):
+        """ Give an account a loaded history and put it at the front of the cache, evicting the oldest ones """
+        with TransactionCache.lock:
+            account._transactions = history
+            TransactionCache.entries[account.accountNumber] = account
+            TransactionCache.entries.move_to_end(account.accountNumber)
+            while len(TransactionCache.entries) > max(1, TransactionCache.capacity):
+                accountNumber, evicted = TransactionCache.entries.popitem(last=False)
+                evicted._transactions = None
+        return history
+
+    @staticmethod
+    def touch(accountNumber):
+        """ Mark a cached history as recently used """
+        with TransactionCache.lock:
+            if accountNumber in TransactionCache.entries:
+                TransactionCache.entries.move_to_end(accountNumber)
+
+    @staticmethod
+    def invalidate(accountNumber):
+        """ Drop the cached history of an account after its ledger rows changed """
+        with TransactionCache.lock:
+            account = TransactionCache.entries.pop(accountNumber, None)
+            if account is not None:
+                account._transactions = None
+
+    @staticmethod
+    def clear():
+        """ Drop every cached history """
+        with TransactionCache.lock:
+            for account in TransactionCache.entries.values():
+                account._transactions = None
+            TransactionCache.entries.clear()
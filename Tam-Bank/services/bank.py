@@ -1,46 +1,270 @@
 from models.account import Account
+from models.transactionhistory import TransactionHistory, TransactionCache
+from storage.repository import createRepositories
+from storage.ledgerwriter import LedgerWriter
+from storage.ledgerschema import LedgerSchema
+from services.stats import StatsEngine
+from services.search import AccountSearchIndex
+from services.postings import PostingReport
+from utils.transacid import TransactionIdGenerator
+from utils.accountnumbers import AccountNumberAllocator
+from utils.money import Money
 from utils.filehandling import FileHandling
+from utils.config import Config
+from utils.accountlocks import AccountLocks
+from utils.filelock import FileLock
+from utils.atomicfile import AtomicFile
+from contextlib import contextmanager, closing
 from datetime import datetime, timedelta
-import random, csv, os, hashlib
+import csv, os, hashlib, itertools, threading
 
 class TamBank:
     """ Manager class for the bank """
-    def __init__(self):
+    # posting types accepted by postMany and the operation named in their status errors
+    postingTypes = {'deposit': "deposit", 'withdraw': "withdrawal", 'withdrawal': "withdrawal", 'transfer': "transfer"}
+    passwordFile = 'Tam-Bank/userinfo/password.csv'
+
+    def __init__(self, backend=None):
+        """ Initialize the bank with the storage backend from Config unless one is given ("csv" or "sqlite") """
         self.accounts = {}
-        accountList = FileHandling.loadFile()
-        for account in accountList:
-            self.accounts[account.accountNumber] = account
+        # balances are changed under the lock of their account, the account store and the statistics and
+        # search indexes are shared by every account and changed under storeLock. Both locks are also held
+        # against the other TamBank processes using the same files.
+        self.accountLocks = AccountLocks()
+        self.accountRepo, self.ledgerRepo, self.applicationRepo = createRepositories(backend)
+        self.storeLock = self.accountRepo.storeLock
+        self.passwordLock = FileLock(TamBank.passwordFile + ".lock")
+        # accounts locked by an operation that already merged them with storage, their in-memory state is the newest
+        self.inUse = set()
+        self.ledgerWriter = LedgerWriter(self.ledgerRepo)
+        self.transacIds = TransactionIdGenerator()
+        self.accountNumbers = AccountNumberAllocator(exists=lambda accountNumber: accountNumber in self.accounts)
+        # storage signature the in-memory accounts match, and whether a write path asked for a reload
+        self.accountsSignature = None
+        self.accountsStale = False
+        self.stats = StatsEngine()
+        # one thread at a time reads what was appended to the ledger into the transaction histogram
+        self.histogramLock = threading.Lock()
+        # the statistics and the search index are built on first use after the accounts were loaded, a start
+        # that never reads them does not pay for them
+        self.statsPending = False
+        self.searchPending = False
+        # Account.transactions is loaded on demand through the ledger index
+        TransactionCache.loader = self._loadHistory
+        # the FileHandling ledger helpers go through this bank's ledger and its locks
+        FileHandling.ledger = self.ledgerRepo
+        self.search = AccountSearchIndex()
+        self._loadAccounts()
     
-    def _loadAccounts(self):
-        """ Load the transactions from each account in the .csv file"""
-        # load the accounts from the .csv file
-        self.accounts = FileHandling.loadFile(self)
-        # for loop to load the transactions from each account
-        for account in self.accounts:
-            account.transactions = FileHandling.loadTransactions(account.accountNumber)
-        return len(self.accounts)
+    def _loadAccounts(self, withTransactions=False):
+        """ Load the accounts from the account repository, their transactions are loaded on first access """
+        with self.storeLock:
+            self.accounts = self.accountRepo.loadByNumber(withTransactions=withTransactions)
+            self.accountsStale = False
+            TransactionCache.clear()
+            self.statsPending = True
+            self.searchPending = True
+            self._syncSignature()
+
+            if self.accountRepo.needsCompaction():
+                self._saveAccounts()
+            return len(self.accounts)
+
+    def _refreshAccounts(self, keep=()):
+        """ Merge the accounts other processes stored since our last read or write into the in-memory ones.
+            Accounts in use by an operation of this bank, and the keep accounts about to be stored, are left alone
+            since they are newer in memory. Returns True if storage had changed. """
+        with self.storeLock:
+            try:
+                signature = self.accountRepo.signature()
+            except Exception:
+                signature = None
+            if not self.accountsStale and signature is not None and signature == self.accountsSignature:
+                return False
+
+            skip = set(self.inUse) | {account.accountNumber for account in keep}
+            changed = None if self.accountsStale else self.accountRepo.mergeChanges(self.accounts, skip)
+            if changed is not None:
+                # only the changes were read, straight into the in-memory accounts
+                for accountNumber in changed:
+                    self._indexAccount(self.accounts[accountNumber])
+                    TransactionCache.invalidate(accountNumber)
+            else:
+                self._mergeAccounts(skip)
+
+            self.accountsStale = False
+            self.accountsSignature = signature
+            if self.accountRepo.needsCompaction():
+                self._saveAccounts()
+            return True
+
+    def _mergeAccounts(self, skip):
+        """ Load every stored account and merge it into the in-memory ones, called by _refreshAccounts """
+        stored = {}
+        for account in self.accountRepo.loadAll(withTransactions=False):
+            stored[account.accountNumber] = account
+
+        for accountNumber in list(self.accounts):
+            if accountNumber not in stored and accountNumber not in skip:
+                del self.accounts[accountNumber]
+                self._unindexAccount(accountNumber)
+                TransactionCache.invalidate(accountNumber)
+        for accountNumber, account in stored.items():
+            if accountNumber in skip:
+                continue
+            current = self.accounts.get(accountNumber)
+            if current is None:
+                self.accounts[accountNumber] = account
+                self._indexAccount(account)
+            elif current.copyFrom(account):
+                self._indexAccount(current)
+                TransactionCache.invalidate(accountNumber)
+
+    @contextmanager
+    def _holdAccounts(self, *accountNumbers):
+        """ Lock accounts for a change, bringing them up to date with what other processes stored first """
+        with self.accountLocks.hold(*accountNumbers):
+            # an operation nested in another one on the same account keeps the state the outer one is changing
+            taken = {str(accountNumber) for accountNumber in accountNumbers} - self.inUse
+            # marked under the store lock so a merge running in another thread cannot overwrite them afterwards
+            with self.storeLock:
+                self._refreshAccounts()
+                self.inUse.update(taken)
+            try:
+                yield
+            finally:
+                self.inUse.difference_update(taken)
+
+    def _syncSignature(self):
+        """ Remember the storage signature after our own writes so they do not look like outside changes """
+        try:
+            self.accountsSignature = self.accountRepo.signature()
+        except Exception:
+            self.accountsSignature = None
+
+    def _indexAccount(self, account):
+        """ Update the statistics and the search index after an account was created or changed, one that is
+            still to be built will see the change when it is """
+        if not self.statsPending:
+            self.stats.updateAccount(account)
+        if not self.searchPending:
+            self.search.updateAccount(account)
+
+    def _unindexAccount(self, accountNumber):
+        """ Take a removed account out of the statistics and the search index """
+        if not self.statsPending:
+            self.stats.removeAccount(accountNumber)
+        if not self.searchPending:
+            self.search.removeAccount(accountNumber)
+
+    def _statsIndex(self):
+        """ The account statistics, counted on first use after the accounts were loaded """
+        with self.storeLock:
+            if self.statsPending:
+                self.stats.rebuild(self.accounts.values())
+                self.statsPending = False
+        return self.stats
+
+    def _searchIndex(self):
+        """ The account search index, built on first use after the accounts were loaded """
+        with self.storeLock:
+            if self.searchPending:
+                self.search.rebuild(self.accounts.values())
+                self.searchPending = False
+        return self.search
+
+    def invalidateAccounts(self):
+        """ Force the next getAllAccounts call to reload the accounts from storage """
+        self.accountsStale = True
+
+    def close(self):
+        """ Write the queued ledger rows, stop the ledger writer and snapshot the accounts for a fast next start """
+        self.ledgerWriter.close()
+        try:
+            with self.storeLock:
+                self._refreshAccounts()
+                success, message = self.accountRepo.writeSnapshot(self.accounts.values())
+        except Exception as e:
+            success, message = False, f"Error writing account snapshot: {e}"
+        if not success:
+            print(message)
     
     def _saveAccounts(self):
-        """ Save the accounts to the .csv file """
-        # save the accounts to the .csv file
-        accountsList = list(self.accounts.values())
-        return FileHandling.saveFile(accountsList)
+        """ Save every account to the account repository, for the .csv backend this compacts the account journal """
+        with self.storeLock:
+            # the snapshot replaces what is stored, so it must include what other processes stored first
+            self._refreshAccounts()
+            accountsList = list(self.accounts.values())
+            result = self.accountRepo.saveAll(accountsList)
+            self._syncSignature()
+            return result
+
+    def _recordChange(self, account, *fields):
+        """ Store only the changed fields of an account instead of rewriting every account """
+        return self._recordChanges([account], *fields)
+
+    def _recordChanges(self, accounts, *fields):
+        """ Store the changed fields of many accounts with one write """
+        with self.storeLock:
+            self._refreshAccounts(keep=accounts)
+            for account in accounts:
+                self._indexAccount(account)
+            try:
+                self.accountRepo.updateMany(accounts, *fields)
+            except Exception as e:
+                # the change could not be written on its own, fall back to a full save so it is not lost
+                print(f"Error saving account changes: {e}")
+                return self._saveAccounts()
+
+            if self.accountRepo.needsCompaction():
+                return self._saveAccounts()
+            self._syncSignature()
+            return True, "Change recorded"
     
-    def createAccount(self, fName="", lName="", initialBal=0.0, mobileNo="", email="", password=None):
-        """ Create a new account """
-        while True:
-            accountNumber = str(random.randint(20210000, 20230000))
-            if accountNumber not in self.accounts:
-                break
+    def reserveAccountNumbers(self, count):
+        """ Reserve account numbers for bulk onboarding, pass them to createAccount one by one """
+        return self.accountNumbers.reserve(count)
+
+    def createAccount(self, fName="", lName="", initialBal=0.0, mobileNo="", email="", password=None, accountNumber=None):
+        """ Create a new account, with a newly allocated account number unless a reserved one is given """
+        if not accountNumber:
+            accountNumber = self.accountNumbers.allocate()
         account = Account(accountNumber, fName, lName, initialBal, mobileNo, email)
 
         if password:
             account.setPassword(password)
         
-        self.accounts[accountNumber] = account
-        self._saveAccounts()
+        with self.storeLock:
+            self._refreshAccounts()
+            if accountNumber in self.accounts:
+                raise ValueError(f"Account number {accountNumber} is already in use")
+            self.accounts[accountNumber] = account
+            self._indexAccount(account)
+            try:
+                self.accountRepo.add(account)
+                self._syncSignature()
+            except Exception as e:
+                print(f"Error saving new account: {e}")
+                self._saveAccounts()
         return account
 
+    def submitApplication(self, fName, lName, mobileNo, email, initialBal, bankType):
+        """ Submit a new account application, returns (success, applicationId or error message) """
+        return self.applicationRepo.add(fName, lName, mobileNo, email, initialBal, bankType)
+
+    def getApplications(self, status=None):
+        """ Get all applications or only the ones with the given status """
+        return self.applicationRepo.loadAll(status)
+
+    def getApplication(self, applicationId):
+        """ Get a single application by its ID """
+        return self.applicationRepo.get(applicationId)
+
+    def updateApplicationStatus(self, applicationId, newStatus, expectedStatus=None):
+        """ Update the status of an application (Pending, Accepted, Declined).
+            With expectedStatus it fails when the application no longer has the status it was read with. """
+        return self.applicationRepo.updateStatus(applicationId, newStatus, expectedStatus)
+
     def _checkAccountStatus(self, accountNumber):
         """ Check if the account has been inactive for 3 months and update the status """
         from datetime import datetime, timedelta
@@ -49,23 +273,29 @@ class TamBank:
         if not account or account.status.lower() != "active":
             return False
         
-        transactions = self.getAccountTransactions(accountNumber)
-        
-        if not transactions:
-            lastActivityDate = account.dateOpened
-        else:
-            lastActivityDate = max(transaction['date'] for transaction in transactions)
-        
         current_date = datetime.now()
         threeMonthsAgo = current_date - timedelta(days=90)
         
-        if lastActivityDate < threeMonthsAgo:
-            account.status = "Inactive"
+        # only the transactions of the last three months are read, older ledger partitions are skipped
+        lastActivityDate = self.ledgerRepo.lastActivity(accountNumber, threeMonthsAgo)
+        if lastActivityDate is None:
+            # closed right away, so the partition file the first row was read from is not left open
+            with closing(self.ledgerRepo.iterAccount(accountNumber)) as rows:
+                if next(rows, None) is None:
+                    # an account that never made a transaction counts from the day it was opened
+                    lastActivityDate = account.dateOpened
+        
+        if lastActivityDate is None or lastActivityDate < threeMonthsAgo:
+            with self._holdAccounts(accountNumber):
+                # a teller may have used the account while its history was read
+                if account.status.lower() != "active":
+                    return False
+                account.status = "Inactive"
             
-            description = f"Account status changed to Inactive due to 3 months of inactivity"
-            self._saveTransaction(accountNumber, "SYSTEM", 0.0, description)
+                description = f"Account status changed to Inactive due to 3 months of inactivity"
+                self._saveTransaction(accountNumber, "SYSTEM", 0, description)
             
-            self._saveAccounts()
+                self._recordChange(account, 'status')
             
             return True
         
@@ -74,26 +304,29 @@ class TamBank:
     def reactivateAccount(self,accountNumber):
         """ reactivates an account when there is activity not just logging in. """
 
-        account = self.getAccount(accountNumber)
-        if not account:
-            return False, "Account not found"
+        with self._holdAccounts(accountNumber):
+            account = self.getAccount(accountNumber)
+            if not account:
+                return False, "Account not found"
         
-        if account.status.lower() != "inactive":
-            return False, f"Account is not inactive. Current status: {account.status}"
+            if account.status.lower() != "inactive":
+                return False, f"Account is not inactive. Current status: {account.status}"
         
-        account.status = "Active"
+            account.status = "Active"
         
-        description = "Account reactivated"
-        self._saveTransaction(accountNumber, "SYSTEM", 0.0, description)
+            description = "Account reactivated"
+            self._saveTransaction(accountNumber, "SYSTEM", 0, description)
         
-        self._saveAccounts()
+            self._recordChange(account, 'status')
         
-        return True, "Account successfully reactivated"
+            return True, "Account successfully reactivated"
     
     def authPass(self, accountNumber, password):
         """ Authenticate the password with debugging """
         import hashlib
-        
+
+        # the password or the account itself may have been changed by another process
+        self._refreshAccounts()
         account = self.getAccount(accountNumber)
         if not account:
             return False, "Account not found"
@@ -119,44 +352,49 @@ class TamBank:
         if not success:
             return False, "Current Password is incorrect"
         
-        account = self.getAccount(accountNumber)
-        if not account:
-            return False, "Account not found"
+        with self._holdAccounts(accountNumber):
+            account = self.getAccount(accountNumber)
+            if not account:
+                return False, "Account not found"
         
-        import hashlib
-        newHash = hashlib.sha256(newPass.encode()).hexdigest()
-        account.passHash = newHash
+            import hashlib
+            newHash = hashlib.sha256(newPass.encode()).hexdigest()
+            account.passHash = newHash
 
-        self._saveAccounts()
+            self._recordChange(account, 'passHash')
         verifySucess, _ = self.authPass(accountNumber, newPass)
         return True, "Password changed successfully"
 
     def updateAccount(self, fName, lName, mobileNo, email, accountNumber):
         """ Update account details """
-        account = self.getAccount(accountNumber)
-        if not account:
-            return False, "Account not found"
+        with self._holdAccounts(accountNumber):
+            account = self.getAccount(accountNumber)
+            if not account:
+                return False, "Account not found"
         
-        account.fName = fName if fName.strip() else account.fName
-        account.lName = lName if lName.strip() else account.lName
-        account.mobileNo = mobileNo if mobileNo.strip() else account.mobileNo
-        account.email = email if email.strip() else account.email
+            account.fName = fName if fName.strip() else account.fName
+            account.lName = lName if lName.strip() else account.lName
+            account.mobileNo = mobileNo if mobileNo.strip() else account.mobileNo
+            account.email = email if email.strip() else account.email
         
-        self._saveAccounts()
-        return True, "Account updated successfully"
+            self._recordChange(account, 'fName', 'lName', 'mobileNo', 'email')
+            return True, "Account updated successfully"
     
     def deleteAccount(self, accountNumber):
         """ Permanently delete an account from the system """
-        if accountNumber not in self.accounts:
-            return False, "Account not found"
+        with self._holdAccounts(accountNumber), self.storeLock:
+            if accountNumber not in self.accounts:
+                return False, "Account not found"
         
-        account = self.accounts[accountNumber]
-        if account.balance > 0:
-            return False, "Cannot delete account with remaining balance. Please withdraw all funds first."
+            account = self.accounts[accountNumber]
+            if account.cents > 0:
+                return False, "Cannot delete account with remaining balance. Please withdraw all funds first."
         
-        del self.accounts[accountNumber]
-        self._saveAccounts()
-        return True, "Account permanently deleted."
+            del self.accounts[accountNumber]
+            self._unindexAccount(accountNumber)
+            self.accountRepo.delete(accountNumber)
+            self._syncSignature()
+            return True, "Account permanently deleted."
     
     def getAccount(self, accountNumber):
         """Get account by account number"""
@@ -164,188 +402,329 @@ class TamBank:
     
     def closeAccount(self, accountNumber):
         """Close an account"""
-        account = self.getAccount(accountNumber)
-        if not account:
-            return False, "Account not found"
+        with self._holdAccounts(accountNumber):
+            account = self.getAccount(accountNumber)
+            if not account:
+                return False, "Account not found"
             
-        success, message = account.closeAcc()
-        if success:
-            self._saveAccounts()
+            success, message = account.closeAcc()
+            if success:
+                self._recordChange(account, 'status')
         
-        return success, message
+            return success, message
     
     def deposit(self, accountNumber, amount):
         """Deposit to an account"""
-        account = self.getAccount(accountNumber)
-        if not account:
-            return False, "Account not found"
-        
-        status_valid, status_message = self._validateAccountStatus(account, "deposit")
-        if not status_valid:
-            return False, status_message
+        with self._holdAccounts(accountNumber):
+            account = self.getAccount(accountNumber)
+            if not account:
+                return False, "Account not found"
         
-        amount = float(amount) if not isinstance(amount, float) else amount
-
+            status_valid, status_message = self._validateAccountStatus(account, "deposit")
+            if not status_valid:
+                return False, status_message
         
+            cents = Money.toCents(amount)
 
-        if float(amount) <= 0:
-            return False, "Deposit amount must be greater than 0"
+            if cents <= 0:
+                return False, "Deposit amount must be greater than 0"
         
-        account.balance += amount
+            account.cents += cents
 
-        self._saveTransaction(accountNumber, accountNumber, amount, "Deposit")
-        self._saveAccounts()
+            self._saveTransaction(accountNumber, accountNumber, cents, "Deposit")
+            self._recordChange(account, 'balance')
 
-        return True, f"Deposited PHP {amount:.2f}."
+            return True, f"Deposited PHP {Money.format(cents)}."
     
     def withdraw(self, accountNumber, amount):
         """Withdraw from an account"""
-        account = self.getAccount(accountNumber)
-        if not account:
-            return False, "Account not found"
+        with self._holdAccounts(accountNumber):
+            account = self.getAccount(accountNumber)
+            if not account:
+                return False, "Account not found"
         
-        status_valid, status_message = self._validateAccountStatus(account, "withdrawal")
-        if not status_valid:
-            return False, status_message
+            status_valid, status_message = self._validateAccountStatus(account, "withdrawal")
+            if not status_valid:
+                return False, status_message
         
-        amount = float(amount) if not isinstance(amount, float) else amount
+            cents = Money.toCents(amount)
 
-        if amount <= 0:
-            return False, "Withdrawal amount must be greater than 0"
+            if cents <= 0:
+                return False, "Withdrawal amount must be greater than 0"
         
-        if account.balance < amount:
-            return False, "Insufficient funds"
+            if account.cents < cents:
+                return False, "Insufficient funds"
         
-        account.balance -= amount
+            account.cents -= cents
 
-        self._saveTransaction(accountNumber, "CASH", amount, "Withdrawal")
-        self._saveAccounts()
+            self._saveTransaction(accountNumber, "CASH", cents, "Withdrawal")
+            self._recordChange(account, 'balance')
 
-        return True, f"Withdrawed PHP {float(amount):.2f}."
+            return True, f"Withdrawed PHP {Money.format(cents)}."
     
     def transaction(self, accountNumber, toAccountNum, amount, description):
         """Transfer between accounts"""
-        fromAccount = self.getAccount(accountNumber)
-        if not fromAccount:
-            return False, "Sender account not found"
+        with self._holdAccounts(accountNumber, toAccountNum):
+            fromAccount = self.getAccount(accountNumber)
+            if not fromAccount:
+                return False, "Sender account not found"
         
-        toAccount = self.getAccount(toAccountNum)
-        if not toAccount:
-            return False, "Recipient account not found"
+            toAccount = self.getAccount(toAccountNum)
+            if not toAccount:
+                return False, "Recipient account not found"
+            if toAccount is fromAccount:
+                return False, "Cannot transfer to own account"
         
-        status_valid, status_message = self._validateAccountStatus(fromAccount, "transfer")
-        if not status_valid:
-            return False, status_message
+            status_valid, status_message = self._validateAccountStatus(fromAccount, "transfer")
+            if not status_valid:
+                return False, status_message
         
-        status_valid, status_message = self._validateAccountStatus(toAccount, "transfer")
-        if not status_valid:
-            return False, status_message
+            status_valid, status_message = self._validateAccountStatus(toAccount, "transfer")
+            if not status_valid:
+                return False, status_message
 
         
-        amount = float(amount)
-        if fromAccount.balance < amount:
-            return False, "Insufficient funds"
+            cents = Money.toCents(amount)
+            if fromAccount.cents < cents:
+                return False, "Insufficient funds"
         
-        fromAccount.balance -= amount
-        toAccount.balance += amount
+            fromAccount.cents -= cents
+            toAccount.cents += cents
         
-        self._saveTransaction(accountNumber, toAccountNum, amount, description)
-        self._saveAccounts()
+            self._saveTransaction(accountNumber, toAccountNum, cents, description)
+            self._recordChange(fromAccount, 'balance')
+            self._recordChange(toAccount, 'balance')
         
-        return True, f"Successfully transferred PHP {amount:.2f} to account {toAccount.accountNumber}"
+            return True, f"Successfully transferred PHP {Money.format(cents)} to account {toAccount.accountNumber}"
     
-    def _saveTransaction(self, fromAccount, toAccount, amount, description):
-        """ Save transactions to transactions.csv"""
-        transacPath = "Tam-Bank/userinfo/transactions.csv"
-        transacId = self._generateTransacId()
-        currentDate = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def postMany(self, postings, batchSize=None, onResult=None):
+        """ Post deposits, withdrawals and transfers in bulk, see PostingReader for the posting format.
+            Every posting is checked like a single deposit, withdraw or transaction call and applied in memory,
+            then each batch of batchSize postings is persisted with one ledger write and one balance write.
+            onResult(rowNumber, success, message) is called for every row. Returns a PostingReport. """
+        batchSize = max(1, batchSize or Config.bulkBatchSize)
+        report = PostingReport()
 
-        fileExists = os.path.isfile(transacPath) and os.path.getsize(transacPath) > 0
-        with open(transacPath, 'a', newline='') as file:
-            writer = csv.writer(file)
-            if not fileExists:
-                writer.writerow(['transacId', 'date', 'from_account', 'to_account', 'amount', 'description'])
-            
-            writer.writerow([transacId, currentDate, fromAccount, toAccount, amount, description])
+        batch = []
+        for rowNumber, posting in enumerate(postings, 1):
+            batch.append((rowNumber, posting))
+            if len(batch) >= batchSize:
+                self._postBatch(batch, report, onResult)
+                batch = []
+        if batch:
+            self._postBatch(batch, report, onResult)
+        return report
+
+    def _postBatch(self, batch, report, onResult):
+        """ Apply a batch of postings in memory, then write its ledger rows and the changed balances once """
+        # every account of the batch stays locked until its balances are written, taken in one sorted go
+        touched = set()
+        for rowNumber, posting in batch:
+            if isinstance(posting, dict):
+                touched.add(str(posting.get('account') or '').strip())
+                touched.add(str(posting.get('to_account') or '').strip())
+        touched.discard('')
+
+        with self._holdAccounts(*touched):
+            # balances before the batch touched them, put back if the ledger write fails
+            original = {}
+            rows = []
+            outcomes = []
+            for rowNumber, posting in batch:
+                success, message, row, cents = self._applyPosting(posting, original)
+                if success:
+                    rows.append(row)
+                outcomes.append((rowNumber, success, message, cents))
+
+            if rows:
+                try:
+                    # rows queued by single calls go first so the ledger stays in transaction ID order
+                    self.ledgerWriter.flush()
+                    self.ledgerRepo.appendMany(rows, sync=self.ledgerWriter.sync)
+                except Exception as e:
+                    print(f"Error writing bulk postings to the ledger: {e}")
+                    for accountNumber, cents in original.items():
+                        self.accounts[accountNumber].cents = cents
+                    outcomes = [(rowNumber, False, f"Batch not written: {e}" if success else message, 0)
+                                for rowNumber, success, message, cents in outcomes]
+                    original = {}
+                    rows = []
+
+            if original:
+                changed = [self.accounts[accountNumber] for accountNumber in original]
+                self._recordChanges(changed, 'balance')
+                for accountNumber in original:
+                    TransactionCache.invalidate(accountNumber)
+
+        report.batches += 1
+        for rowNumber, success, message, cents in outcomes:
+            report._record(rowNumber, success, message, cents)
+            if onResult:
+                onResult(rowNumber, success, message)
+
+    def _applyPosting(self, posting, original):
+        """ Check one posting and apply it to the in-memory balances, returns (success, message, ledger row, cents).
+            original collects the balance of each account before its first change. """
+        if isinstance(posting, Exception):
+            return False, str(posting), None, 0
+
+        if not hasattr(posting, 'get'):
+            return False, "Invalid posting: not a row of fields", None, 0
+
+        kind = str(posting.get('type') or '').strip().lower()
+        operations = TamBank.postingTypes
+        if kind not in operations:
+            return False, f"Unknown posting type: {kind or 'missing'}", None, 0
+
+        accountNumber = str(posting.get('account') or '').strip()
+        required = ['account', 'amount'] + (['to_account'] if kind == 'transfer' else [])
+        missing = [field for field in required if not str(posting.get(field) or '').strip()]
+        if missing:
+            return False, f"Missing {', '.join(missing)}", None, 0
+
+        try:
+            cents = Money.toCents(str(posting.get('amount')).strip())
+        except ValueError:
+            return False, f"Invalid amount: {posting.get('amount')}", None, 0
+
+        account = self.getAccount(accountNumber)
+        if not account:
+            return False, "Account not found", None, 0
+
+        status_valid, status_message = self._validateAccountStatus(account, operations[kind])
+        if not status_valid:
+            return False, status_message, None, 0
+
+        if cents <= 0:
+            return False, "Amount must be greater than 0", None, 0
+
+        amount = Money.format(cents)
+        description = str(posting.get('description') or '').strip()
+        if kind == 'deposit':
+            original.setdefault(accountNumber, account.cents)
+            account.cents += cents
+            toAccountNum = accountNumber
+            description = description or "Deposit"
+            message = f"Deposited PHP {amount}."
+        elif kind == 'transfer':
+            toAccountNum = str(posting.get('to_account') or '').strip()
+            toAccount = self.getAccount(toAccountNum)
+            if not toAccount:
+                return False, "Recipient account not found", None, 0
+            if toAccountNum == accountNumber:
+                return False, "Cannot transfer to own account", None, 0
+
+            status_valid, status_message = self._validateAccountStatus(toAccount, "transfer")
+            if not status_valid:
+                return False, status_message, None, 0
+            if account.cents < cents:
+                return False, "Insufficient funds", None, 0
+
+            original.setdefault(accountNumber, account.cents)
+            original.setdefault(toAccountNum, toAccount.cents)
+            account.cents -= cents
+            toAccount.cents += cents
+            description = description or f"Transfer to {toAccountNum}"
+            message = f"Successfully transferred PHP {amount} to account {toAccountNum}"
+        else:
+            if account.cents < cents:
+                return False, "Insufficient funds", None, 0
+
+            original.setdefault(accountNumber, account.cents)
+            account.cents -= cents
+            toAccountNum = "CASH"
+            description = description or "Withdrawal"
+            message = f"Withdrawed PHP {amount}."
+
+        row = {
+            'transacId': self._generateTransacId(), 'date': datetime.now(), 'from_account': accountNumber,
+            'to_account': toAccountNum, 'amount': cents, 'description': description
+        }
+        return True, message, row, cents
+
+    def _saveTransaction(self, fromAccount, toAccount, cents, description):
+        """ Save transactions to the ledger, returns once the ledger writer has committed the row """
+        transacId = self._generateTransacId()
+        currentDate = datetime.now()
+        success, message = self.ledgerWriter.append(transacId, currentDate, fromAccount, toAccount,
+                                                    cents, description)
+        if success:
+            TransactionCache.invalidate(fromAccount)
+            TransactionCache.invalidate(toAccount)
+        return success, message
     
     def _generateTransacId(self):
-        """ Generate a unique transaction ID """
-        return random.randint(100000, 999999)
+        """ Generate a unique, time ordered transaction ID """
+        return self.transacIds.next()
     
     def getAccountTransactions(self, accountNumber):
         """ Get all transactions for an account """
-        transacPath = "Tam-Bank/userinfo/transactions.csv"
         transactions = []
         
         try:
-            with open(transacPath, 'r') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    if row['from_account'] == accountNumber or row['to_account'] == accountNumber:
-                        try:
-                            amount = float(row['amount'])
-                            if row["from_account"] == accountNumber and row["from_account"] != row["to_account"]:
-                                amount = -amount
-                                
-                            try:
-                                date_obj = datetime.strptime(row['date'], '%Y-%m-%d %H:%M:%S')
-                            except ValueError:
-                                date_obj = datetime.now()
-                                
-                            transactions.append({ 
-                                "date": date_obj,
-                                "description": row['description'],
-                                "amount": amount,
-                                "transacId": row['transacId']
-                            })
-                        except Exception:
-                            continue
+            for row in self.ledgerRepo.forAccount(accountNumber):
+                transactions.append(self._toHistoryRow(accountNumber, row))
         except Exception:
             pass
 
         transactions.sort(key=lambda x: x['date'], reverse=True)
         return transactions
     
+    def _toHistoryRow(self, accountNumber, row):
+        """ Convert a ledger row into the format returned by getAccountTransactions """
+        return {
+            "date": row['date'] or datetime.now(),
+            "description": row['description'],
+            "amount": Money.toUnits(LedgerSchema.signedAmount(row, accountNumber)),
+            "transacId": row['transacId']
+        }
+
+    def iterAccountTransactions(self, accountNumber, newestFirst=True, before=None, after=None):
+        """ Stream the transactions of an account in ledger order, newest first by default, one row at a time.
+            before and after are a transaction ID or a datetime and keep only the rows older or newer than it.
+            Ledger order is the order the rows were written in, which for rows written by TamBank is both time and
+            transaction ID order. """
+        beforeId = before if before is not None and not isinstance(before, datetime) else None
+        afterId = after if after is not None and not isinstance(after, datetime) else None
+
+        # the ID on the far side of the iteration is where it starts, the one on the near side is where it stops
+        startAfterId, stopAtId = (beforeId, afterId) if newestFirst else (afterId, beforeId)
+
+        for row in self.ledgerRepo.iterAccount(accountNumber, newestFirst, startAfterId):
+            if stopAtId is not None and str(row['transacId']) == str(stopAtId):
+                return
+            if isinstance(before, datetime) and not (row['date'] and row['date'] < before):
+                continue
+            if isinstance(after, datetime) and not (row['date'] and row['date'] > after):
+                continue
+            yield self._toHistoryRow(accountNumber, row)
+
+    def getAccountTransactionsPage(self, accountNumber, limit=50, before=None, after=None, newestFirst=True):
+        """ One page of transactions, pass the transacId of the last row as before (or after when going
+            oldest first) to get the next page """
+        try:
+            return list(itertools.islice(self.iterAccountTransactions(accountNumber, newestFirst, before, after), limit))
+        except Exception as e:
+            print(f"Error reading transactions of {accountNumber}: {e}")
+            return []
+
+    def _loadHistory(self, accountNumber):
+        """ TransactionHistory of one account, oldest first, built from the ledger rows in cents.
+            TransactionCache.load fills in the running balances. """
+        history = TransactionHistory(accountNumber)
+        for row in self.ledgerRepo.iterAccount(accountNumber, newestFirst=False):
+            history.appendCents(row['date'] or datetime.now(), row['description'],
+                                LedgerSchema.signedAmount(row, accountNumber))
+        return history
+
     def getAllAccounts(self):
-        """Get all accounts in the system and update the accounts dictionary"""
-        accounts = []
-        
+        """Get all accounts in the system, only reloading them when storage was changed outside this bank or invalidated"""
         try:
-            with open('Tam-Bank/userinfo/accounts.csv', 'r') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    try:
-                        account_number = row['Account Number']
-                        
-                        account = Account(
-                            account_number,
-                            row['First Name'],
-                            row['Last Name'],
-                            float(row['Balance']),
-                            row['Mobile Number'],
-                            row['Email'],
-                            row.get('Password Hash', None)
-                        )
-                        
-                        try:
-                            account.dateOpened = datetime.strptime(row['Date Opened'], '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            account.dateOpened = datetime.now()
-                            
-                        account.status = row['Status'] if 'Status' in row else "Active"
-                        
-                        self.accounts[account_number] = account
-                        
-                        accounts.append(account)
-                        
-                    except Exception:
-                        continue
-                        
+            self._refreshAccounts()
         except Exception:
             pass
             
-        return accounts
+        return list(self.accounts.values())
 
     def getAccountPasswordHash(self, account_number):
         """Get the password hash for a specific account"""
@@ -355,69 +734,43 @@ class TamBank:
 
     def adminUpdateAccount(self, originalId, newId, fname, lname, mobile, email, status, password=None):
         """Update account details with admin privileges (no validation)"""
-        import csv
-        import os
-        
-        accountsData = []
-        found = False
-        
         try:
-            with open('Tam-Bank/userinfo/accounts.csv', 'r') as file:
-                reader = csv.DictReader(file)
-                fieldnames = reader.fieldnames
-                
-                for row in reader:
-                    if row['Account Number'] == originalId:
-                        found = True
-                        row['Account Number'] = newId
-                        row['First Name'] = fname
-                        row['Last Name'] = lname
-                        row['Mobile Number'] = mobile
-                        row['Email'] = email
-                        row['Status'] = status
-                    
-                    accountsData.append(row)
-            
-            if not found:
+            account = self.findAccount(originalId)
+            if not account:
                 return False
             
-            with open('Tam-Bank/userinfo/accounts.csv', 'w', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(accountsData)
-            
-            if password and len(password) > 0:
-                import hashlib
-                passHash = hashlib.sha256(password.encode()).hexdigest()
-                
-                with open('Tam-Bank/userinfo/accounts.csv', 'r') as file:
-                    reader = csv.DictReader(file)
-                    fieldnames = reader.fieldnames
-                    rows = list(reader)
-                    
-                for row in rows:
-                    if row['Account Number'] == newId:
-                        if 'Password Hash' in row:
-                            row['Password Hash'] = passHash
-                            
-                with open('Tam-Bank/userinfo/accounts.csv', 'w', newline='') as file:
-                    writer = csv.DictWriter(file, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(rows)
-            
-            if originalId in self.accounts:
-                account = self.accounts.pop(originalId)
-                account.accountNumber = newId
+            oldId = account.accountNumber
+            with self._holdAccounts(oldId, newId):
+                # another process may have deleted the account before it was locked
+                account = self.accounts.get(oldId)
+                if not account:
+                    return False
+
                 account.fName = fname
                 account.lName = lname
                 account.mobileNo = mobile
                 account.email = email
                 account.status = status
-                self.accounts[newId] = account
             
-            self.getAllAccounts()
+                if password and len(password) > 0:
+                    import hashlib
+                    account.passHash = hashlib.sha256(password.encode()).hexdigest()
             
-            return True
+                if newId != oldId:
+                    # changing the account number re-keys the account, the repository stores the other changes with it
+                    with self.storeLock:
+                        self.accounts.pop(oldId, None)
+                        account.accountNumber = newId
+                        self.accounts[newId] = account
+                        self._unindexAccount(oldId)
+                        self._indexAccount(account)
+                        success = self.accountRepo.rename(oldId, account)
+                        TransactionCache.invalidate(oldId)
+                        self._syncSignature()
+                    return success
+            
+                success, _ = self._recordChange(account, 'fName', 'lName', 'mobileNo', 'email', 'status', 'passHash')
+                return success
             
         except Exception as e:
             print(f"Error updating account: {e}")
@@ -427,35 +780,39 @@ class TamBank:
         """Set a password for an account with admin privileges (no validation)"""
         passHash = hashlib.sha256(newPass.encode()).hexdigest()
         
-        account = self.getAccount(accountId)
-        if account:
-            account.passHash = passHash
+        with self._holdAccounts(accountId):
+            account = self.getAccount(accountId)
+            if account:
+                account.passHash = passHash
+                self._recordChange(account, 'passHash')
         
         passwordData = []
         updated = False
         
         try:
-            with open('Tam-Bank/userinfo/password.csv', 'r') as file:
-                reader = csv.DictReader(file)
-                fieldnames = reader.fieldnames
+            # other processes rewrite password.csv too
+            with self.passwordLock:
+                with open(TamBank.passwordFile, 'r') as file:
+                    reader = csv.DictReader(file)
+                    fieldnames = reader.fieldnames
                 
-                for row in reader:
-                    if row['accountid'] == accountId:
-                        row['password'] = passHash
-                        updated = True
+                    for row in reader:
+                        if row['accountid'] == accountId:
+                            row['password'] = passHash
+                            updated = True
                     
-                    passwordData.append(row)
+                        passwordData.append(row)
             
-            if not updated:
-                passwordData.append({
-                    'accountid': accountId,
-                    'password': passHash
-                })
+                if not updated:
+                    passwordData.append({
+                        'accountid': accountId,
+                        'password': passHash
+                    })
             
-            with open('Tam-Bank/userinfo/password.csv', 'w', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(passwordData)
+                with AtomicFile(TamBank.passwordFile) as file:
+                    writer = csv.DictWriter(file, fieldnames=fieldnames)
+                    writer.writeheader()
+                    writer.writerows(passwordData)
             
             return True
             
@@ -464,73 +821,29 @@ class TamBank:
 
     def adminDeleteAccount(self, accountId):
         """Delete an account permanently (admin function)"""
-        import csv
-        import os
-        
         try:
             accountIdStr = str(accountId).strip()
             print(f"Attempting to delete account: {accountIdStr}")
             
-            accountsFilePath = 'Tam-Bank/userinfo/accounts.csv'
-            if not os.path.exists(accountsFilePath):
-                print(f"Error: Accounts file not found at {accountsFilePath}")
-                return False
-                
-            accountsData = []
-            accountFound = False
-            
-            with open(accountsFilePath, 'r') as file:
-                reader = csv.DictReader(file)
-                fieldnames = reader.fieldnames
-                
-                for row in reader:
-                    rowId = str(row['Account Number']).strip()
-                    
-                    if rowId != accountIdStr:
-                        accountsData.append(row)
-                    else:
-                        accountFound = True
-            
-            if not accountFound:
-                return False
-            
-            try:
-                with open(accountsFilePath, 'w', newline='') as file:
-                    writer = csv.DictWriter(file, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(accountsData)
-            except PermissionError:
-                return False
-            except Exception as writeErr:
+            account = self.findAccount(accountIdStr)
+            if not account:
                 return False
             
+            with self._holdAccounts(account.accountNumber), self.storeLock:
+                if not self.accountRepo.delete(account.accountNumber):
+                    self.invalidateAccounts()
+                    return False
+                self.accounts.pop(account.accountNumber, None)
+                self._unindexAccount(account.accountNumber)
+                self._syncSignature()
             
             try:
-                transFile = 'Tam-Bank/userinfo/transactions.csv'
-                if os.path.exists(transFile):
-                    transData = []
-                    
-                    with open(transFile, 'r') as file:
-                        reader = csv.DictReader(file)
-                        transFieldnames = reader.fieldnames
-                        
-                        for row in reader:
-                            if str(row['from_account']).strip() == accountIdStr:
-                                row['from_account'] = "[DELETED]"
-                            if str(row['to_account']).strip() == accountIdStr:
-                                row['to_account'] = "[DELETED]"
-                            transData.append(row)
-                    
-                    with open(transFile, 'w', newline='') as file:
-                        writer = csv.DictWriter(file, fieldnames=transFieldnames)
-                        writer.writeheader()
-                        writer.writerows(transData)
-                        print("Successfully updated transactions file")
+                self.ledgerRepo.redactAccount(accountIdStr)
+                TransactionCache.invalidate(accountIdStr)
+                print("Successfully updated transactions file")
             except Exception as transErr:
                 print(f"Note: Error updating transactions: {transErr}")
             
-            if accountIdStr in self.accounts:
-                del self.accounts[accountIdStr]
             return True
                 
         except Exception as e:
@@ -543,76 +856,95 @@ class TamBank:
         except:
             return False
 
+    def getCustomerStats(self):
+        """Get customer account statistics with the status breakdown, read from the running counters"""
+        # picks up changes made outside this bank, which rebuilds the counters
+        self.getAllAccounts()
+        
+        stats = self._statsIndex()
+        try:
+            self._refreshHistogram(stats)
+        except Exception:
+            pass
+        
+        return stats.snapshot()
+
+    def _refreshHistogram(self, stats):
+        """ Bring the transaction histogram up to date with the ledger. Only the rows appended since it was last
+            read are counted, by this bank or by other processes, the retention window is read again when the
+            ledger was rewritten or the statistics were rebuilt. """
+        since = StatsEngine.histogramStart()
+        with self.histogramLock:
+            position = stats.ledgerPosition
+            if position is not None:
+                dates, newPosition = self.ledgerRepo.datesAppended(since, position)
+                with self.storeLock:
+                    # a rebuild in between dropped the histogram, it is read again below
+                    if dates is not None and stats.ledgerPosition is position:
+                        stats.addTransactions(dates, newPosition)
+                        return
+
+            dates, newPosition = self.ledgerRepo.datesAppended(since)
+            with self.storeLock:
+                stats.loadTransactions(dates, newPosition)
+
     def getSystemStats(self):
         """Get system statistics for admin dashboard"""
+        customerStats = self.getCustomerStats()
         stats = {
-            'total_accounts': 0,
-            'active_accounts': 0,
+            'total_accounts': customerStats['total_accounts'],
+            'active_accounts': customerStats['active_accounts'],
             'total_balance': 0.0,
-            'recent_transactions': 0
+            'recent_transactions': customerStats['recent_transactions']
         }
+        totalCents = self.stats.totalCents
         
-        accounts = self.getAllAccounts()
-        stats['total_accounts'] = len(accounts)
-        
-        for account in accounts:
-            if account.status.lower() == 'active':
+        # the counters only cover customers, the system totals include the admin account
+        admin = self.accounts.get('admin')
+        if admin:
+            stats['total_accounts'] += 1
+            if admin.status.lower() == 'active':
                 stats['active_accounts'] += 1
-            stats['total_balance'] += account.balance
-        
-        try:
-            with open('Tam-Bank/userinfo/transactions.csv', 'r') as file:
-                reader = csv.DictReader(file)
-                weekAgo = datetime.now() - timedelta(days=7)
-                
-                for row in reader:
-                    try:
-                        transDate = datetime.strptime(row['date'], '%Y-%m-%d %H:%M:%S')
-                        if transDate >= weekAgo:
-                            stats['recent_transactions'] += 1
-                    except:
-                        pass
-        except Exception:
-            pass
+            totalCents += admin.cents
+        stats['total_balance'] = Money.toUnits(totalCents)
         
         return stats
     
+    def searchAccounts(self, searchTerm, limit=None):
+        """ Customer accounts whose account number, first name or last name contain the search term """
+        # picks up changes made outside this bank, which rebuilds the index
+        self.getAllAccounts()
+        return self._searchIndex().search(searchTerm, limit)
+
+    def findAccountsByEmail(self, email):
+        """ Customer accounts registered with an email address """
+        self.getAllAccounts()
+        return self._searchIndex().findByEmail(email)
+
+    def findAccountsByMobile(self, mobileNo):
+        """ Customer accounts registered with a mobile number """
+        self.getAllAccounts()
+        return self._searchIndex().findByMobile(mobileNo)
+
     def findAccount(self, accountId):
         """Improved account lookup that handles different formats and whitespace"""
         if accountId in self.accounts:
             return self.accounts[accountId]
             
         normId = str(accountId).strip()
-        for accId, account in self.accounts.items():
-            if str(accId).strip() == normId:
-                return account
+        if normId in self.accounts:
+            return self.accounts[normId]
+
+        account = self._searchIndex().findByNumber(normId)
+        if account:
+            return account
         
         try:
-            with open('Tam-Bank/userinfo/accounts.csv', 'r') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    rowId = str(row['Account Number']).strip()
-                    if rowId == normId:
-                        account = Account(
-                            rowId,
-                            row['First Name'],
-                            row['Last Name'],
-                            float(row['Balance']),
-                            row['Mobile Number'],
-                            row['Email'],
-                            row.get('Password Hash', None)
-                        )
-                        
-                        try:
-                            account.dateOpened = datetime.strptime(row['Date Opened'], '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            account.dateOpened = datetime.now()
-                            
-                        account.status = row['Status'] if 'Status' in row else "Active"
-                        
-                        self.accounts[rowId] = account
-                        
-                        return account
+            account = self.accountRepo.get(normId)
+            if account:
+                self.accounts[normId] = account
+                self._indexAccount(account)
+                return account
         except Exception:
             pass
             
@@ -628,23 +960,23 @@ class TamBank:
         if not success:
             return False
         
-        admin = self.getAccount("admin")
-        if not admin:
-            return False
+        with self._holdAccounts("admin"):
+            admin = self.getAccount("admin")
+            if not admin:
+                return False
         
-        newHash = hashlib.sha256(newPassword.encode()).hexdigest()
-        print(f"Generated new hash: {newHash[:10]}...")
+            newHash = hashlib.sha256(newPassword.encode()).hexdigest()
+            print(f"Generated new hash: {newHash[:10]}...")
         
-        admin.passHash = newHash
+            admin.passHash = newHash
         
-        csv_success = self._updatePasswordInCSV('Tam-Bank/userinfo/accounts.csv', 'Account Number', 'admin', 'Password Hash', newHash)
+            csv_success, _ = self._recordChange(admin, 'passHash')
         
-        pwdFile = 'Tam-Bank/userinfo/password.csv'
+        pwdFile = TamBank.passwordFile
         pwdSuccess = True
         if os.path.exists(pwdFile):
-            pwdSuccess = self._updatePasswordInCSV(pwdFile, 'accountid', 'admin', 'password', newHash)
-        
-        self.getAllAccounts()
+            with self.passwordLock:
+                pwdSuccess = self._updatePasswordInCSV(pwdFile, 'accountid', 'admin', 'password', newHash)
         
         return csv_success and pwdSuccess
 
@@ -675,7 +1007,7 @@ class TamBank:
                     rows.append(row)
             
             if found:
-                with open(filePAth, 'w', newline='') as file:
+                with AtomicFile(filePAth) as file:
                     writer = csv.DictWriter(file, fieldnames=fieldnames)
                     writer.writeheader()
                     writer.writerows(rows)
@@ -0,0 +1,72 @@
+import os
+import csv
+import json
+
+class PostingReader:
+    """ Reads bulk postings from .csv or .jsonl files for TamBank.postMany.
+        A posting is a dictionary with type (deposit, withdraw or transfer), account, to_account for transfers,
+        amount and an optional description. Lines that cannot be read are yielded as a ValueError so they are
+        reported as failed rows with the rest of the file still posted. """
+    header = ['type', 'account', 'to_account', 'amount', 'description']
+
+    @staticmethod
+    def read(path):
+        """ Postings of a file, the format is picked from its extension """
+        extension = os.path.splitext(path)[1].lower()
+        if extension in ('.jsonl', '.ndjson'):
+            return PostingReader.readJsonl(path)
+        if extension == '.csv':
+            return PostingReader.readCsv(path)
+        raise ValueError(f"Unsupported postings file {path}, expected .csv or .jsonl")
+
+    @staticmethod
+    def readCsv(path):
+        """ Postings of a .csv file with a header row naming the posting fields """
+        with open(path, "r", newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if None in row:
+                    yield ValueError(f"Too many columns: {row[None]}")
+                    continue
+                yield row
+
+    @staticmethod
+    def readJsonl(path):
+        """ Postings of a .jsonl file, one JSON object per line """
+        with open(path, "r") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    posting = json.loads(line)
+                except ValueError as e:
+                    yield ValueError(f"Invalid JSON: {e}")
+                    continue
+                yield posting if isinstance(posting, dict) else ValueError("Posting is not a JSON object")
+
+
+class PostingReport:
+    """ Outcome of a bulk posting run: counts, the failed rows and how many batches were written """
+
+    # failed rows kept in memory, the rest are only counted (onResult still sees all of them)
+    maxErrors = 10000
+
+    def __init__(self):
+        self.posted = 0
+        self.failed = 0
+        self.batches = 0
+        self.totalCents = 0
+        self.errors = []
+
+    def _record(self, rowNumber, success, message, cents=0):
+        """ Count the outcome of one row """
+        if success:
+            self.posted += 1
+            self.totalCents += cents
+        else:
+            self.failed += 1
+            if len(self.errors) < PostingReport.maxErrors:
+                self.errors.append((rowNumber, message))
+
+    def __repr__(self):
+        return f"PostingReport(posted={self.posted}, failed={self.failed}, batches={self.batches})"
@@ -0,0 +1,150 @@
+class AccountSearchIndex:
+    """ In-memory lookup tables over the customer accounts, kept up to date as the bank changes.
+        Exact lookups by account number, email and mobile number, and a trigram index for substring search
+        on the account number, first name and last name. """
+
+    def __init__(self):
+        self.accounts = {}
+        self.byNumber = {}
+        self.byEmail = {}
+        self.byMobile = {}
+        self.trigrams = {}
+
+        # keys each account is filed under, so a change only has to remove its old keys
+        self.indexed = {}
+
+    @staticmethod
+    def _isCustomer(account):
+        """ The admin account is not a customer account """
+        return str(account.accountNumber).lower() != 'admin'
+
+    @staticmethod
+    def _normalize(value):
+        """ Lookup form of a value: stripped and lower case """
+        return str(value or '').strip().lower()
+
+    @staticmethod
+    def _trigramsOf(text):
+        """ Every three character slice of a text """
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def _searchText(account):
+        """ Lower case texts a search term is matched against """
+        return [AccountSearchIndex._normalize(account.accountNumber),
+                AccountSearchIndex._normalize(account.fName),
+                AccountSearchIndex._normalize(account.lName)]
+
+    def _file(self, table, key, accountNumber):
+        """ Add an account number to a lookup table """
+        if key:
+            table.setdefault(key, set()).add(accountNumber)
+
+    def _unfile(self, table, key, accountNumber):
+        """ Remove an account number from a lookup table, dropping keys that become empty """
+        entries = table.get(key)
+        if entries is None:
+            return
+        entries.discard(accountNumber)
+        if not entries:
+            del table[key]
+
+    def rebuild(self, accounts):
+        """ Index every account again, used after the accounts were loaded from storage """
+        self.accounts = {}
+        self.byNumber = {}
+        self.byEmail = {}
+        self.byMobile = {}
+        self.trigrams = {}
+        self.indexed = {}
+        for account in accounts:
+            self.updateAccount(account)
+
+    def updateAccount(self, account):
+        """ Bring the index in line with the current details of an account """
+        if not AccountSearchIndex._isCustomer(account):
+            return
+
+        self.removeAccount(account.accountNumber)
+
+        accountNumber = account.accountNumber
+        number = AccountSearchIndex._normalize(accountNumber)
+        email = AccountSearchIndex._normalize(account.email)
+        mobile = AccountSearchIndex._normalize(account.mobileNo)
+        trigrams = set()
+        for text in AccountSearchIndex._searchText(account):
+            trigrams |= AccountSearchIndex._trigramsOf(text)
+
+        self._file(self.byNumber, number, accountNumber)
+        self._file(self.byEmail, email, accountNumber)
+        self._file(self.byMobile, mobile, accountNumber)
+        # inlined _file, this loop runs for every trigram of every account when the index is rebuilt
+        table = self.trigrams
+        for trigram in trigrams:
+            entries = table.get(trigram)
+            if entries is None:
+                table[trigram] = {accountNumber}
+            else:
+                entries.add(accountNumber)
+
+        self.accounts[accountNumber] = account
+        self.indexed[accountNumber] = (number, email, mobile, trigrams)
+
+    def removeAccount(self, accountNumber):
+        """ Take an account out of the index """
+        previous = self.indexed.pop(accountNumber, None)
+        if previous is None:
+            return
+
+        number, email, mobile, trigrams = previous
+        self._unfile(self.byNumber, number, accountNumber)
+        self._unfile(self.byEmail, email, accountNumber)
+        self._unfile(self.byMobile, mobile, accountNumber)
+        for trigram in trigrams:
+            self._unfile(self.trigrams, trigram, accountNumber)
+        self.accounts.pop(accountNumber, None)
+
+    def _lookup(self, table, value):
+        """ Accounts filed under a value in one of the exact lookup tables, sorted by account number """
+        accountNumbers = table.get(AccountSearchIndex._normalize(value), ())
+        return [self.accounts[accountNumber] for accountNumber in sorted(accountNumbers)]
+
+    def findByNumber(self, accountNumber):
+        """ Account with the account number ignoring surrounding whitespace and case, None if there is none """
+        matches = self._lookup(self.byNumber, accountNumber)
+        return matches[0] if matches else None
+
+    def findByEmail(self, email):
+        """ Accounts registered with an email address """
+        return self._lookup(self.byEmail, email)
+
+    def findByMobile(self, mobileNo):
+        """ Accounts registered with a mobile number """
+        return self._lookup(self.byMobile, mobileNo)
+
+    def search(self, term, limit=None):
+        """ Accounts whose account number, first name or last name contain the term, sorted by account number """
+        term = AccountSearchIndex._normalize(term)
+        if not term:
+            return []
+
+        if len(term) < 3:
+            # too short for a trigram, nearly every account would be a candidate anyway
+            candidates = self.indexed.keys()
+        else:
+            candidates = None
+            # intersect the smallest sets first so the candidate set shrinks quickly
+            for entries in sorted((self.trigrams.get(trigram, set()) for trigram in AccountSearchIndex._trigramsOf(term)), key=len):
+                candidates = set(entries) if candidates is None else candidates & entries
+                if not candidates:
+                    return []
+
+        matches = []
+        for accountNumber in sorted(candidates):
+            account = self.accounts[accountNumber]
+            # trigrams can match across different fields, confirm the term is really in one of them
+            if any(term in text for text in AccountSearchIndex._searchText(account)):
+                matches.append(account)
+                if limit and len(matches) >= limit:
+                    break
+        return matches
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from utils.money import Money
+
+class StatsEngine:
+    """ Running account and transaction counters for the admin dashboard, kept up to date as the bank changes """
+    # hours of transaction history kept in the histogram
+    retentionHours = 30 * 24
+
+    def __init__(self):
+        self.statusCounts = {}
+        self.typeCounts = {}
+        self.totalCents = 0
+        self.totalAccounts = 0
+
+        # what each account currently contributes, so a change only has to undo its old values
+        self.counted = {}
+
+        # transactions per hour, keyed by the start of the hour, and where the ledger ended when it was last read
+        self.histogram = {}
+        self.ledgerPosition = None
+
+    @staticmethod
+    def _isCustomer(account):
+        """ The admin account is not a customer account """
+        return str(account.accountNumber).lower() != 'admin'
+
+    def _add(self, counts, key, amount):
+        """ Add amount to a counter, dropping it once it reaches zero """
+        counts[key] = counts.get(key, 0) + amount
+        if counts[key] == 0:
+            del counts[key]
+
+    def rebuild(self, accounts):
+        """ Recount every account, used after the accounts were loaded from storage """
+        self.statusCounts = {}
+        self.typeCounts = {}
+        self.totalCents = 0
+        self.totalAccounts = 0
+        self.counted = {}
+        # the accounts were reloaded, so the ledger is read again too
+        self.histogram = {}
+        self.ledgerPosition = None
+        for account in accounts:
+            self.updateAccount(account)
+
+    def updateAccount(self, account):
+        """ Bring the counters in line with the current status, type and balance of an account """
+        if not StatsEngine._isCustomer(account):
+            return
+
+        self.removeAccount(account.accountNumber)
+
+        status = account.status.lower()
+        accountType = getattr(account, 'accountType', getattr(account, 'bankType', 'Savings'))
+        self._add(self.statusCounts, status, 1)
+        self._add(self.typeCounts, accountType, 1)
+        self.totalCents += account.cents
+        self.totalAccounts += 1
+        self.counted[account.accountNumber] = (status, accountType, account.cents)
+
+    def removeAccount(self, accountNumber):
+        """ Take an account out of the counters """
+        previous = self.counted.pop(accountNumber, None)
+        if previous is None:
+            return
+
+        status, accountType, cents = previous
+        self._add(self.statusCounts, status, -1)
+        self._add(self.typeCounts, accountType, -1)
+        self.totalCents -= cents
+        self.totalAccounts -= 1
+
+    @staticmethod
+    def _hour(date):
+        """ Start of the hour a date falls in """
+        return date.replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def histogramStart():
+        """ Oldest hour kept in the histogram """
+        return StatsEngine._hour(datetime.now() - timedelta(hours=StatsEngine.retentionHours))
+
+    def loadTransactions(self, dates, position=None):
+        """ Fill the histogram from the dates of the transactions in the ledger, position is where the ledger
+            ended as returned by LedgerRepository.datesAppended """
+        self.histogram = {}
+        self.addTransactions(dates, position)
+
+    def addTransactions(self, dates, position=None):
+        """ Count the transactions appended to the ledger since it was last read and drop hours that fell out of
+            the retention window """
+        oldest = StatsEngine.histogramStart()
+        for date in dates:
+            if date is None:
+                continue
+            hour = StatsEngine._hour(date)
+            if hour >= oldest:
+                self.histogram[hour] = self.histogram.get(hour, 0) + 1
+        for expired in [bucket for bucket in self.histogram if bucket < oldest]:
+            del self.histogram[expired]
+        self.ledgerPosition = position
+
+    def recentTransactions(self, days=7):
+        """ Number of transactions in the last days, to the hour """
+        since = StatsEngine._hour(datetime.now() - timedelta(days=days))
+        return sum(count for hour, count in self.histogram.items() if hour >= since)
+
+    def snapshot(self, days=7):
+        """ Customer statistics in the format used by the admin dashboard """
+        return {
+            'total_accounts': self.totalAccounts,
+            'active_accounts': self.statusCounts.get('active', 0),
+            'inactive_accounts': self.statusCounts.get('inactive', 0),
+            'suspended_accounts': self.statusCounts.get('suspended', 0),
+            'closed_accounts': self.statusCounts.get('closed', 0),
+            'total_balance': Money.toUnits(self.totalCents),
+            'recent_transactions': self.recentTransactions(days),
+            'account_types': dict(self.typeCounts)
+        }
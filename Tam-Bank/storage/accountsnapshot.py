@@ -0,0 +1,411 @@
+import gc
+import zlib
+import struct
+import threading
+from array import array
+from datetime import datetime
+from itertools import accumulate
+from collections.abc import MutableMapping, ValuesView, ItemsView
+from utils.atomicfile import AtomicFile
+from utils.filehandling import FileHandling
+from models.account import Account
+
+class AccountSnapshot:
+    """ Binary copy of the account table, loaded at startup instead of parsing accounts.csv and replaying the
+        journal. It is only a cache: the .csv files stay the source of truth, and a snapshot whose stamp does
+        not match the current files is ignored.
+        Layout, little endian:
+            header   magic, version, number of stamp values, crc32 of everything after the header, accounts
+            stamp    signed 64 bit values describing the files the snapshot was taken from
+            position two signed 64 bit values the store needs to carry on from the snapshot, for the .csv
+                     store the journal offset and entry count
+            columns  one section per column, its byte length then its data. Text columns hold the length of
+                     their UTF-8 values joined by NUL, the joined values and an array of 32 bit offsets where each
+                     value starts. Columns with few distinct values hold the length of their distinct values,
+                     those values joined by NUL and an array of 32 bit positions in them, one per account. The
+                     balance column is an array of 64 bit cents.
+            order    section with an array of 32 bit account positions sorted by account number, which lets
+                     AccountTable find an account without building a dictionary of every account number """
+    snapshotFile = "Tam-Bank/userinfo/accounts.snap"
+    magic = b"TAMSNAP\0"
+    version = 2
+    header = struct.Struct("<8sHHII")
+    sectionLength = struct.Struct("<Q")
+    position = struct.Struct("<qq")
+
+    # account attributes stored as text columns, in file order, and their index in the accounts.csv row the
+    # text is taken from, so a snapshot holds what the .csv files would, then the balance column
+    textColumns = (('accountNumber', 0), ('fName', 1), ('lName', 2), ('mobileNo', 3), ('email', 4),
+                   ('dateOpened', 6), ('status', 7), ('passHash', 8), ('accountType', 9))
+    # columns with few distinct values, stored once per value
+    sharedColumns = ('fName', 'lName', 'status', 'accountType')
+    separator = "\0"
+
+    @staticmethod
+    def _section(data):
+        """ A column section: its byte length followed by its data """
+        return AccountSnapshot.sectionLength.pack(len(data)) + data
+
+    @staticmethod
+    def write(accounts, stamp, position=(0, 0), snapshotFile=None):
+        """ Write the accounts with the stamp of the files they were read from, returns (success, message).
+            Accounts whose values cannot be stored are not snapshotted, the next start reads the .csv files. """
+        snapshotFile = snapshotFile or AccountSnapshot.snapshotFile
+        accounts = list(accounts)
+        separator = AccountSnapshot.separator
+        try:
+            rows = [FileHandling.accountToRow(account) for account in accounts]
+            sections = []
+            numbers = None
+            for name, index in AccountSnapshot.textColumns:
+                values = [str(row[index] or "") for row in rows]
+                if name == 'accountNumber':
+                    numbers = values
+                if name in AccountSnapshot.sharedColumns:
+                    distinct = {}
+                    codes = array('I', [distinct.setdefault(value, len(distinct)) for value in values])
+                    values = list(distinct)
+                    tail = codes.tobytes()
+                else:
+                    # each value starts one byte after the end of the one before it, past the separator
+                    lengths = [len(value.encode('utf-8')) + 1 for value in values[:-1]]
+                    tail = array('I', accumulate(lengths, initial=0) if values else ()).tobytes()
+                text = separator.join(values)
+                if text.count(separator) != max(len(values) - 1, 0):
+                    return False, f"Cannot snapshot accounts: a {name} contains a NUL character"
+                sections.append(AccountSnapshot._section(AccountSnapshot._section(text.encode('utf-8')) + tail))
+            cents = array('q', [account.cents for account in accounts])
+            sections.append(AccountSnapshot._section(cents.tobytes()))
+            order = array('I', sorted(range(len(numbers)), key=numbers.__getitem__))
+            sections.append(AccountSnapshot._section(order.tobytes()))
+
+            body = (struct.pack(f"<{len(stamp)}q", *stamp) + AccountSnapshot.position.pack(*position)
+                    + b"".join(sections))
+            header = AccountSnapshot.header.pack(AccountSnapshot.magic, AccountSnapshot.version, len(stamp),
+                                                 zlib.crc32(body), len(accounts))
+            with AtomicFile(snapshotFile, binary=True) as file:
+                file.write(header)
+                file.write(body)
+            return True, f"Accounts snapshotted to {snapshotFile}"
+        except (OverflowError, OSError, TypeError, ValueError) as e:
+            return False, f"Error writing account snapshot {snapshotFile}: {e}"
+
+    @staticmethod
+    def _readHeader(data):
+        """ Stamp, checksum and account count of a snapshot, None if it is not one this version can read """
+        size = AccountSnapshot.header.size
+        if len(data) < size:
+            return None
+        magic, version, stampLength, checksum, count = AccountSnapshot.header.unpack_from(data)
+        if magic != AccountSnapshot.magic or version != AccountSnapshot.version:
+            return None
+        stamp = struct.unpack_from(f"<{stampLength}q", data, size) if len(data) >= size + 8 * stampLength else None
+        return stamp, checksum, count
+
+    @staticmethod
+    def matches(stamp, snapshotFile=None):
+        """ Check if the snapshot on disk was taken from the files with this stamp, reading only its header """
+        snapshotFile = snapshotFile or AccountSnapshot.snapshotFile
+        try:
+            with open(snapshotFile, "rb") as file:
+                data = file.read(AccountSnapshot.header.size + 8 * len(stamp))
+        except OSError:
+            return False
+        header = AccountSnapshot._readHeader(data)
+        return header is not None and header[0] == tuple(stamp)
+
+    @staticmethod
+    def load(stamp, snapshotFile=None):
+        """ Read the snapshot in one buffer, returns (accounts, position) where accounts is an AccountTable that
+            builds each account when it is first used. None if there is no snapshot, it was taken from other files
+            than the stamp describes or it fails its checksum. """
+        snapshotFile = snapshotFile or AccountSnapshot.snapshotFile
+        try:
+            with open(snapshotFile, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        header = AccountSnapshot._readHeader(data)
+        if header is None or header[0] != tuple(stamp):
+            return None
+        _, checksum, count = header
+        start = AccountSnapshot.header.size
+        if zlib.crc32(memoryview(data)[start:]) != checksum:
+            print(f"Warning: account snapshot {snapshotFile} is corrupt, reading the .csv files")
+            return None
+
+        try:
+            offset = start + 8 * len(stamp)
+            position = AccountSnapshot.position.unpack_from(data, offset)
+            table = AccountSnapshot._decode(memoryview(data), offset + AccountSnapshot.position.size, count)
+        except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+            print(f"Warning: could not read account snapshot {snapshotFile}: {e}")
+            return None
+        return table, position
+
+    @staticmethod
+    def _array(typecode, data, count):
+        """ Array read from a section that must hold count values """
+        values = array(typecode)
+        values.frombytes(data)
+        if len(values) != count:
+            raise ValueError(f"section holds {len(values)} values instead of {count}")
+        return values
+
+    @staticmethod
+    def _decode(data, offset, count):
+        """ Split the snapshot into its column sections, only the account numbers are decoded here """
+        columns = {}
+        for name, _ in AccountSnapshot.textColumns + (('cents', None), ('order', None)):
+            (length,) = AccountSnapshot.sectionLength.unpack_from(data, offset)
+            offset += AccountSnapshot.sectionLength.size
+            section = data[offset:offset + length]
+            offset += length
+            if name in ('cents', 'order'):
+                columns[name] = AccountSnapshot._array('q' if name == 'cents' else 'I', section, count)
+                continue
+            (length,) = AccountSnapshot.sectionLength.unpack_from(section)
+            start = AccountSnapshot.sectionLength.size
+            text = section[start:start + length]
+            if name in AccountSnapshot.sharedColumns:
+                # the distinct values and, per account, which of them it has
+                columns[name] = (AccountSnapshot._split(text, count), AccountSnapshot._array('I', section[start + length:], count))
+            else:
+                # the joined values and where each one starts
+                columns[name] = (text, AccountSnapshot._array('I', section[start + length:], count))
+
+        text, starts = columns['accountNumber']
+        numbers = AccountSnapshot._split(text, count)
+        if len(numbers) != count:
+            raise ValueError(f"column accountNumber has {len(numbers)} values instead of {count}")
+        return AccountTable(numbers, columns)
+
+    @staticmethod
+    def _split(data, count):
+        """ Values of a text section """
+        return str(data, 'utf-8').split(AccountSnapshot.separator) if count else []
+
+    @staticmethod
+    def _parseDates(texts):
+        """ Parse the stored dates, the current time for a date that was not a timestamp """
+        try:
+            return list(map(datetime.fromisoformat, texts))
+        except ValueError:
+            pass
+        dates = []
+        for text in texts:
+            try:
+                dates.append(datetime.fromisoformat(text))
+            except ValueError:
+                print(f"Warning: Could not parse date '{text}', using current time")
+                dates.append(datetime.now())
+        return dates
+
+
+class AccountTable(MutableMapping):
+    """ The accounts of a snapshot by account number, used like the dictionary TamBank keeps its accounts in.
+        An account is built from the snapshot columns the first time it is looked up, and the ones still unbuilt
+        all at once when the values are iterated, so a start only decodes the account numbers. Lookups go
+        through the snapshot's positions sorted by account number. Accounts stored after the load and the
+        removed snapshot positions are kept apart from the columns. """
+
+    def __init__(self, numbers, columns):
+        self.numbers = numbers
+        self.columns = columns
+        self.order = columns['order']
+        # accounts built so far by snapshot position
+        self.built = [None] * len(numbers)
+        self.unbuilt = len(numbers)
+        self.removed = set()
+        # accounts stored under numbers the snapshot does not have
+        self.added = {}
+        # two threads looking up the same account get the same object
+        self.lock = threading.Lock()
+
+    def _position(self, accountNumber):
+        """ Snapshot position of an account number, None if the snapshot does not have it """
+        if not isinstance(accountNumber, str):
+            return None
+        # binary search by hand, bisect only takes a key from Python 3.10
+        order, numbers = self.order, self.numbers
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if numbers[order[middle]] < accountNumber:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(order):
+            position = order[low]
+            if numbers[position] == accountNumber and position not in self.removed:
+                return position
+        return None
+
+    def _text(self, name, position):
+        """ One value of a text column """
+        text, starts = self.columns[name]
+        end = starts[position + 1] - 1 if position + 1 < len(starts) else len(text)
+        return str(text[starts[position]:end], 'utf-8')
+
+    def _shared(self, name, position):
+        """ One value of a column with few distinct values """
+        distinct, codes = self.columns[name]
+        return distinct[codes[position]]
+
+    @staticmethod
+    def _restore(accountNumber, fName, lName, mobileNo, email, cents, dateOpened, status, passHash, accountType):
+        """ Build an account object without running Account.__init__, which would allocate an account number
+            and record an initial deposit """
+        account = Account.__new__(Account)
+        account.accountNumber = accountNumber
+        account.fName = fName
+        account.lName = lName
+        account.mobileNo = mobileNo
+        account.email = email
+        account.cents = cents
+        account.dateOpened = dateOpened
+        account._transactions = None
+        account.status = status
+        account.passHash = passHash
+        account.bankType = 'Savings'
+        # accountFromRow reads an empty account type as a savings account
+        account.accountType = accountType or "Savings"
+        return account
+
+    def _account(self, position):
+        """ The account at a snapshot position, built on first use """
+        account = self.built[position]
+        if account is None:
+            with self.lock:
+                account = self.built[position]
+                if account is None:
+                    account = AccountTable._restore(
+                        self.numbers[position], self._shared('fName', position), self._shared('lName', position),
+                        self._text('mobileNo', position), self._text('email', position),
+                        self.columns['cents'][position],
+                        AccountSnapshot._parseDates([self._text('dateOpened', position)])[0],
+                        self._shared('status', position), self._text('passHash', position),
+                        self._shared('accountType', position))
+                    self.built[position] = account
+                    self.unbuilt -= 1
+        return account
+
+    def _buildAll(self):
+        """ Build every account not built yet, splitting each column once instead of reading it value by value """
+        with self.lock:
+            if self.unbuilt <= len(self.removed):
+                return
+            columns = {}
+            for name, _ in AccountSnapshot.textColumns[1:]:
+                if name in AccountSnapshot.sharedColumns:
+                    distinct, codes = self.columns[name]
+                    # every account shares the string of its value
+                    columns[name] = list(map(distinct.__getitem__, codes))
+                else:
+                    columns[name] = AccountSnapshot._split(self.columns[name][0], len(self.numbers))
+            columns['dateOpened'] = AccountSnapshot._parseDates(columns['dateOpened'])
+
+            # a million new objects would trigger dozens of collections that cannot free anything
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                restored = list(map(AccountTable._restore, self.numbers, columns['fName'], columns['lName'],
+                                    columns['mobileNo'], columns['email'], self.columns['cents'],
+                                    columns['dateOpened'], columns['status'], columns['passHash'],
+                                    columns['accountType']))
+            finally:
+                if collecting:
+                    gc.enable()
+            # accounts already handed out stay the same objects
+            if self.unbuilt < len(self.numbers):
+                for position, account in enumerate(self.built):
+                    if account is not None:
+                        restored[position] = account
+            for position in self.removed:
+                restored[position] = None
+            self.built = restored
+            self.unbuilt = len(self.removed)
+
+    def __getitem__(self, accountNumber):
+        account = self.added.get(accountNumber)
+        if account is not None:
+            return account
+        position = self._position(accountNumber)
+        if position is None:
+            raise KeyError(accountNumber)
+        return self._account(position)
+
+    def __setitem__(self, accountNumber, account):
+        position = self._position(accountNumber)
+        if position is None:
+            self.added[accountNumber] = account
+            return
+        with self.lock:
+            if self.built[position] is None:
+                self.unbuilt -= 1
+            self.built[position] = account
+
+    def __delitem__(self, accountNumber):
+        if accountNumber in self.added:
+            del self.added[accountNumber]
+            return
+        position = self._position(accountNumber)
+        if position is None:
+            raise KeyError(accountNumber)
+        with self.lock:
+            if self.built[position] is not None:
+                self.built[position] = None
+                self.unbuilt += 1
+            self.removed.add(position)
+
+    def __contains__(self, accountNumber):
+        return accountNumber in self.added or self._position(accountNumber) is not None
+
+    def __len__(self):
+        return len(self.numbers) - len(self.removed) + len(self.added)
+
+    def __iter__(self):
+        if self.removed:
+            removed = self.removed
+            yield from (accountNumber for position, accountNumber in enumerate(self.numbers) if position not in removed)
+        else:
+            yield from self.numbers
+        yield from list(self.added)
+
+    def _values(self):
+        """ Every account, in snapshot order then the ones added since """
+        self._buildAll()
+        if self.removed:
+            yield from (account for account in self.built if account is not None)
+        else:
+            yield from self.built
+        yield from list(self.added.values())
+
+    def _entries(self):
+        """ (account number, account) of every account, in snapshot order then the ones added since """
+        self._buildAll()
+        for accountNumber, account in zip(self.numbers, self.built):
+            if account is not None:
+                yield accountNumber, account
+        yield from list(self.added.items())
+
+    def values(self):
+        return AccountTableValues(self)
+
+    def items(self):
+        return AccountTableItems(self)
+
+
+class AccountTableValues(ValuesView):
+    """ values() of an AccountTable, builds the remaining accounts in one go """
+
+    def __iter__(self):
+        return self._mapping._values()
+
+
+class AccountTableItems(ItemsView):
+    """ items() of an AccountTable, builds the remaining accounts in one go """
+
+    def __iter__(self):
+        return self._mapping._entries()
@@ -0,0 +1,447 @@
+import os
+import io
+import csv
+from utils.filehandling import FileHandling
+from utils.filelock import FileLock
+from utils.atomicfile import AtomicFile
+from utils.journal import AccountJournal
+from storage.repository import AccountRepository, LedgerRepository, ApplicationRepository
+from storage.ledgerindex import LedgerIndex
+from storage.ledgerschema import LedgerSchema
+from storage.ledgerscanner import LedgerScanner
+from storage.accountsnapshot import AccountSnapshot
+from utils.transacid import TransactionIdGenerator
+
+class CsvAccountRepository(AccountRepository):
+    """ Accounts stored in the accounts.csv snapshot plus the append-only account journal.
+        Writers hold storeLock, which every TamBank process shares, and bump its generation. """
+
+    def __init__(self):
+        self.journal = AccountJournal()
+        self.storeLock = FileLock(FileHandling.accountFile + ".lock")
+        # stamp of the snapshot the journal offset applies to
+        self.snapshotStamp = None
+
+    @staticmethod
+    def _snapshotStamp():
+        """ Inode, modification time and size of accounts.csv, which change when the snapshot is rewritten """
+        try:
+            stat = os.stat(FileHandling.accountFile)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _stamp(self):
+        """ What the account snapshot is checked against: the store generation, the inode, modification time and
+            size of accounts.csv, the modification time and size of the journal, and the size of the ledger
+            partitions as its high-water mark. -1 stands for a missing file. """
+        stamp = [self.storeLock.generation()]
+        stamp.extend(CsvAccountRepository._snapshotStamp() or (-1, -1, -1))
+        try:
+            stat = os.stat(self.journal.journalFile)
+            stamp.extend((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.extend((-1, -1))
+        from storage.ledgerpartitions import PartitionedLedgerRepository
+        stamp.append(PartitionedLedgerRepository.totalSize())
+        return tuple(stamp)
+
+    def _read(self, journal, withTransactions):
+        """ Load the snapshot and replay the journal on top of it, returns the accounts by account number """
+        accounts = {}
+        for account in FileHandling.loadFile(withTransactions=withTransactions):
+            accounts[account.accountNumber] = account
+
+        # the snapshot alone is stale until the journal is applied
+        journal.replay(accounts)
+        return accounts
+
+    def _readCopy(self):
+        """ Load the accounts without moving the point mergeChanges continues from """
+        return list(self._read(AccountJournal(self.journal.journalFile), withTransactions=False).values())
+
+    def loadAll(self, withTransactions=True):
+        """ Load the snapshot and replay the journal on top of it, mergeChanges continues from here """
+        return list(self.loadByNumber(withTransactions).values())
+
+    def loadByNumber(self, withTransactions=True):
+        """ Load the accounts by account number, mergeChanges continues from here. Without transactions the
+            binary account snapshot is used when it was taken from the current files, its accounts are built as
+            they are looked up. """
+        with self.storeLock:
+            self.snapshotStamp = CsvAccountRepository._snapshotStamp()
+            if not withTransactions:
+                snapshot = AccountSnapshot.load(self._stamp())
+                if snapshot is not None:
+                    accounts, (self.journal.offset, self.journal.entries) = snapshot
+                    return accounts
+            return self._read(self.journal, withTransactions)
+
+    def get(self, accountNumber):
+        """ Find one account, the .csv files have no index so this reads the whole snapshot """
+        for account in self._readCopy():
+            if account.accountNumber == accountNumber:
+                return account
+        return None
+
+    def add(self, account):
+        """ Journal the new account """
+        with self.storeLock:
+            self.journal.recordCreate(account)
+            self.storeLock.bump()
+
+    def update(self, account, *fields):
+        """ Journal the changed fields """
+        self.updateMany([account], *fields)
+
+    def updateMany(self, accounts, *fields):
+        """ Journal the changed fields of many accounts in one append """
+        with self.storeLock:
+            self.journal.recordChanges(accounts, *fields)
+            self.storeLock.bump()
+
+    def rename(self, oldNumber, account):
+        """ Re-keying an account changes its row, so the snapshot is rewritten """
+        with self.storeLock:
+            accounts = [acc for acc in self._readCopy() if acc.accountNumber != oldNumber]
+            accounts.append(account)
+            success, _ = self.saveAll(accounts)
+            return success
+
+    def delete(self, accountNumber):
+        """ Removing an account removes its row, so the snapshot is rewritten """
+        with self.storeLock:
+            accounts = [acc for acc in self._readCopy() if acc.accountNumber != accountNumber]
+            success, _ = self.saveAll(accounts)
+            return success
+
+    def saveAll(self, accounts):
+        """ Write the snapshot, this compacts the journal and takes a new binary snapshot """
+        with self.storeLock:
+            accounts = list(accounts)
+            success, message = FileHandling.saveFile(accounts)
+            if success:
+                self.journal.clear()
+                self.snapshotStamp = CsvAccountRepository._snapshotStamp()
+            self.storeLock.bump()
+            if success:
+                saved, snapshotMessage = AccountSnapshot.write(accounts, self._stamp())
+                if not saved:
+                    print(snapshotMessage)
+            return success, message
+
+    def writeSnapshot(self, accounts):
+        """ Take a binary snapshot of the accounts, which must match what is stored, unless it is current """
+        with self.storeLock:
+            stamp = self._stamp()
+            if AccountSnapshot.matches(stamp):
+                return True, "Account snapshot is up to date"
+            return AccountSnapshot.write(accounts, stamp, (self.journal.offset, self.journal.entries))
+
+    def mergeChanges(self, accounts, skip=()):
+        """ Replay the journal rows appended since the last load, unless the snapshot was rewritten since """
+        with self.storeLock:
+            if self.snapshotStamp is None or CsvAccountRepository._snapshotStamp() != self.snapshotStamp:
+                return None
+            return self.journal.replayTail(accounts, skip)
+
+    def needsCompaction(self):
+        """ Compact once the journal has grown past its threshold """
+        return self.journal.needsCompaction()
+
+    def signature(self):
+        """ Generation of the store and the modification time and size of the snapshot and of the journal,
+            the file stamps catch changes made by hand """
+        stamps = [self.storeLock.generation()]
+        for path in (FileHandling.accountFile, self.journal.journalFile):
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+
+class CsvLedgerRepository(LedgerRepository):
+    """ Transaction ledger stored in transactions.csv, in the layout described by LedgerSchema """
+
+    def __init__(self, transactionFile=None):
+        self.transactionFile = transactionFile or FileHandling.transactionFile
+        self.index = LedgerIndex(self.transactionFile)
+        # kept open between appends
+        self.file = None
+        # guards the file and the index against the ledger writer thread and other processes, its generation
+        # is bumped when the ledger is rewritten in place
+        self.lock = FileLock(self.transactionFile + ".lock")
+        self.generation = None
+
+    def _checkGeneration(self):
+        """ Reload the index when another process rewrote the ledger, called with the lock held """
+        generation = self.lock.generation()
+        if generation != self.generation:
+            if self.generation is not None:
+                self.index.loaded = False
+            self.generation = generation
+
+    def upgrade(self):
+        """ Rewrite a ledger in an older layout in the current one, returns (success, message). Older layouts are
+            read in place, this only runs when asked for, by migrate.py. Rows of the per-account layout get a
+            transaction ID, rows that cannot be read are dropped. """
+        with self.lock:
+            try:
+                return self._upgrade()
+            except (OSError, ValueError) as e:
+                return False, f"Error upgrading {self.transactionFile}: {e}"
+
+    def _upgrade(self):
+        """ Body of upgrade, called with the lock held """
+        if not os.path.exists(self.transactionFile):
+            return True, f"There is no {self.transactionFile} to upgrade"
+        with open(self.transactionFile, 'r', newline='') as file:
+            version, decoder = LedgerSchema.readPreamble(file)
+            if decoder is None or version == LedgerSchema.version:
+                return True, f"{self.transactionFile} is already in ledger version {LedgerSchema.version}"
+
+            dropped = 0
+            with AtomicFile(self.transactionFile) as newFile:
+                writer = csv.writer(newFile)
+                writer.writerows(LedgerSchema.preamble())
+                if version == 1:
+                    # same columns, only the tag line is new
+                    newFile.writelines(file)
+                else:
+                    transacIds = TransactionIdGenerator()
+                    for values in csv.reader(file):
+                        row = decoder.decode(values)
+                        if row is None:
+                            dropped += 1
+                            continue
+                        row['transacId'] = transacIds.next()
+                        # a timestamp that cannot be parsed is carried over as it was written
+                        row['date'] = row['date'] or values[decoder.dateColumn]
+                        writer.writerow(LedgerSchema.toValues(row))
+
+        # every row moved, other processes reload their index when they see the new generation
+        self.close()
+        self.index.rebuild()
+        self.generation = self.lock.bump()
+        message = f"Upgraded {self.transactionFile} from ledger version {version} to {LedgerSchema.version}"
+        if dropped:
+            message += f", dropped {dropped} unreadable rows"
+        return True, message
+
+    def append(self, transacId, date, fromAccount, toAccount, amount, description):
+        """ Append one row to transactions.csv """
+        self.appendMany([{
+            'transacId': transacId, 'date': date, 'from_account': fromAccount,
+            'to_account': toAccount, 'amount': amount, 'description': description
+        }])
+
+    @staticmethod
+    def _encodeRow(values):
+        """ Format one row the way csv.writer writes it to the file, as bytes """
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue().encode('utf-8')
+
+    def _openFile(self):
+        """ Get the append handle of transactions.csv, reopening it if the file was replaced or removed """
+        if self.file is not None:
+            try:
+                if os.stat(self.transactionFile).st_ino == os.fstat(self.file.fileno()).st_ino:
+                    return self.file
+            except OSError:
+                pass
+            self.close()
+
+        os.makedirs(os.path.dirname(self.transactionFile), exist_ok=True)
+        self.file = open(self.transactionFile, 'ab')
+        return self.file
+
+    def close(self):
+        """ Close the append handle, the next append opens it again """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def appendMany(self, rows, sync=False):
+        """ Append rows to transactions.csv, writing the header if the file is new, and index their byte offsets """
+        with self.lock:
+            self._checkGeneration()
+            file = self._openFile()
+            # another process may have appended since our last write
+            file.seek(0, os.SEEK_END)
+            if file.tell() == 0:
+                for values in LedgerSchema.preamble():
+                    file.write(CsvLedgerRepository._encodeRow(values))
+
+            entries = []
+            offset = file.tell()
+            for row in rows:
+                data = CsvLedgerRepository._encodeRow(LedgerSchema.toValues(row))
+                entries.append((offset, len(data), str(row['from_account']), str(row['to_account'])))
+                file.write(data)
+                offset += len(data)
+
+            file.flush()
+            if sync:
+                os.fsync(file.fileno())
+            self.index.record(entries)
+
+    def scan(self):
+        """ Iterate over every row of transactions.csv, skipping rows that cannot be read """
+        try:
+            with open(self.transactionFile, 'r', newline='') as file:
+                yield from LedgerSchema.iterRows(file)
+        except FileNotFoundError:
+            return
+
+    def forAccount(self, accountNumber):
+        """ Read only the rows of the account, seeking to the offsets kept by the ledger index """
+        with self.lock:
+            return self._readAccount(accountNumber)
+
+    def _readAccount(self, accountNumber):
+        """ Body of forAccount, called with the lock held """
+        try:
+            self._checkGeneration()
+            locations = self.index.locate(accountNumber)
+        except Exception as e:
+            print(f"Error reading ledger index, scanning transactions.csv instead: {e}")
+            with LedgerScanner(self.transactionFile) as scanner:
+                return list(scanner.rowsOf(accountNumber))
+
+        transactions = []
+        if not locations:
+            return transactions
+
+        with open(self.transactionFile, 'rb') as file:
+            version, decoder = LedgerSchema.readPreamble(file)
+            for offset, length in locations:
+                file.seek(offset)
+                row = decoder.decode(next(csv.reader([file.read(length).decode('utf-8')]), []))
+                if row is None:
+                    continue
+                # guard against an index that went stale between the check and the read
+                if row['from_account'] == accountNumber or row['to_account'] == accountNumber:
+                    transactions.append(row)
+        return transactions
+
+    def iterAccount(self, accountNumber, newestFirst=True, startAfterId=None):
+        """ Read the rows of the account one at a time from the offsets kept by the ledger index,
+            so the newest page only reads the rows on it """
+        with self.lock:
+            self._checkGeneration()
+            locations = self.index.locate(accountNumber)
+        if not locations:
+            return
+        if newestFirst:
+            locations.reverse()
+
+        started = startAfterId is None
+        with open(self.transactionFile, 'rb') as file:
+            version, decoder = LedgerSchema.readPreamble(file)
+            for offset, length in locations:
+                file.seek(offset)
+                row = decoder.decode(next(csv.reader([file.read(length).decode('utf-8')]), []))
+                if row is None:
+                    continue
+                if row['from_account'] != accountNumber and row['to_account'] != accountNumber:
+                    continue
+
+                if started:
+                    yield row
+                elif row['transacId'] == str(startAfterId):
+                    started = True
+
+    def reader(self):
+        """ A LedgerScanner of transactions.csv, to be used as a with statement """
+        return LedgerScanner(self.transactionFile)
+
+    def summary(self, start=None):
+        """ (rows, first, last, end) of the rows from the byte offset start, see LedgerScanner.summary """
+        with LedgerScanner(self.transactionFile) as scanner:
+            return scanner.summary(start)
+
+    def countSince(self, since):
+        """ Full scan of transactions.csv counting the rows made on or after since """
+        return sum(1 for date in self.datesSince(since))
+
+    def datesSince(self, since):
+        """ Dates of the rows made on or after since, only those rows are parsed """
+        with LedgerScanner(self.transactionFile) as scanner:
+            yield from scanner.datesSince(since)
+
+    def datesAppended(self, since, position=None):
+        """ Dates of the rows appended after position, see LedgerRepository.datesAppended. The position is the
+            generation of the ledger and the byte offset past the last row read. """
+        # the generation is read before the file, a rewrite in between is read again next time
+        generation = self.lock.generation()
+        start = None
+        if position is not None:
+            if position[0] != generation:
+                return None, None
+            start = position[1]
+        with LedgerScanner(self.transactionFile) as scanner:
+            if start is not None and scanner.end() < start:
+                return None, None
+            return list(scanner.datesSince(since, start)), (generation, scanner.end())
+
+    def redactAccount(self, accountNumber):
+        """ Rewrite transactions.csv with the account number replaced by [DELETED] """
+        with self.lock:
+            return self._redact(accountNumber)
+
+    def _redact(self, accountNumber):
+        """ Body of redactAccount, called with the lock held """
+        if not os.path.exists(self.transactionFile):
+            return True
+
+        self._checkGeneration()
+        with LedgerScanner(self.transactionFile) as scanner:
+            rows = list(scanner.locate(accountNumber))
+            if not rows:
+                # the account never made a transaction, nothing to rewrite
+                return True
+
+            # the rewritten ledger replaces the old one with a rename, the append handle notices the new inode.
+            # Only the rows of the account are rewritten, the bytes between them are copied as they are.
+            fromIdx, toIdx = scanner.decoder.accountColumns
+            with AtomicFile(self.transactionFile, binary=True) as newFile:
+                copied = 0
+                for offset, end, values in rows:
+                    newFile.write(scanner.view[copied:offset])
+                    # only the account columns change, everything else is written back as it was read
+                    for i in (fromIdx, toIdx):
+                        if values[i].strip() == accountNumber:
+                            values[i] = "[DELETED]"
+                    newFile.write(CsvLedgerRepository._encodeRow(values))
+                    copied = end
+                newFile.write(scanner.view[copied:])
+
+        # every row may have moved, so the byte offsets have to be indexed again
+        self.index.rebuild()
+        self.generation = self.lock.bump()
+        return True
+
+
+class CsvApplicationRepository(ApplicationRepository):
+    """ Applications stored in applications.csv, changed under a lock shared by every TamBank process """
+
+    def __init__(self):
+        self.lock = FileLock(FileHandling.applicationFile + ".lock")
+
+    def add(self, fName, lName, mobileNo, email, initialBal, bankType):
+        """ Append the application to applications.csv """
+        with self.lock:
+            return FileHandling.saveApplication(fName, lName, mobileNo, email, initialBal, bankType)
+
+    def loadAll(self, status=None):
+        """ Read the applications from applications.csv """
+        return FileHandling.loadApplications(status)
+
+    def updateStatus(self, applicationId, newStatus, expectedStatus=None):
+        """ Rewrite applications.csv with the new status """
+        with self.lock:
+            return FileHandling.updateApplicationStatus(applicationId, newStatus, expectedStatus)
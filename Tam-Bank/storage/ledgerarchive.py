@@ -0,0 +1,422 @@
+import io
+import os
+import json
+import lzma
+import zlib
+import struct
+from utils.config import Config
+from utils.filelock import FileLock
+from utils.atomicfile import AtomicFile
+from storage.repository import LedgerRepository
+from storage.ledgerschema import LedgerSchema
+from storage.ledgerscanner import LedgerScanner
+
+class LedgerArchive:
+    """ Compressed copy of a closed ledger partition, read like LedgerScanner as a with statement.
+        The rows are kept as they were written, cut into blocks of about blockSize bytes that are compressed
+        one by one, so the rows of one account are read by decompressing only the blocks that hold them.
+        Layout:
+            header   magic and version
+            blocks   the compressed blocks one after the other
+            footer   zlib compressed JSON: the codec of the blocks, the tag line and header of the rows, the number
+                     of dated rows and their date range, and the block index: the offset, length, lines, dated
+                     rows and date range of every block, and for every account a hexadecimal bit mask of the
+                     blocks it has rows in
+            trailer  offset and crc32 of the footer, then the magic again """
+    magic = b"TAMARCH\0"
+    version = 1
+    header = struct.Struct("<8sH")
+    trailer = struct.Struct("<QI8s")
+    # uncompressed bytes of rows per block
+    blockSize = 1 << 16
+    codecs = {
+        'zlib': (zlib.compress, zlib.decompress),
+        'lzma': (lzma.compress, lzma.decompress)
+    }
+
+    def __init__(self, archiveFile):
+        self.archiveFile = archiveFile
+        self.file = None
+        # None for a missing archive
+        self.decoder = None
+        self.codec = None
+        self.preamble = b""
+        # [offset, length, lines, rows, first, last] of every block
+        self.blocks = []
+        # account number -> hexadecimal bit mask of the blocks with its rows
+        self.accounts = {}
+        self.rows = 0
+        self.first = None
+        self.last = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def open(self):
+        """ Open the archive and read its footer, a missing archive reads as one without rows """
+        try:
+            self.file = open(self.archiveFile, 'rb')
+        except FileNotFoundError:
+            return self
+        try:
+            self._readFooter()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        """ Close the archive file """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _readFooter(self):
+        """ Check the header and the trailer and read the block index """
+        size = os.fstat(self.file.fileno()).st_size
+        if size < LedgerArchive.header.size + LedgerArchive.trailer.size:
+            raise ValueError(f"{self.archiveFile} is not a ledger archive")
+        magic, version = LedgerArchive.header.unpack(self.file.read(LedgerArchive.header.size))
+        if magic != LedgerArchive.magic or version != LedgerArchive.version:
+            raise ValueError(f"{self.archiveFile} is not a version {LedgerArchive.version} ledger archive")
+        self.file.seek(size - LedgerArchive.trailer.size)
+        offset, checksum, magic = LedgerArchive.trailer.unpack(self.file.read(LedgerArchive.trailer.size))
+        if magic != LedgerArchive.magic or offset > size - LedgerArchive.trailer.size:
+            raise ValueError(f"{self.archiveFile} is truncated")
+        self.file.seek(offset)
+        data = self.file.read(size - LedgerArchive.trailer.size - offset)
+        if zlib.crc32(data) != checksum:
+            raise ValueError(f"{self.archiveFile} is corrupt")
+
+        footer = json.loads(zlib.decompress(data).decode('utf-8'))
+        self.codec = footer['codec']
+        if self.codec not in LedgerArchive.codecs:
+            raise ValueError(f"{self.archiveFile} uses the unknown codec {self.codec}")
+        self.preamble = footer['preamble'].encode('utf-8')
+        version, self.decoder = LedgerSchema.readPreamble(io.BytesIO(self.preamble))
+        parseDate = LedgerSchema.parseDate
+        self.blocks = [[offset, length, lines, rows, parseDate(first), parseDate(last)]
+                       for offset, length, lines, rows, first, last in footer['blocks']]
+        self.accounts = footer['accounts']
+        self.rows = footer['rows']
+        self.first = parseDate(footer['first'])
+        self.last = parseDate(footer['last'])
+
+    @staticmethod
+    def _formatDate(date):
+        """ Text of a footer date, empty when there is none """
+        return date.isoformat(" ") if date is not None else ""
+
+    @staticmethod
+    def _group(lines):
+        """ Lists of lines of about blockSize bytes """
+        block = []
+        size = 0
+        for line in lines:
+            block.append(line)
+            size += len(line)
+            if size >= LedgerArchive.blockSize:
+                yield block
+                block = []
+                size = 0
+        if block:
+            yield block
+
+    @staticmethod
+    def _pack(lines, decoder, compress):
+        """ Compress a block of lines, each a row with its line end. Returns the compressed bytes, the
+            [lines, rows, first, last] of the block and the accounts it has rows of. """
+        fromIdx, toIdx = decoder.accountColumns
+        dateColumn = decoder.dateColumn
+        width = max(fromIdx, toIdx, dateColumn) + 1
+        parseDate = LedgerSchema.parseDate
+        data = b"".join(lines)
+        quoted = b'"' in data
+        accounts = set()
+        rows = 0
+        first = last = None
+        for line in lines:
+            fields = LedgerScanner._fields(line.rstrip(b"\r\n"), width, quoted)
+            if fields is None:
+                continue
+            accounts.add(fields[fromIdx])
+            accounts.add(fields[toIdx])
+            date = parseDate(fields[dateColumn].decode('utf-8', 'replace'))
+            if date is None:
+                continue
+            rows += 1
+            if first is None or date < first:
+                first = date
+            if last is None or date > last:
+                last = date
+        accounts = {account.strip().decode('utf-8') for account in accounts}
+        return compress(data), [len(lines), rows, first, last], accounts
+
+    @staticmethod
+    def _build(archiveFile, preamble, codec, blocks, accounts=None):
+        """ Write an archive of packed blocks, returns its (rows, first, last). accounts is the block mask of
+            every account when the caller already has it, the accounts of the blocks are not needed then. """
+        entries = []
+        masks = {}
+        rows = 0
+        first = last = None
+        with AtomicFile(archiveFile, binary=True) as file:
+            file.write(LedgerArchive.header.pack(LedgerArchive.magic, LedgerArchive.version))
+            offset = LedgerArchive.header.size
+            for number, (data, (lines, blockRows, blockFirst, blockLast), blockAccounts) in enumerate(blocks):
+                file.write(data)
+                entries.append([offset, len(data), lines, blockRows,
+                                LedgerArchive._formatDate(blockFirst), LedgerArchive._formatDate(blockLast)])
+                offset += len(data)
+                if accounts is None:
+                    bit = 1 << number
+                    for account in blockAccounts:
+                        masks[account] = masks.get(account, 0) | bit
+                rows += blockRows
+                if blockFirst is not None and (first is None or blockFirst < first):
+                    first = blockFirst
+                if blockLast is not None and (last is None or blockLast > last):
+                    last = blockLast
+
+            footer = zlib.compress(json.dumps({
+                'codec': codec, 'preamble': preamble.decode('utf-8'), 'rows': rows,
+                'first': LedgerArchive._formatDate(first), 'last': LedgerArchive._formatDate(last),
+                'blocks': entries,
+                'accounts': accounts if accounts is not None else {account: format(mask, 'x')
+                                                                   for account, mask in masks.items()}
+            }, separators=(',', ':')).encode('utf-8'))
+            file.write(footer)
+            file.write(LedgerArchive.trailer.pack(offset, zlib.crc32(footer), LedgerArchive.magic))
+        return rows, first, last
+
+    @staticmethod
+    def write(archiveFile, preamble, lines, codec=None):
+        """ Archive ledger rows, each given as bytes with its line end, written under the preamble, the tag line
+            and header as bytes. codec is "zlib" or "lzma", Config.ledgerArchiveCodec by default.
+            Returns the (rows, first, last) of the archive. """
+        codec = codec or Config.ledgerArchiveCodec
+        if codec not in LedgerArchive.codecs:
+            raise ValueError(f"Unknown archive codec {codec}, use one of {', '.join(LedgerArchive.codecs)}")
+        version, decoder = LedgerSchema.readPreamble(io.BytesIO(preamble))
+        if decoder is None:
+            raise ValueError("An archive needs the header of its rows")
+        compress = LedgerArchive.codecs[codec][0]
+        blocks = (LedgerArchive._pack(block, decoder, compress) for block in LedgerArchive._group(lines))
+        return LedgerArchive._build(archiveFile, preamble, codec, blocks)
+
+    def _read(self, number):
+        """ Compressed bytes of a block """
+        offset, length = self.blocks[number][:2]
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def _data(self, number):
+        """ Rows of a block as they were written """
+        return LedgerArchive.codecs[self.codec][1](self._read(number))
+
+    def _lines(self, number):
+        """ Rows of a block without their line feed """
+        lines = self._data(number).split(b"\n")
+        lines.pop()
+        return lines
+
+    def blocksOf(self, accountNumber):
+        """ Numbers of the blocks with rows of the account, in file order """
+        mask = int(self.accounts.get(str(accountNumber), "0"), 16)
+        numbers = []
+        while mask:
+            low = mask & -mask
+            numbers.append(low.bit_length() - 1)
+            mask ^= low
+        return numbers
+
+    def rowsOf(self, accountNumber):
+        """ Decoded rows the account sent or received, read from the blocks the index lists for it """
+        key = str(accountNumber).encode('utf-8')
+        if self.decoder is None or not key:
+            return
+        for number in self.blocksOf(accountNumber):
+            for offset, end, values in LedgerScanner.find(self._data(number), key, self.decoder.accountColumns):
+                row = self.decoder.decode(values)
+                if row is not None:
+                    yield row
+
+    def rowsOfAccounts(self, accountNumbers=None):
+        """ Decoded rows whose sender or recipient is in accountNumbers, every row without it """
+        if self.decoder is None:
+            return
+        if accountNumbers is None:
+            numbers = range(len(self.blocks))
+        else:
+            numbers = sorted({number for accountNumber in accountNumbers
+                              for number in self.blocksOf(accountNumber)})
+        decode = self.decoder.decode
+        fromIdx, toIdx = self.decoder.accountColumns
+        width = max(fromIdx, toIdx) + 1
+        keys = None if accountNumbers is None else {str(number).encode('utf-8') for number in accountNumbers}
+        for number in numbers:
+            for line in self._lines(number):
+                line = line.rstrip(b"\r")
+                if keys is not None:
+                    fields = LedgerScanner._fields(line, width)
+                    if fields is None or (fields[fromIdx] not in keys and fields[toIdx] not in keys):
+                        continue
+                row = decode(LedgerScanner.values(line))
+                if row is not None:
+                    yield row
+
+    def datesSince(self, since):
+        """ Dates of the rows made on or after since, from the blocks whose latest row is """
+        if self.decoder is None:
+            return
+        dateColumn = self.decoder.dateColumn
+        parseDate = LedgerSchema.parseDate
+        for number, block in enumerate(self.blocks):
+            if block[5] is None or block[5] < since:
+                continue
+            for line in self._lines(number):
+                fields = LedgerScanner._fields(line.rstrip(b"\r"), dateColumn + 1)
+                if fields is None:
+                    continue
+                date = parseDate(fields[dateColumn].decode('utf-8', 'replace'))
+                if date is not None and date >= since:
+                    yield date
+
+    def lines(self):
+        """ (date, line) of every row like LedgerScanner.lines, to archive the rows again with newer ones """
+        if self.decoder is None:
+            return
+        dateColumn = self.decoder.dateColumn
+        for number in range(len(self.blocks)):
+            for line in self._lines(number):
+                fields = LedgerScanner._fields(line.rstrip(b"\r"), dateColumn + 1)
+                date = fields[dateColumn].decode('utf-8', 'replace') if fields is not None else ""
+                yield date, line + b"\n"
+
+    def summary(self):
+        """ (rows, first, last) of the archive: how many rows have a date and the earliest and latest of them """
+        return self.rows, self.first, self.last
+
+    def redact(self, accountNumber):
+        """ Rewrite the archive with the account number replaced by [DELETED]. Only the blocks with rows of the
+            account are decompressed and compressed again, the others are copied as they are. """
+        from storage.csvstore import CsvLedgerRepository
+        affected = set(self.blocksOf(accountNumber))
+        if not affected:
+            return
+        # the rewritten rows only trade the account for [DELETED], the masks of the other accounts stay the same
+        accounts = dict(self.accounts)
+        mask = int(accounts.pop(str(accountNumber)), 16)
+        accounts["[DELETED]"] = format(int(accounts.get("[DELETED]", "0"), 16) | mask, 'x')
+
+        key = str(accountNumber).encode('utf-8')
+        fromIdx, toIdx = self.decoder.accountColumns
+        compress = LedgerArchive.codecs[self.codec][0]
+
+        def blocks():
+            for number, block in enumerate(self.blocks):
+                if number not in affected:
+                    yield self._read(number), block[2:], None
+                    continue
+                # only the rows of the account are rewritten, the bytes between them are copied as they are
+                data = self._data(number)
+                parts = []
+                copied = 0
+                for offset, end, values in LedgerScanner.find(data, key, self.decoder.accountColumns):
+                    parts.append(data[copied:offset])
+                    # only the account columns change, everything else is written back as it was read
+                    for i in (fromIdx, toIdx):
+                        if values[i].strip() == str(accountNumber):
+                            values[i] = "[DELETED]"
+                    parts.append(CsvLedgerRepository._encodeRow(values))
+                    copied = end
+                parts.append(data[copied:])
+                data = b"".join(parts)
+                yield LedgerArchive._pack([line + b"\n" for line in data.split(b"\n")[:-1]], self.decoder, compress)
+
+        LedgerArchive._build(self.archiveFile, self.preamble, self.codec, blocks(), accounts)
+
+
+class ArchivedLedgerRepository(LedgerRepository):
+    """ Read-only ledger partition kept in a LedgerArchive, transactions-YYYY-MM.archive. Rows dated in an
+        archived month are appended to a new .csv partition of that month, PartitionedLedgerRepository reads
+        both. Redacting an account rewrites the archive and bumps the generation of its lock. """
+
+    def __init__(self, archiveFile):
+        self.transactionFile = archiveFile
+        self.lock = FileLock(archiveFile + ".lock")
+        # open archive and the inode, modification time and size of the file it was read from
+        self.archive = None
+        self.stat = None
+
+    def _open(self):
+        """ The archive, its block index read once and again when the file was replaced, called with the lock held """
+        try:
+            stat = os.stat(self.transactionFile)
+            stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stat = None
+        if self.archive is None or stat != self.stat:
+            self.close()
+            self.archive = LedgerArchive(self.transactionFile).open()
+            self.stat = stat
+        return self.archive
+
+    def close(self):
+        """ Close the archive file, the next read opens it again """
+        with self.lock:
+            if self.archive is not None:
+                self.archive.close()
+                self.archive = None
+
+    def reader(self):
+        """ A LedgerArchive of the partition, to be used as a with statement """
+        return LedgerArchive(self.transactionFile)
+
+    def summary(self, start=None):
+        """ (rows, first, last, size) of the archive, from its footer """
+        with self.lock:
+            rows, first, last = self._open().summary()
+            return rows, first, last, self.stat[2] if self.stat else 0
+
+    def forAccount(self, accountNumber):
+        """ Rows of the account, decompressing only the blocks that hold them """
+        with self.lock:
+            return list(self._open().rowsOf(accountNumber))
+
+    def scan(self):
+        """ Iterate over every row of the archive """
+        with LedgerArchive(self.transactionFile) as archive:
+            yield from archive.rowsOfAccounts()
+
+    def countSince(self, since):
+        """ Count the rows made on or after since """
+        return sum(1 for date in self.datesSince(since))
+
+    def datesSince(self, since):
+        """ Dates of the rows made on or after since, skipping the blocks that end before it """
+        with LedgerArchive(self.transactionFile) as archive:
+            yield from archive.datesSince(since)
+
+    def datesAppended(self, since, position=None):
+        """ Dates of the rows appended after position, see LedgerRepository.datesAppended. Archives are never
+            appended to, the position is the generation that redactions bump. """
+        generation = self.lock.generation()
+        if position is not None:
+            return ([], position) if position == generation else (None, None)
+        return list(self.datesSince(since)), generation
+
+    def redactAccount(self, accountNumber):
+        """ Rewrite the blocks of the archive that hold rows of the account """
+        with self.lock:
+            archive = self._open()
+            if str(accountNumber) not in archive.accounts:
+                return True
+            archive.redact(accountNumber)
+            self.close()
+            self.lock.bump()
+            return True
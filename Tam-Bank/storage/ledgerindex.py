@@ -0,0 +1,118 @@
+import os
+import io
+import csv
+from storage.ledgerscanner import LedgerScanner
+
+class LedgerIndex:
+    """ Sidecar index of transactions.csv that maps each account number to the byte ranges of its rows.
+        The index file is append-only with one "offset,length,from_account,to_account" line per ledger row.
+        Several processes may append to both files, callers hold the ledger's file lock around every method. """
+
+    def __init__(self, ledgerFile, indexFile=None):
+        self.ledgerFile = ledgerFile
+        self.indexFile = indexFile or ledgerFile + ".idx"
+        self.rows = {}
+        self.indexedSize = 0
+        # bytes of the index file read or written so far, entries past it were written by another process
+        self.indexFileSize = 0
+        self.loaded = False
+
+    def _addRow(self, offset, length, fromAccount, toAccount):
+        """ Remember a ledger row under both of its accounts """
+        self.rows.setdefault(fromAccount, []).append((offset, length))
+        if toAccount != fromAccount:
+            self.rows.setdefault(toAccount, []).append((offset, length))
+        self.indexedSize = max(self.indexedSize, offset + length)
+
+    def _load(self):
+        """ Read the index file into memory, rebuilding it if it cannot be read """
+        self.rows = {}
+        self.indexedSize = 0
+        self.indexFileSize = 0
+        self.loaded = True
+
+        if not os.path.exists(self.indexFile):
+            self.rebuild()
+            return
+
+        try:
+            self._readIndex()
+        except Exception as e:
+            print(f"Error loading ledger index, rebuilding it: {e}")
+            self.rebuild()
+
+    def _readIndex(self):
+        """ Read the index entries past indexFileSize, the whole file on load and the entries other processes
+            appended afterwards """
+        with open(self.indexFile, "rb") as file:
+            file.seek(self.indexFileSize)
+            for line in file:
+                # a partial last line is read once its writer finishes it
+                if not line.endswith(b"\n"):
+                    break
+                entry = next(csv.reader([line.decode('utf-8')]))
+                self._addRow(int(entry[0]), int(entry[1]), entry[2], entry[3])
+                self.indexFileSize += len(line)
+
+    def _indexFrom(self, start):
+        """ Index the ledger rows that start at or after the byte offset start """
+        with LedgerScanner(self.ledgerFile) as scanner:
+            # only complete rows are indexed, a partial last line is picked up once its writer finishes it.
+            # Rows that are too short are still recorded so the index keeps covering them.
+            self._write(list(scanner.entries(start)))
+
+    def rebuild(self):
+        """ Throw away the index and index the whole ledger again """
+        self.rows = {}
+        self.indexedSize = 0
+        self.indexFileSize = 0
+        self.loaded = True
+        if os.path.exists(self.indexFile):
+            os.remove(self.indexFile)
+        if os.path.exists(self.ledgerFile):
+            self._indexFrom(0)
+
+    def refresh(self):
+        """ Make sure the index covers the ledger, catching up on rows appended by someone else """
+        if not self.loaded:
+            self._load()
+        elif os.path.exists(self.indexFile) and os.path.getsize(self.indexFile) > self.indexFileSize:
+            # rows appended by another process were indexed by it, indexing them again would list them twice
+            self._readIndex()
+
+        size = os.path.getsize(self.ledgerFile) if os.path.exists(self.ledgerFile) else 0
+        if size < self.indexedSize:
+            # the ledger was rewritten, offsets are no longer valid
+            self.rebuild()
+        elif size > self.indexedSize:
+            self._indexFrom(self.indexedSize)
+
+    def record(self, entries):
+        """ Add (offset, length, from_account, to_account) entries for rows just appended to the ledger """
+        if not entries:
+            return
+        if not self.loaded or entries[0][0] != self.indexedSize:
+            # rows were appended by someone else in between, catch up from the ledger itself
+            self.refresh()
+            return
+        self._write(entries)
+
+    def _write(self, entries):
+        """ Append entries to the index file and to the in-memory index """
+        if not entries:
+            return
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for offset, length, fromAccount, toAccount in entries:
+            writer.writerow([offset, length, fromAccount, toAccount])
+            self._addRow(offset, length, fromAccount, toAccount)
+
+        data = buffer.getvalue().encode('utf-8')
+        with open(self.indexFile, "ab") as file:
+            file.write(data)
+        self.indexFileSize += len(data)
+
+    def locate(self, accountNumber):
+        """ Get the (offset, length) of every ledger row that mentions the account """
+        self.refresh()
+        return list(self.rows.get(accountNumber, []))
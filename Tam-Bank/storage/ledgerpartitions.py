@@ -0,0 +1,568 @@
+import os
+import re
+import csv
+import itertools
+import contextlib
+from datetime import datetime
+from utils.config import Config
+from utils.filehandling import FileHandling
+from utils.filelock import FileLock
+from utils.atomicfile import AtomicFile
+from storage.repository import LedgerRepository
+from storage.csvstore import CsvLedgerRepository
+from storage.ledgerschema import LedgerSchema
+from storage.ledgerscanner import LedgerScanner
+from storage.ledgerarchive import LedgerArchive, ArchivedLedgerRepository
+
+class LedgerManifest:
+    """ manifest.csv of the ledger partitions: for each one how many dated rows it holds, the dates of its
+        earliest and latest rows, and the size and generation of its file when they were counted. The manifest
+        is only a summary, an entry whose size or generation no longer matches the file is counted again, from
+        where it stopped when the file only grew. """
+    header = ['partition', 'rows', 'first_date', 'last_date', 'size', 'generation']
+
+    def __init__(self, manifestFile):
+        self.manifestFile = manifestFile
+        self.entries = {}
+        # entries counted since the manifest was last saved
+        self.changed = False
+
+    def _read(self):
+        """ Entries of the manifest on disk, rows that cannot be read are left out """
+        entries = {}
+        try:
+            with open(self.manifestFile, 'r', newline='') as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                for values in reader:
+                    if len(values) < len(LedgerManifest.header):
+                        continue
+                    try:
+                        entries[values[0]] = {
+                            'rows': int(values[1]),
+                            'first': LedgerSchema.parseDate(values[2]),
+                            'last': LedgerSchema.parseDate(values[3]),
+                            'size': int(values[4]),
+                            'generation': int(values[5])
+                        }
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading ledger manifest {self.manifestFile}, counting the partitions again: {e}")
+        return entries
+
+    def load(self):
+        """ Read the manifest """
+        self.entries = self._read()
+        self.changed = False
+
+    def save(self, partitions):
+        """ Write the manifest, keeping the entries other processes saved for partitions not counted here.
+            partitions are the partitions that exist, the entries of the others are dropped. """
+        entries = self._read()
+        entries.update(self.entries)
+        partitions = set(partitions)
+        entries = {partition: entry for partition, entry in entries.items() if partition in partitions}
+        self.entries = entries
+        # a lost manifest is counted again, so it is not worth an fsync
+        with AtomicFile(self.manifestFile, durability="async") as file:
+            writer = csv.writer(file)
+            writer.writerow(LedgerManifest.header)
+            for partition in sorted(entries):
+                entry = entries[partition]
+                writer.writerow([partition, entry['rows'], LedgerManifest._formatDate(entry['first']),
+                                 LedgerManifest._formatDate(entry['last']), entry['size'], entry['generation']])
+        self.changed = False
+
+    @staticmethod
+    def _formatDate(date):
+        """ Text of a manifest date, empty for a partition without dated rows """
+        return date.isoformat(" ") if date is not None else ""
+
+
+class PartitionedLedgerRepository(LedgerRepository):
+    """ Transaction ledger split into one file per month of the transaction dates, transactions-YYYY-MM.csv,
+        each one a CsvLedgerRepository with its own index and lock. Rows without a readable date go to
+        transactions-undated.csv. LedgerManifest keeps the date range and row count of every partition, so
+        queries bounded by a date skip the months that end before it and count whole months from the manifest:
+        recent activity only reads the latest partitions. A single-file transactions.csv left from before is read
+        in place as the oldest partition, legacy, and never appended to. splitLegacy(), run by
+        migrate.py --split-ledger, moves its rows into the month partitions.
+        archive() compresses the partitions of old months into LedgerArchive files, transactions-YYYY-MM.archive,
+        read through ArchivedLedgerRepository. Their partition is named YYYY-MM.archive, rows dated in an
+        archived month go to a new .csv partition of the month and are archived with it the next time. """
+    partitionDirectory = "Tam-Bank/userinfo/ledger"
+    legacy = "legacy"
+    undated = "undated"
+    archived = ".archive"
+    filePattern = re.compile(r"^transactions-(\d{4}-\d{2}|undated)\.(csv|archive)$")
+
+    def __init__(self, partitionDirectory=None, legacyFile=None):
+        self.partitionDirectory = partitionDirectory or PartitionedLedgerRepository.partitionDirectory
+        self.legacyFile = legacyFile or FileHandling.transactionFile
+        self.manifest = LedgerManifest(os.path.join(self.partitionDirectory, "manifest.csv"))
+        # guards the list of partitions and the manifest, and the split, against other threads and processes. Its
+        # generation is bumped whenever a partition file is created or removed.
+        self.lock = FileLock(self.manifest.manifestFile + ".lock")
+        self.partitions = {}
+        # whether an interrupted split was finished and the manifest read
+        self.opened = False
+        # the partitions in partition order as of the lock generation they were listed at, the directory is only
+        # listed again once another process or thread changed the partitions
+        self.generation = None
+        self.ordered = []
+
+    @staticmethod
+    def partitionOf(date):
+        """ Partition of a row date, given as a datetime or as its text: YYYY-MM, undated when it is not a date """
+        if not hasattr(date, 'strftime'):
+            date = LedgerSchema.parseDate(date)
+        if date is None:
+            return PartitionedLedgerRepository.undated
+        return f"{date.year:04d}-{date.month:02d}"
+
+    @staticmethod
+    def _sortKey(partition):
+        """ Order of the partitions: the legacy ledger and undated first, then the months oldest first, an archive
+            before the .csv partition of the same month """
+        return (partition != PartitionedLedgerRepository.legacy, partition != PartitionedLedgerRepository.undated,
+                partition[:7], not partition.endswith(PartitionedLedgerRepository.archived))
+
+    @staticmethod
+    def _monthEnd(partition):
+        """ Start of the month after a YYYY-MM partition or archive, every row of the partition is older """
+        year, month = int(partition[:4]), int(partition[5:7])
+        return datetime(year + month // 12, month % 12 + 1, 1)
+
+    @staticmethod
+    def listPartitions(partitionDirectory=None):
+        """ Names of the partitions in the directory, in partition order """
+        try:
+            names = os.listdir(partitionDirectory or PartitionedLedgerRepository.partitionDirectory)
+        except FileNotFoundError:
+            return []
+        partitions = []
+        for name in names:
+            match = PartitionedLedgerRepository.filePattern.match(name)
+            if match and match.group(2) == "csv":
+                partitions.append(match.group(1))
+            elif match and match.group(1) != PartitionedLedgerRepository.undated:
+                partitions.append(match.group(1) + PartitionedLedgerRepository.archived)
+        return sorted(partitions, key=PartitionedLedgerRepository._sortKey)
+
+    @staticmethod
+    def totalSize(partitionDirectory=None, legacyFile=None):
+        """ Bytes in all the partition files and the legacy ledger, a high-water mark of the ledger """
+        partitionDirectory = partitionDirectory or PartitionedLedgerRepository.partitionDirectory
+        paths = [legacyFile or FileHandling.transactionFile]
+        for partition in PartitionedLedgerRepository.listPartitions(partitionDirectory):
+            paths.append(os.path.join(partitionDirectory, PartitionedLedgerRepository._fileName(partition)))
+        total = 0
+        for path in paths:
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    @staticmethod
+    def _fileName(partition):
+        """ Name of the file of a partition """
+        if partition.endswith(PartitionedLedgerRepository.archived):
+            return f"transactions-{partition}"
+        return f"transactions-{partition}.csv"
+
+    def _fileOf(self, partition):
+        """ Path of the file of a partition """
+        if partition == PartitionedLedgerRepository.legacy:
+            return self.legacyFile
+        return os.path.join(self.partitionDirectory, PartitionedLedgerRepository._fileName(partition))
+
+    def _repository(self, partition):
+        """ Repository reading the file of a partition """
+        if partition.endswith(PartitionedLedgerRepository.archived):
+            return ArchivedLedgerRepository(self._fileOf(partition))
+        return CsvLedgerRepository(self._fileOf(partition))
+
+    def _partition(self, partition):
+        """ Repository of a partition, created for its first row """
+        with self.lock:
+            ledger = self.partitions.get(partition)
+            if ledger is None:
+                ledger = self.partitions[partition] = self._repository(partition)
+            return ledger
+
+    def _listPartitions(self):
+        """ Names of the partitions that have a file, the legacy ledger first when there is one """
+        partitions = PartitionedLedgerRepository.listPartitions(self.partitionDirectory)
+        if os.path.exists(self.legacyFile):
+            partitions.insert(0, PartitionedLedgerRepository.legacy)
+        return partitions
+
+    def _refresh(self):
+        """ Finish an interrupted split on first use and pick up the partitions other processes created since,
+            returns the (partition, repository) pairs in partition order. Only reads the lock generation unless
+            the partitions changed since the last call. """
+        if self.opened and self.lock.generation() == self.generation:
+            return list(self.ordered)
+        with self.lock:
+            generation = self.lock.generation()
+            if not self.opened:
+                self.manifest.load()
+                # files of a split interrupted before it could be finished
+                if not os.path.exists(self._splitMarker()):
+                    for path in self._splitFiles().values():
+                        PartitionedLedgerRepository._removeFile(path)
+                self.opened = True
+            if os.path.exists(self._splitMarker()):
+                print(f"Finishing the interrupted split of {self.legacyFile}")
+                self._finishSplit()
+            partitions = self._listPartitions()
+            for partition in partitions:
+                if partition not in self.partitions:
+                    self.partitions[partition] = self._repository(partition)
+            # partitions archived since, or a .csv partition whose first row is being appended
+            for partition in set(self.partitions) - set(partitions):
+                if not os.path.exists(self._fileOf(partition)):
+                    self.partitions.pop(partition).close()
+            self.ordered = sorted(self.partitions.items(), key=lambda item: PartitionedLedgerRepository._sortKey(item[0]))
+            self.generation = generation
+            return list(self.ordered)
+
+    def _changed(self):
+        """ Record that a partition file was created or removed, every process lists the directory again """
+        with self.lock:
+            self.lock.bump()
+
+    def readers(self):
+        """ Readers of the partitions in partition order, for callers that go through the files themselves:
+            LedgerScanner for .csv partitions and LedgerArchive for archives, each used as a with statement """
+        return [ledger.reader() for partition, ledger in self._refresh()]
+
+    @staticmethod
+    def _removeFile(path):
+        """ Delete a file if it exists """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _splitFiles(self):
+        """ Temporary files of a split, by partition """
+        try:
+            names = os.listdir(self.partitionDirectory)
+        except FileNotFoundError:
+            return {}
+        suffix = ".csv.split.tmp"
+        return {name[len("transactions-"):-len(suffix)]: os.path.join(self.partitionDirectory, name)
+                for name in names if name.startswith("transactions-") and name.endswith(suffix)}
+
+    def _splitMarker(self):
+        """ Marker file of a split that only has to be finished """
+        return os.path.join(self.partitionDirectory, "split.marker")
+
+    def splitLegacy(self):
+        """ Move the rows of the legacy transactions.csv into the month partitions and remove it, returns
+            (success, message). The rows of a month go before the ones appended to its partition since, which
+            are newer. Every partition is written as a temporary file first, then a marker file records that the
+            split only has to be finished: one interrupted before leaves the ledger as it was, one interrupted
+            while the files were renamed into place is finished on the next start. """
+        with self.lock:
+            self._refresh()
+            if not os.path.exists(self.legacyFile):
+                return True, f"There is no {self.legacyFile} to split"
+
+            legacy = self._partition(PartitionedLedgerRepository.legacy)
+            with legacy.lock, contextlib.ExitStack() as held:
+                # older layouts are brought to the current one first, so rows are copied as they are
+                success, message = legacy._upgrade()
+                if not success:
+                    return False, message
+                legacy._checkGeneration()
+                legacy.close()
+                os.makedirs(self.partitionDirectory, exist_ok=True)
+
+                files = {}
+                try:
+                    with LedgerScanner(self.legacyFile) as scanner:
+                        for date, line in scanner.lines():
+                            partition = PartitionedLedgerRepository.partitionOf(date)
+                            file = files.get(partition)
+                            if file is None:
+                                file = files[partition] = open(self._fileOf(partition) + ".split.tmp", 'wb')
+                                for values in LedgerSchema.preamble():
+                                    file.write(CsvLedgerRepository._encodeRow(values))
+                            file.write(line)
+
+                    # the rows appended to a partition since go after the legacy ones, no more are appended
+                    # until the split is done
+                    for partition in sorted(files, key=PartitionedLedgerRepository._sortKey):
+                        ledger = self._partition(partition)
+                        held.enter_context(ledger.lock)
+                        with LedgerScanner(ledger.transactionFile) as scanner:
+                            for date, line in scanner.lines():
+                                files[partition].write(line)
+
+                    for file in files.values():
+                        file.flush()
+                        os.fsync(file.fileno())
+                finally:
+                    for file in files.values():
+                        file.close()
+
+                open(self._splitMarker(), 'w').close()
+                AtomicFile.syncDirectory(self.partitionDirectory)
+                # a process that sees the marker from here on finishes the split if this one is interrupted
+                self._changed()
+                self._finishSplit()
+        self._saveManifest()
+        return True, f"Split {self.legacyFile} into {len(files)} ledger partitions in {self.partitionDirectory}"
+
+    def _finishSplit(self):
+        """ Rename the files of a split into place and remove the legacy ledger, called with the lock held """
+        for partition, path in self._splitFiles().items():
+            ledger = self._partition(partition)
+            with ledger.lock:
+                ledger.close()
+                os.replace(path, ledger.transactionFile)
+                # rows moved, other processes reload their index when they see the generation
+                ledger.index.rebuild()
+                ledger.generation = ledger.lock.bump()
+        AtomicFile.syncDirectory(self.partitionDirectory)
+
+        legacy = self.partitions.pop(PartitionedLedgerRepository.legacy, None) or CsvLedgerRepository(self.legacyFile)
+        with legacy.lock:
+            legacy.close()
+            PartitionedLedgerRepository._removeFile(self.legacyFile)
+            PartitionedLedgerRepository._removeFile(self.legacyFile + ".idx")
+            legacy.lock.bump()
+        PartitionedLedgerRepository._removeFile(self._splitMarker())
+        self.manifest.entries.pop(PartitionedLedgerRepository.legacy, None)
+        self.manifest.changed = True
+        self._changed()
+
+    def _summary(self, partition, ledger):
+        """ Manifest entry of a partition, counting the rows it does not cover yet """
+        generation = ledger.lock.generation()
+        try:
+            size = os.path.getsize(ledger.transactionFile)
+        except OSError:
+            size = 0
+        entry = self.manifest.entries.get(partition)
+        if entry is not None and entry['generation'] == generation and entry['size'] == size:
+            return entry
+
+        start = None
+        if (entry is None or entry['generation'] != generation or entry['size'] > size
+                or isinstance(ledger, ArchivedLedgerRepository)):
+            # new, or rewritten since it was counted
+            entry = {'rows': 0, 'first': None, 'last': None}
+        else:
+            # only appended to, the rows past the counted ones are added
+            start = entry['size']
+        # the generation is read before the file, a rewrite in between is counted again next time
+        rows, first, last, end = ledger.summary(start)
+        dates = [date for date in (entry['first'], entry['last'], first, last) if date is not None]
+        entry = {
+            'rows': entry['rows'] + rows,
+            'first': min(dates) if dates else None,
+            'last': max(dates) if dates else None,
+            'size': end,
+            'generation': generation
+        }
+        with self.lock:
+            self.manifest.entries[partition] = entry
+            self.manifest.changed = True
+        return entry
+
+    def _saveManifest(self):
+        """ Save the entries counted since the manifest was last saved """
+        with self.lock:
+            if not self.manifest.changed:
+                return
+            try:
+                self.manifest.save(self._listPartitions())
+            except OSError as e:
+                print(f"Error saving ledger manifest {self.manifest.manifestFile}: {e}")
+
+    def _recent(self, since):
+        """ Partitions of months that end after since and the legacy ledger, the only ones with rows dated on or
+            after it """
+        return [(partition, ledger) for partition, ledger in self._refresh()
+                if partition == PartitionedLedgerRepository.legacy
+                or (partition != PartitionedLedgerRepository.undated
+                    and PartitionedLedgerRepository._monthEnd(partition) > since)]
+
+    def append(self, transacId, date, fromAccount, toAccount, amount, description):
+        """ Append one row to the partition of its month """
+        self.appendMany([{
+            'transacId': transacId, 'date': date, 'from_account': fromAccount,
+            'to_account': toAccount, 'amount': amount, 'description': description
+        }])
+
+    def appendMany(self, rows, sync=False):
+        """ Append rows to the partitions of their months, the rows of each partition in one append """
+        groups = {}
+        for row in rows:
+            groups.setdefault(PartitionedLedgerRepository.partitionOf(row['date']), []).append(row)
+        if not groups:
+            return
+        known = {partition for partition, ledger in self._refresh()}
+        for partition, group in groups.items():
+            self._partition(partition).appendMany(group, sync=sync)
+            if partition not in known:
+                # the first row of a new month, or of a month archived since, created its file
+                self._changed()
+
+    def scan(self):
+        """ Iterate over every row, partition after partition """
+        for partition, ledger in self._refresh():
+            yield from ledger.scan()
+
+    def forAccount(self, accountNumber):
+        """ Rows of the account from the index of every partition """
+        rows = []
+        for partition, ledger in self._refresh():
+            rows.extend(ledger.forAccount(accountNumber))
+        return rows
+
+    def iterAccount(self, accountNumber, newestFirst=True, startAfterId=None):
+        """ Rows of the account one at a time, going through the partitions newest first with newestFirst,
+            so the newest page only reads the latest partitions """
+        partitions = self._refresh()
+        if newestFirst:
+            partitions.reverse()
+        started = startAfterId is None
+        for partition, ledger in partitions:
+            for row in ledger.iterAccount(accountNumber, newestFirst):
+                if started:
+                    yield row
+                elif str(row['transacId']) == str(startAfterId):
+                    started = True
+
+    def countSince(self, since):
+        """ Count the rows made on or after since: months that end before it are skipped, months that start
+            after it are counted from the manifest and only the month it falls in is scanned """
+        total = 0
+        for partition, ledger in self._recent(since):
+            entry = self._summary(partition, ledger)
+            if entry['last'] is None or entry['last'] < since:
+                continue
+            if entry['first'] >= since:
+                total += entry['rows']
+            else:
+                total += ledger.countSince(since)
+        self._saveManifest()
+        return total
+
+    def datesSince(self, since):
+        """ Dates of the rows made on or after since, read from the partitions the manifest says have some """
+        ledgers = []
+        for partition, ledger in self._recent(since):
+            entry = self._summary(partition, ledger)
+            if entry['last'] is not None and entry['last'] >= since:
+                ledgers.append(ledger)
+        self._saveManifest()
+        for ledger in ledgers:
+            yield from ledger.datesSince(since)
+
+    def datesAppended(self, since, position=None):
+        """ Dates of the rows appended after position, see LedgerRepository.datesAppended. The position holds the
+            position of every partition of a month that ends after since, a partition that was archived or
+            rewritten since makes the whole ledger read again. """
+        partitions = self._refresh()
+        if position is not None:
+            existing = {partition for partition, ledger in partitions}
+            if any(partition not in existing for partition in position):
+                return None, None
+        dates = []
+        positions = {}
+        for partition, ledger in self._recent(since):
+            previous = position.get(partition) if position is not None else None
+            partitionDates, positions[partition] = ledger.datesAppended(since, previous)
+            if partitionDates is None:
+                return None, None
+            dates.extend(partitionDates)
+        return dates, positions
+
+    def lastActivity(self, accountNumber, since=None):
+        """ Newest transaction date of the account, only the partitions of months that end after since, the legacy
+            ledger and the undated partition are read """
+        partitions = self._refresh()
+        if since is not None:
+            partitions = [(partition, ledger) for partition, ledger in partitions
+                          if partition in (PartitionedLedgerRepository.legacy, PartitionedLedgerRepository.undated)
+                          or PartitionedLedgerRepository._monthEnd(partition) > since]
+        return LedgerRepository._newest((row for partition, ledger in partitions
+                                         for row in ledger.forAccount(accountNumber)), since)
+
+    def redactAccount(self, accountNumber):
+        """ Redact the account in every partition, only those with rows of it are rewritten """
+        success = True
+        for partition, ledger in self._refresh():
+            success = ledger.redactAccount(accountNumber) and success
+        return success
+
+    @staticmethod
+    def monthsBefore(months, now=None):
+        """ Start of the month that many months before the current one """
+        now = now or datetime.now()
+        index = now.year * 12 + now.month - 1 - months
+        return datetime(index // 12, index % 12 + 1, 1)
+
+    def archive(self, months=None, codec=None):
+        """ Compress the .csv partitions of the months that ended more than months months ago, by default
+            Config.ledgerArchiveMonths, into archives. Returns (success, message). """
+        months = Config.ledgerArchiveMonths if months is None else months
+        cutoff = PartitionedLedgerRepository.monthsBefore(months)
+        archived = 0
+        for partition, ledger in self._refresh():
+            if (partition in (PartitionedLedgerRepository.legacy, PartitionedLedgerRepository.undated)
+                    or partition.endswith(PartitionedLedgerRepository.archived)
+                    or PartitionedLedgerRepository._monthEnd(partition) > cutoff):
+                continue
+            try:
+                self._archivePartition(partition, ledger, codec)
+            except (OSError, ValueError) as e:
+                return False, f"Error archiving ledger partition {partition}: {e}"
+            archived += 1
+        self._refresh()
+        self._saveManifest()
+        return True, f"Archived {archived} ledger partitions of months before {cutoff:%Y-%m}"
+
+    def _archivePartition(self, partition, ledger, codec=None):
+        """ Move the rows of a .csv partition into the archive of its month, after the rows archived before.
+            Appends to the month wait until its .csv file is gone, they start a new one. """
+        archive = self._partition(partition + PartitionedLedgerRepository.archived)
+        with ledger.lock, archive.lock:
+            ledger._checkGeneration()
+            ledger.close()
+            with LedgerScanner(ledger.transactionFile) as scanner, LedgerArchive(archive.transactionFile) as old:
+                if scanner.view is not None:
+                    preamble = old.preamble or b"".join(
+                        CsvLedgerRepository._encodeRow(values) for values in LedgerSchema.preamble())
+                    lines = itertools.chain(old.lines(), scanner.lines())
+                    LedgerArchive.write(archive.transactionFile, preamble, (line for date, line in lines), codec)
+            archive.close()
+            archive.lock.bump()
+
+            os.remove(ledger.transactionFile)
+            # drops the index of the removed rows, other processes reload theirs when they see the generation
+            ledger.index.rebuild()
+            ledger.lock.bump()
+
+        with self.lock:
+            if self.partitions.get(partition) is ledger:
+                del self.partitions[partition]
+            self.manifest.entries.pop(partition, None)
+            self.manifest.changed = True
+            self._changed()
+
+    def close(self):
+        """ Close the append handles of the partitions and save the manifest """
+        with self.lock:
+            for ledger in self.partitions.values():
+                ledger.close()
+        self._saveManifest()
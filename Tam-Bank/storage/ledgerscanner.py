@@ -0,0 +1,228 @@
+import os
+import csv
+import mmap
+from storage.ledgerschema import LedgerSchema
+
+class LedgerScanner:
+    """ Read-only scans of a transactions.csv ledger through a memory map, used as a with statement.
+        Rows are found in the mapped bytes and filtered on their account or date columns by comparing bytes,
+        only the rows that pass are decoded into ledger row dictionaries. A row is one line: a partial last line,
+        still being written by another process, is left out. The map covers the ledger as it was when the
+        scanner was opened. """
+    # bytes of rows split into lines at once by the scans that look at every row
+    chunkSize = 1 << 20
+
+    def __init__(self, ledgerFile):
+        self.ledgerFile = ledgerFile
+        self.file = None
+        # None for a missing ledger or one without rows
+        self.view = None
+        self.decoder = None
+        # byte offset of the first row, after the tag line and the header
+        self.start = 0
+
+    def __enter__(self):
+        try:
+            self.file = open(self.ledgerFile, 'rb')
+        except FileNotFoundError:
+            return self
+        version, self.decoder = LedgerSchema.readPreamble(self.file)
+        self.start = self.file.tell()
+        if self.decoder is not None and os.fstat(self.file.fileno()).st_size > self.start:
+            self.view = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if self.view is not None:
+            self.view.close()
+            self.view = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return False
+
+    @staticmethod
+    def _parse(line):
+        """ Values of a row with quoted fields """
+        return next(csv.reader([line.decode('utf-8')]), [])
+
+    @staticmethod
+    def values(line):
+        """ Values of one row given as bytes without its line end, split on commas unless it has quoted fields """
+        if b'"' in line:
+            return LedgerScanner._parse(line)
+        return line.decode('utf-8').split(',')
+
+    @staticmethod
+    def _fields(line, width, quoted=True):
+        """ At least the first width values of a row as bytes, None for a row too short to have them.
+            quoted is False when the row is known to have no quoted fields. """
+        if quoted and b'"' in line:
+            values = LedgerScanner._parse(line)
+            return [value.encode('utf-8') for value in values[:width]] if len(values) >= width else None
+        parts = line.split(b',', width)
+        return parts if len(parts) >= width else None
+
+    def _chunks(self, start=None):
+        """ (offset, lines, quoted) for pieces of about chunkSize bytes of complete rows from the byte offset start.
+            lines are the rows without their line feed, quoted tells if any of them has quoted fields. Splitting
+            a piece at once is much cheaper than looking for every line end from Python, and keeps the memory
+            used bounded whatever the size of the ledger. """
+        if self.view is None:
+            return
+        view = self.view
+        size = len(view)
+        position = self.start if start is None else max(start, self.start)
+        while position < size:
+            limit = position + LedgerScanner.chunkSize
+            end = view.rfind(b"\n", position, limit) + 1
+            if end == 0:
+                # a row longer than a piece, or the partial last line
+                end = view.find(b"\n", limit) + 1 if limit < size else 0
+                if end == 0:
+                    return
+            data = view[position:end]
+            lines = data.split(b"\n")
+            lines.pop()
+            yield position, lines, b'"' in data
+            position = end
+
+    @staticmethod
+    def find(data, key, accountColumns, start=0):
+        """ (offset, end, values) of every row in data, bytes of whole lines from start, that the account given
+            as bytes sent or received, end is past the row's line feed. The key is searched for and only the
+            lines it occurs in are split and their account columns compared to it. """
+        fromIdx, toIdx = accountColumns
+        width = max(fromIdx, toIdx) + 1
+        position = data.find(key, start)
+        while position != -1:
+            offset = data.rfind(b"\n", start - 1 if start else 0, position) + 1
+            newline = data.find(b"\n", position)
+            if newline == -1:
+                return
+            line = data[offset:newline].rstrip(b"\r")
+            fields = LedgerScanner._fields(line, width)
+            if fields is not None and (fields[fromIdx].strip() == key or fields[toIdx].strip() == key):
+                yield offset, newline + 1, LedgerScanner.values(line)
+            position = data.find(key, newline + 1)
+
+    def locate(self, accountNumber):
+        """ (offset, end, values) of every row the account sent or received, end is past the row's line feed.
+            The rows in between the ones the account number occurs in are never looked at. """
+        key = str(accountNumber).encode('utf-8')
+        if self.view is None or not key:
+            return
+        yield from LedgerScanner.find(self.view, key, self.decoder.accountColumns, self.start)
+
+    def rowsOf(self, accountNumber):
+        """ Decoded rows the account sent or received """
+        if self.decoder is None:
+            return
+        decode = self.decoder.decode
+        for offset, end, values in self.locate(accountNumber):
+            row = decode(values)
+            if row is not None:
+                yield row
+
+    def rowsOfAccounts(self, accountNumbers=None):
+        """ Decoded rows whose sender or recipient is in accountNumbers, every row without it """
+        if self.decoder is None:
+            return
+        decode = self.decoder.decode
+        fromIdx, toIdx = self.decoder.accountColumns
+        width = max(fromIdx, toIdx) + 1
+        keys = None if accountNumbers is None else {str(number).encode('utf-8') for number in accountNumbers}
+        for offset, lines, quoted in self._chunks():
+            for line in lines:
+                line = line.rstrip(b"\r")
+                if keys is not None:
+                    fields = LedgerScanner._fields(line, width, quoted)
+                    if fields is None or (fields[fromIdx] not in keys and fields[toIdx] not in keys):
+                        continue
+                row = decode(LedgerScanner.values(line) if quoted else line.decode('utf-8').split(','))
+                if row is not None:
+                    yield row
+
+    def entries(self, start=None):
+        """ (offset, length, from_account, to_account) of every complete row from the byte offset start, what the
+            ledger index records. Rows that are too short are listed without accounts. """
+        if self.decoder is None:
+            return
+        fromIdx, toIdx = self.decoder.accountColumns
+        width = max(fromIdx, toIdx) + 1
+        for offset, lines, quoted in self._chunks(start):
+            for line in lines:
+                length = len(line) + 1
+                fields = LedgerScanner._fields(line.rstrip(b"\r"), width, quoted)
+                if fields is None:
+                    yield offset, length, "", ""
+                else:
+                    yield offset, length, fields[fromIdx].decode('utf-8'), fields[toIdx].decode('utf-8')
+                offset += length
+
+    def datesSince(self, since, start=None):
+        """ Dates of the rows made on or after since, of the rows from the byte offset start. Timestamps sort like
+            their text, so the date column is compared as bytes and only the dates that pass are parsed. """
+        if self.decoder is None:
+            return
+        key = since.isoformat(" ").encode('ascii')
+        dateColumn = self.decoder.dateColumn
+        width = dateColumn + 1
+        parseDate = LedgerSchema.parseDate
+        for offset, lines, quoted in self._chunks(start):
+            for line in lines:
+                fields = LedgerScanner._fields(line, width, quoted)
+                if fields is None:
+                    continue
+                text = fields[dateColumn]
+                # a full timestamp that sorts before since cannot be on or after it
+                if len(text) >= 19 and text < key:
+                    continue
+                date = parseDate(text.rstrip(b"\r").decode('utf-8', 'replace'))
+                if date is not None and date >= since:
+                    yield date
+
+    def end(self):
+        """ Byte offset past the last complete row """
+        if self.view is None:
+            return self.start
+        return self.view.rfind(b"\n", self.start) + 1 or self.start
+
+    def summary(self, start=None):
+        """ (rows, first, last, end) of the complete rows from the byte offset start: how many of them have a
+            date, the earliest and the latest of those dates, None without any, and the offset past the last row """
+        end = self.start if start is None else max(start, self.start)
+        if self.decoder is None:
+            return 0, None, None, end
+        dateColumn = self.decoder.dateColumn
+        width = dateColumn + 1
+        parseDate = LedgerSchema.parseDate
+        rows = 0
+        first = last = None
+        for offset, lines, quoted in self._chunks(start):
+            end = offset + sum(map(len, lines)) + len(lines)
+            for line in lines:
+                fields = LedgerScanner._fields(line, width, quoted)
+                if fields is None:
+                    continue
+                date = parseDate(fields[dateColumn].rstrip(b"\r").decode('utf-8', 'replace'))
+                if date is None:
+                    continue
+                rows += 1
+                if first is None or date < first:
+                    first = date
+                if last is None or date > last:
+                    last = date
+        return rows, first, last, end
+
+    def lines(self):
+        """ (date, line) of every complete row, its date column as text and the row as bytes with its line end """
+        if self.decoder is None:
+            return
+        dateColumn = self.decoder.dateColumn
+        width = dateColumn + 1
+        for offset, lines, quoted in self._chunks():
+            for line in lines:
+                fields = LedgerScanner._fields(line.rstrip(b"\r"), width, quoted)
+                date = fields[dateColumn].decode('utf-8', 'replace') if fields is not None else ""
+                yield date, line + b"\n"
@@ -0,0 +1,166 @@
+import csv
+from datetime import datetime
+from operator import itemgetter
+from utils.money import Money
+
+class LedgerDecoder:
+    """ Row decoder compiled once for one ledger header. decode() turns the values of a row into the ledger row
+        dictionary (transacId, date, from_account, to_account, amount, description) whatever the layout of the
+        file, or returns None for a row that is too short or cannot be read. The amount is in integer cents. """
+
+    def __init__(self, version, header):
+        self.version = version
+        index = {name.strip(): i for i, name in enumerate(header)}
+        if version == 0:
+            names = LedgerSchema.legacyColumns[:4]
+            self.decode = self._decodeLegacy
+        else:
+            names = LedgerSchema.columns
+            self.decode = self._decodeCurrent
+        # columns missing from the header fall back to their position in the layout
+        positions = [index.get(name, default) for default, name in enumerate(names)]
+        self.width = max(positions) + 1
+        self.values = itemgetter(*positions)
+        # column indexes of the sender and the recipient, the ledger index keys its rows on them
+        self.accountColumns = (positions[0], positions[0]) if version == 0 else (positions[2], positions[3])
+        self.dateColumn = positions[1]
+        # rows written together share their timestamp, so the last one parsed is kept, as one tuple since
+        # decoders are shared between threads
+        self.lastDate = (None, None)
+
+    def _date(self, text):
+        """ Parse a timestamp, reusing the previous result when the text repeats """
+        lastText, date = self.lastDate
+        if text != lastText:
+            date = LedgerSchema.parseDate(text)
+            self.lastDate = (text, date)
+        return date
+
+    def _decodeCurrent(self, values):
+        """ Decode a row of the transacId, date, from_account, to_account, amount, description layout """
+        if len(values) < self.width:
+            return None
+        transacId, date, fromAccount, toAccount, amount, description = self.values(values)
+        try:
+            amount = Money.parse(amount)
+        except ValueError:
+            return None
+        return {
+            'transacId': transacId,
+            'date': self._date(date),
+            'from_account': fromAccount,
+            'to_account': toAccount,
+            'amount': amount,
+            'description': description
+        }
+
+    def _decodeLegacy(self, values):
+        """ Decode a row of the old per-account layout, money going out is recorded as sent to CASH the way
+            withdrawals are. These rows have no transaction ID until the ledger is upgraded. """
+        if len(values) < self.width:
+            return None
+        accountNumber, date, description, amount = self.values(values)
+        try:
+            amount = Money.parse(amount)
+        except ValueError:
+            return None
+        return {
+            'transacId': "",
+            'date': self._date(date),
+            'from_account': accountNumber,
+            'to_account': accountNumber if amount >= 0 else "CASH",
+            'amount': abs(amount),
+            'description': description
+        }
+
+
+class LedgerSchema:
+    """ Layout of the transactions.csv ledger. The current version starts with a tag line naming the version,
+        followed by the header and one row per transaction. Older files are told apart by their header:
+        version 1 has the same columns without the tag line, version 0 is the per-account layout with signed
+        amounts and running balances. Older files are read in place, migrate.py --upgrade-ledger rewrites them in
+        the current version. """
+    version = 2
+    tag = "#tambank-ledger"
+    columns = ['transacId', 'date', 'from_account', 'to_account', 'amount', 'description']
+    legacyColumns = ['Account Number', 'Date', 'Description', 'Amount', 'Balance']
+
+    # decoders already compiled, by version and header
+    decoders = {}
+
+    @staticmethod
+    def parseDate(text):
+        """ Parse a 'YYYY-MM-DD HH:MM:SS' timestamp, with or without microseconds, or a plain date.
+            One shape check picks the parser instead of trying formats until one does not raise, None when the
+            text is not a timestamp. """
+        if not isinstance(text, str) or len(text) < 10 or text[4] != '-' or text[7] != '-':
+            return None
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def decoder(version, header):
+        """ The decoder of a header, compiled on first use """
+        key = (version, tuple(header))
+        decoder = LedgerSchema.decoders.get(key)
+        if decoder is None:
+            decoder = LedgerSchema.decoders[key] = LedgerDecoder(version, header)
+        return decoder
+
+    @staticmethod
+    def _parseLine(line):
+        """ Values of one .csv line read from a text or a binary file """
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        return next(csv.reader([line]), [])
+
+    @staticmethod
+    def readPreamble(file):
+        """ Read the tag line and the header from the start of an open ledger, leaving the file at the first row.
+            Returns (version, decoder), the decoder is None for an empty file. """
+        values = LedgerSchema._parseLine(file.readline())
+        if not values:
+            return None, None
+        if values[0] == LedgerSchema.tag:
+            version = int(values[1]) if len(values) > 1 and values[1].isdigit() else LedgerSchema.version
+            header = LedgerSchema._parseLine(file.readline()) or LedgerSchema.columns
+        else:
+            header = values
+            version = 0 if header[:1] == LedgerSchema.legacyColumns[:1] else 1
+        return version, LedgerSchema.decoder(version, header)
+
+    @staticmethod
+    def iterRows(file):
+        """ Decode the rows of a ledger opened in text mode from its start, skipping rows that cannot be read """
+        version, decoder = LedgerSchema.readPreamble(file)
+        if decoder is None:
+            return
+        decode = decoder.decode
+        for values in csv.reader(file):
+            row = decode(values)
+            if row is not None:
+                yield row
+
+    @staticmethod
+    def preamble():
+        """ Rows starting a ledger in the current version """
+        return [[LedgerSchema.tag, str(LedgerSchema.version)], LedgerSchema.columns]
+
+    @staticmethod
+    def toValues(row):
+        """ Values of a ledger row dictionary in column order, dates written as 'YYYY-MM-DD HH:MM:SS' and the
+            amount in cents as a decimal with two places """
+        date = row['date']
+        if hasattr(date, 'strftime'):
+            date = date.strftime("%Y-%m-%d %H:%M:%S")
+        return [row['transacId'], date, row['from_account'], row['to_account'], Money.format(row['amount']),
+                row['description']]
+
+    @staticmethod
+    def signedAmount(row, accountNumber):
+        """ Amount of a ledger row in cents as seen by one of its accounts, negative when the money left it """
+        if row['from_account'] == accountNumber and row['from_account'] != row['to_account']:
+            return -row['amount']
+        return row['amount']
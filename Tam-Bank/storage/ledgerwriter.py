@@ -0,0 +1,138 @@
+import time
+import atexit
+import threading
+from utils.config import Config
+
+class LedgerCommit:
+    """ Acknowledgement for rows handed to the LedgerWriter, done once every row is written to the ledger """
+
+    def __init__(self, rowCount=1):
+        self.remaining = rowCount
+        self.success = True
+        self.message = "Transaction committed"
+        self.done = threading.Event()
+        if rowCount == 0:
+            self.done.set()
+
+    def _finish(self, success, message):
+        """ Called by the writer thread when a group holding one of the rows was written """
+        if not success:
+            self.success = False
+            self.message = message
+        self.remaining -= 1
+        if self.remaining <= 0 or not success:
+            self.done.set()
+
+    def wait(self, timeout=None):
+        """ Block until the rows are committed, returns (success, message) """
+        if not self.done.wait(timeout):
+            return False, "Timed out waiting for the ledger"
+        return self.success, self.message
+
+
+class LedgerWriter:
+    """ Group commit in front of a ledger repository.
+        Rows are queued and a background thread writes them with a single appendMany call once groupSize rows
+        are waiting or the oldest row has waited groupDelay seconds, optionally fsyncing each group. """
+
+    def __init__(self, ledgerRepo, groupSize=None, groupDelay=None, sync=None):
+        self.ledgerRepo = ledgerRepo
+        self.groupSize = max(1, groupSize or Config.ledgerGroupSize)
+        self.groupDelay = Config.ledgerGroupDelay if groupDelay is None else groupDelay
+        self.sync = Config.ledgerFsync if sync is None else sync
+
+        self.pending = []
+        self.writing = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def _start(self):
+        """ Start the writer thread on first use """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="LedgerWriter", daemon=True)
+            self.thread.start()
+            # rows queued without waiting on their commit still reach the ledger on exit
+            atexit.register(self.close)
+
+    def submit(self, row):
+        """ Queue one ledger row without waiting, returns its LedgerCommit """
+        return self.submitMany([row])
+
+    def submitMany(self, rows):
+        """ Queue ledger rows without waiting, returns one LedgerCommit covering all of them """
+        rows = list(rows)
+        commit = LedgerCommit(len(rows))
+        if not rows:
+            return commit
+
+        with self.condition:
+            if self.closed:
+                commit._finish(False, "Ledger writer is closed")
+                return commit
+            self._start()
+            self.pending.extend((row, commit) for row in rows)
+            self.condition.notify_all()
+        return commit
+
+    def append(self, transacId, date, fromAccount, toAccount, amount, description):
+        """ Queue one transaction, its amount in cents, and wait until its group is written, returns (success, message) """
+        return self.submit({
+            'transacId': transacId, 'date': date, 'from_account': fromAccount,
+            'to_account': toAccount, 'amount': amount, 'description': description
+        }).wait()
+
+    def _nextGroup(self):
+        """ Wait for a full group or for the oldest row to reach groupDelay, None once closed and drained """
+        with self.condition:
+            while not self.pending and not self.closed:
+                self.condition.wait()
+            if not self.pending:
+                return None
+
+            deadline = time.monotonic() + self.groupDelay
+            while len(self.pending) < self.groupSize and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            group = self.pending[:self.groupSize]
+            del self.pending[:self.groupSize]
+            self.writing += 1
+            return group
+
+    def _run(self):
+        """ Writer thread: write groups until the writer is closed """
+        while True:
+            group = self._nextGroup()
+            if group is None:
+                return
+
+            try:
+                self.ledgerRepo.appendMany([row for row, commit in group], sync=self.sync)
+                result = (True, "Transaction committed")
+            except Exception as e:
+                print(f"Error writing transactions to the ledger: {e}")
+                result = (False, f"Error writing transactions: {e}")
+
+            for row, commit in group:
+                commit._finish(*result)
+
+            with self.condition:
+                self.writing -= 1
+                self.condition.notify_all()
+
+    def flush(self):
+        """ Wait until every queued row is written """
+        with self.condition:
+            while self.pending or self.writing:
+                self.condition.wait()
+
+    def close(self):
+        """ Write what is still queued and stop the writer thread """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
@@ -0,0 +1,187 @@
+from datetime import datetime
+from utils.config import Config
+
+class AccountRepository:
+    """ Storage interface for the account table.
+        Implementations have a storeLock, a FileLock shared by every TamBank process that writers hold and bump. """
+
+    def loadAll(self, withTransactions=True):
+        """ Load every account, optionally attaching each account's transactions """
+        raise NotImplementedError
+
+    def loadByNumber(self, withTransactions=True):
+        """ Load every account into a dictionary by account number. Backends that can build the accounts as they
+            are looked up return a mapping that does so instead. """
+        return {account.accountNumber: account for account in self.loadAll(withTransactions)}
+
+    def get(self, accountNumber):
+        """ Get a single account by account number, None if it does not exist """
+        raise NotImplementedError
+
+    def add(self, account):
+        """ Store a newly created account """
+        raise NotImplementedError
+
+    def update(self, account, *fields):
+        """ Store the new values of the given account attributes """
+        raise NotImplementedError
+
+    def updateMany(self, accounts, *fields):
+        """ Store the new values of the given attributes of many accounts, backends override this to write once """
+        for account in accounts:
+            self.update(account, *fields)
+
+    def rename(self, oldNumber, account):
+        """ Move an account stored under oldNumber to its current account number """
+        raise NotImplementedError
+
+    def delete(self, accountNumber):
+        """ Permanently remove an account """
+        raise NotImplementedError
+
+    def saveAll(self, accounts):
+        """ Replace the stored accounts with the given list, returns (success, message) """
+        raise NotImplementedError
+
+    def writeSnapshot(self, accounts):
+        """ Store a copy of the accounts, which must match what is stored, that makes the next loadAll faster.
+            Returns (success, message), backends that load fast enough already do nothing. """
+        return True, "This backend has no account snapshot"
+
+    def mergeChanges(self, accounts, skip=()):
+        """ Apply what other processes stored since the last load to the accounts dictionary, leaving the
+            account numbers in skip alone. Returns the account numbers changed, or None when the backend cannot
+            tell and the caller has to load every account again. """
+        return None
+
+    def needsCompaction(self):
+        """ Check if pending changes should be folded back with saveAll """
+        return False
+
+    def signature(self):
+        """ Value that changes whenever the stored accounts change, used to skip needless reloads """
+        raise NotImplementedError
+
+
+class LedgerRepository:
+    """ Storage interface for the transaction ledger.
+        Rows are dictionaries with transacId, date, from_account, to_account, amount and description, the amount
+        in integer cents. """
+
+    def append(self, transacId, date, fromAccount, toAccount, amount, description):
+        """ Append one transaction to the ledger """
+        raise NotImplementedError
+
+    def appendMany(self, rows, sync=False):
+        """ Append many transaction rows at once, with sync the rows are on disk before this returns """
+        for row in rows:
+            self.append(row['transacId'], row['date'], row['from_account'], row['to_account'],
+                        row['amount'], row['description'])
+
+    def forAccount(self, accountNumber):
+        """ Get every transaction where the account is the sender or the recipient """
+        raise NotImplementedError
+
+    def iterAccount(self, accountNumber, newestFirst=True, startAfterId=None):
+        """ Iterate over the transactions of an account in ledger order, or in reverse with newestFirst.
+            With startAfterId the iteration begins right after that transaction ID. """
+        rows = self.forAccount(accountNumber)
+        if newestFirst:
+            rows.reverse()
+        started = startAfterId is None
+        for row in rows:
+            if started:
+                yield row
+            elif str(row['transacId']) == str(startAfterId):
+                started = True
+
+    def scan(self):
+        """ Iterate over every transaction in the ledger """
+        raise NotImplementedError
+
+    def countSince(self, since):
+        """ Count the transactions made on or after a date """
+        raise NotImplementedError
+
+    def datesSince(self, since):
+        """ Iterate over the dates of the transactions made on or after a date """
+        for row in self.scan():
+            if row['date'] and row['date'] >= since:
+                yield row['date']
+
+    def datesAppended(self, since, position=None):
+        """ (dates, position): the dates of the rows made on or after since that were appended after position, the
+            position returned by an earlier call, or of every row without one. dates is None when the ledger was
+            rewritten since position, the caller has to read it again without one. Backends that cannot tell
+            which rows were appended return no position, so every call reads every row. """
+        if position is not None:
+            return None, None
+        return list(self.datesSince(since)), None
+
+    def lastActivity(self, accountNumber, since=None):
+        """ Date of the newest transaction of the account, None if it has none made on or after since.
+            Transactions without a readable date count as made now, the way the history views show them. """
+        return LedgerRepository._newest(self.forAccount(accountNumber), since)
+
+    @staticmethod
+    def _newest(rows, since=None):
+        """ Newest date of the rows made on or after since """
+        newest = None
+        now = datetime.now()
+        for row in rows:
+            date = row['date'] or now
+            if (since is None or date >= since) and (newest is None or date > newest):
+                newest = date
+        return newest
+
+    def redactAccount(self, accountNumber):
+        """ Replace an account number in the ledger with [DELETED] """
+        raise NotImplementedError
+
+
+class ApplicationRepository:
+    """ Storage interface for account applications """
+    statuses = ["Pending", "Accepted", "Declined"]
+
+    def add(self, fName, lName, mobileNo, email, initialBal, bankType):
+        """ Store a new pending application, returns (success, applicationId or error message) """
+        raise NotImplementedError
+
+    def loadAll(self, status=None):
+        """ Load all applications or filter by status """
+        raise NotImplementedError
+
+    def get(self, applicationId):
+        """ Get a single application, None if it does not exist """
+        for application in self.loadAll():
+            if application['applicationId'] == applicationId:
+                return application
+        return None
+
+    def updateStatus(self, applicationId, newStatus, expectedStatus=None):
+        """ Update the status of an application, returns (success, message).
+            With expectedStatus the update fails if another admin changed the status since it was read. """
+        raise NotImplementedError
+
+    @staticmethod
+    def _newApplicationId():
+        """ Generate the application ID from the current time """
+        return f"APP-{int(datetime.now().timestamp())}"
+
+
+def createRepositories(backend=None):
+    """ Create the account, ledger and application repositories for the configured backend """
+    backend = (backend or Config.storageBackend).lower()
+
+    if backend == "sqlite":
+        from storage.sqlitestore import SqliteDatabase, SqliteAccountRepository, SqliteLedgerRepository, SqliteApplicationRepository
+        database = SqliteDatabase(Config.databaseFile)
+        return (SqliteAccountRepository(database), SqliteLedgerRepository(database),
+                SqliteApplicationRepository(database))
+
+    if backend == "csv":
+        from storage.csvstore import CsvAccountRepository, CsvApplicationRepository
+        from storage.ledgerpartitions import PartitionedLedgerRepository
+        return CsvAccountRepository(), PartitionedLedgerRepository(), CsvApplicationRepository()
+
+    raise ValueError(f"Unknown storage backend: {backend}")
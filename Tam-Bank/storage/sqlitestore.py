@@ -0,0 +1,413 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from utils.filehandling import FileHandling
+from utils.config import Config
+from utils.money import Money
+from utils.filelock import FileLock
+from storage.repository import AccountRepository, LedgerRepository, ApplicationRepository
+from storage.ledgerschema import LedgerSchema
+
+class SqliteDatabase:
+    """ Shared sqlite connection with the TamBank schema.
+        Every statement is a constant parameterized string, so sqlite keeps it prepared in its statement cache. """
+    schema = [
+        """CREATE TABLE IF NOT EXISTS accounts (
+            account_number TEXT PRIMARY KEY,
+            first_name TEXT, last_name TEXT, mobile_number TEXT, email TEXT,
+            balance REAL NOT NULL DEFAULT 0, date_opened TEXT, status TEXT,
+            password_hash TEXT, account_type TEXT)""",
+        "CREATE INDEX IF NOT EXISTS idx_accounts_email ON accounts(email)",
+        "CREATE INDEX IF NOT EXISTS idx_accounts_mobile ON accounts(mobile_number)",
+        """CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transac_id TEXT, date TEXT, from_account TEXT, to_account TEXT,
+            amount REAL NOT NULL, description TEXT)""",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_from ON transactions(from_account, date)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_to ON transactions(to_account, date)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_transac_id ON transactions(transac_id)",
+        """CREATE TABLE IF NOT EXISTS applications (
+            application_id TEXT PRIMARY KEY,
+            first_name TEXT, last_name TEXT, mobile_number TEXT, email TEXT,
+            initial_balance REAL, bank_type TEXT, status TEXT, application_date TEXT)""",
+        "CREATE INDEX IF NOT EXISTS idx_applications_status ON applications(status)"
+    ]
+
+    def __init__(self, databaseFile):
+        """ Open the database in WAL mode and create the tables if needed """
+        directory = os.path.dirname(databaseFile)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.databaseFile = databaseFile
+        self.readers = threading.local()
+        self.readerConnections = []
+        self.connection = sqlite3.connect(databaseFile, check_same_thread=False, cached_statements=256)
+        # the ledger writer thread shares the connection, so database transactions must not interleave. The lock is
+        # shared with other TamBank processes too: sqlite answers a busy database by sleeping for up to 100ms at a
+        # time, while waiting on the lock file wakes the next writer as soon as the current one commits
+        self.lock = FileLock(databaseFile + ".write.lock")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs the WAL on every commit when the ledger is configured to fsync each group
+        self.connection.execute("PRAGMA synchronous=FULL" if Config.ledgerFsync else "PRAGMA synchronous=NORMAL")
+        with self.lock, self.connection:
+            for statement in SqliteDatabase.schema:
+                self.connection.execute(statement)
+
+    def reader(self):
+        """ Connection of the calling thread for queries. A result that is still being read keeps a read
+            transaction open on its connection, and the next write on that connection fails as "database is
+            locked" once another process has committed, so queries never run on the writing connection. """
+        connection = getattr(self.readers, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.databaseFile, check_same_thread=False, cached_statements=256)
+            self.readers.connection = connection
+            with self.lock:
+                self.readerConnections.append(connection)
+        return connection
+
+    def close(self):
+        """ Close the connections """
+        with self.lock:
+            for connection in self.readerConnections:
+                connection.close()
+            self.readerConnections = []
+        self.connection.close()
+
+
+class SqliteAccountRepository(AccountRepository):
+    """ Accounts stored in the sqlite accounts table, keyed by account number """
+    columns = {
+        'accountNumber': 'account_number',
+        'fName': 'first_name',
+        'lName': 'last_name',
+        'mobileNo': 'mobile_number',
+        'email': 'email',
+        'balance': 'balance',
+        'dateOpened': 'date_opened',
+        'status': 'status',
+        'passHash': 'password_hash',
+        'accountType': 'account_type'
+    }
+
+    # same column order as FileHandling.accountHeader so rows can go through accountToRow/accountFromRow
+    selectSql = ("SELECT account_number, first_name, last_name, mobile_number, email, balance, "
+                 "date_opened, status, password_hash, account_type FROM accounts")
+    insertSql = "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+        self.lock = database.lock
+        # held by account writers of every TamBank process, which bump its generation
+        self.storeLock = FileLock(database.databaseFile + ".lock")
+
+    def loadAll(self, withTransactions=True):
+        """ Load every account, transactions are read from the ledger table on demand instead of attached here """
+        accounts = []
+        for row in self.database.reader().execute(SqliteAccountRepository.selectSql):
+            try:
+                accounts.append(FileHandling.accountFromRow(list(row)))
+            except Exception as e:
+                print(f"Error processing account row {row}: {e}")
+        return accounts
+
+    def get(self, accountNumber):
+        """ Primary key lookup """
+        row = self.database.reader().execute(SqliteAccountRepository.selectSql + " WHERE account_number = ?",
+                                             (accountNumber,)).fetchone()
+        return FileHandling.accountFromRow(list(row)) if row else None
+
+    def add(self, account):
+        """ Insert the new account """
+        with self.storeLock:
+            with self.lock, self.connection:
+                self.connection.execute(SqliteAccountRepository.insertSql, FileHandling.accountToRow(account))
+            self.storeLock.bump()
+
+    def update(self, account, *fields):
+        """ Update only the changed columns of one row """
+        self.updateMany([account], *fields)
+
+    def updateMany(self, accounts, *fields):
+        """ Update the changed columns of many rows in a single transaction """
+        assignments = []
+        for field in fields:
+            if field not in SqliteAccountRepository.columns or field in ('accountNumber', 'dateOpened'):
+                raise ValueError(f"Field {field} cannot be updated")
+            assignments.append(f"{SqliteAccountRepository.columns[field]} = ?")
+
+        rows = ([getattr(account, field) for field in fields] + [account.accountNumber] for account in accounts)
+        with self.storeLock:
+            with self.lock, self.connection:
+                self.connection.executemany(f"UPDATE accounts SET {', '.join(assignments)} WHERE account_number = ?", rows)
+            self.storeLock.bump()
+
+    def rename(self, oldNumber, account):
+        """ Re-key the row and store the rest of its details """
+        with self.storeLock:
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM accounts WHERE account_number = ?", (oldNumber,))
+                self.connection.execute(SqliteAccountRepository.insertSql, FileHandling.accountToRow(account))
+            self.storeLock.bump()
+        return True
+
+    def delete(self, accountNumber):
+        """ Delete one row """
+        with self.storeLock:
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM accounts WHERE account_number = ?", (accountNumber,))
+            self.storeLock.bump()
+        return True
+
+    def saveAll(self, accounts):
+        """ Replace the whole table in a single transaction """
+        try:
+            with self.storeLock:
+                with self.lock, self.connection:
+                    self.connection.execute("DELETE FROM accounts")
+                    self.connection.executemany(SqliteAccountRepository.insertSql,
+                                                (FileHandling.accountToRow(account) for account in accounts))
+                self.storeLock.bump()
+            return True, "Accounts saved to database"
+        except Exception as e:
+            return False, f"Error saving accounts to database: {e}"
+
+    def mergeChanges(self, accounts, skip=()):
+        """ Compare every row with the account in memory and rebuild only the rows that differ, skipping the
+            date parsing of the unchanged ones. Accounts added or removed fall back to a full load. """
+        rows = self.database.reader().execute(SqliteAccountRepository.selectSql).fetchall()
+        if len(rows) != len(accounts):
+            return None
+
+        changed = set()
+        for row in rows:
+            current = accounts.get(row[0])
+            if current is None:
+                return None
+            if row[0] in skip:
+                continue
+            # same columns as selectSql, minus the account number and the date opened that never change
+            stored = (row[1], row[2], row[3], row[4], Money.toCents(row[5]), row[7], row[8], row[9] or "Savings")
+            inMemory = (current.fName, current.lName, current.mobileNo, current.email, current.cents,
+                        current.status, current.passHash, getattr(current, 'accountType', "Savings"))
+            if stored != inMemory and current.copyFrom(FileHandling.accountFromRow(list(row))):
+                changed.add(row[0])
+        return changed
+
+    def signature(self):
+        """ Generation of the account table, bumped by every write so ledger commits do not look like account
+            changes the way sqlite's data_version does """
+        return self.storeLock.generation()
+
+
+class SqliteLedgerRepository(LedgerRepository):
+    """ Transaction ledger stored in the sqlite transactions table """
+    selectSql = "SELECT transac_id, date, from_account, to_account, amount, description FROM transactions"
+    insertSql = ("INSERT INTO transactions (transac_id, date, from_account, to_account, amount, description) "
+                 "VALUES (?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+        self.lock = database.lock
+
+    @staticmethod
+    def _toRow(row):
+        """ Convert a database row into a ledger row dictionary """
+        return {
+            'transacId': row[0],
+            'date': LedgerSchema.parseDate(row[1]),
+            'from_account': row[2],
+            'to_account': row[3],
+            'amount': Money.toCents(row[4]),
+            'description': row[5]
+        }
+
+    @staticmethod
+    def _toValues(row):
+        """ Convert a ledger row dictionary into insert parameters """
+        date = row['date']
+        if hasattr(date, 'strftime'):
+            date = date.strftime("%Y-%m-%d %H:%M:%S")
+        return (str(row['transacId']), date, row['from_account'], row['to_account'],
+                Money.toUnits(row['amount']), row['description'])
+
+    def append(self, transacId, date, fromAccount, toAccount, amount, description):
+        """ Insert one transaction """
+        self.appendMany([{
+            'transacId': transacId, 'date': date, 'from_account': fromAccount,
+            'to_account': toAccount, 'amount': amount, 'description': description
+        }])
+
+    def appendMany(self, rows, sync=False):
+        """ Insert many transactions in a single database transaction, durability follows PRAGMA synchronous """
+        with self.lock, self.connection:
+            self.connection.executemany(SqliteLedgerRepository.insertSql,
+                                        (SqliteLedgerRepository._toValues(row) for row in rows))
+
+    def scan(self):
+        """ Iterate over the whole ledger in insertion order """
+        for row in self.database.reader().execute(SqliteLedgerRepository.selectSql + " ORDER BY id"):
+            yield SqliteLedgerRepository._toRow(row)
+
+    def forAccount(self, accountNumber):
+        """ Two index lookups, one on the sender and one on the recipient column """
+        cursor = self.database.reader().execute(
+            SqliteLedgerRepository.selectSql + " WHERE from_account = ? UNION ALL " +
+            SqliteLedgerRepository.selectSql + " WHERE to_account = ? AND from_account <> ?",
+            (accountNumber, accountNumber, accountNumber))
+        return [SqliteLedgerRepository._toRow(row) for row in cursor]
+
+    def iterAccount(self, accountNumber, newestFirst=True, startAfterId=None):
+        """ Keyset query in insertion order, continuing from the row id of startAfterId """
+        order = "DESC" if newestFirst else "ASC"
+        condition = ""
+        params = [accountNumber, accountNumber]
+        if startAfterId is not None:
+            found = self.database.reader().execute(
+                "SELECT id FROM transactions WHERE transac_id = ? AND (from_account = ? OR to_account = ?) LIMIT 1",
+                (str(startAfterId), accountNumber, accountNumber)).fetchone()
+            if found is None:
+                return
+            condition = " AND id < ?" if newestFirst else " AND id > ?"
+            params.append(found[0])
+
+        cursor = self.database.reader().execute(
+            SqliteLedgerRepository.selectSql + " WHERE (from_account = ? OR to_account = ?)" + condition +
+            f" ORDER BY id {order}", params)
+        for row in cursor:
+            yield SqliteLedgerRepository._toRow(row)
+
+    def countSince(self, since):
+        """ Range count on the date index """
+        sinceStr = since.strftime("%Y-%m-%d %H:%M:%S")
+        return self.database.reader().execute("SELECT COUNT(*) FROM transactions WHERE date >= ?", (sinceStr,)).fetchone()[0]
+
+    def datesSince(self, since):
+        """ Range scan on the date index """
+        sinceStr = since.strftime("%Y-%m-%d %H:%M:%S")
+        for (date,) in self.database.reader().execute("SELECT date FROM transactions WHERE date >= ?", (sinceStr,)):
+            date = LedgerSchema.parseDate(date)
+            if date is not None:
+                yield date
+
+    def datesAppended(self, since, position=None):
+        """ Dates of the rows inserted after position, see LedgerRepository.datesAppended. The position is the
+            highest row id read, redactions update rows in place and never move them. """
+        sinceStr = since.strftime("%Y-%m-%d %H:%M:%S")
+        reader = self.database.reader()
+        end = reader.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        dates = []
+        for (date,) in reader.execute("SELECT date FROM transactions WHERE id > ? AND id <= ? AND date >= ?",
+                                      (position or 0, end, sinceStr)):
+            date = LedgerSchema.parseDate(date)
+            if date is not None:
+                dates.append(date)
+        return dates, end
+
+    def redactAccount(self, accountNumber):
+        """ Index driven update of the rows that mention the account """
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE transactions SET from_account = '[DELETED]' WHERE from_account = ?", (accountNumber,))
+            self.connection.execute("UPDATE transactions SET to_account = '[DELETED]' WHERE to_account = ?", (accountNumber,))
+        return True
+
+
+class SqliteApplicationRepository(ApplicationRepository):
+    """ Applications stored in the sqlite applications table """
+    selectSql = ("SELECT application_id, first_name, last_name, mobile_number, email, initial_balance, "
+                 "bank_type, status, application_date FROM applications")
+    insertSql = "INSERT INTO applications VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+        self.lock = database.lock
+
+    @staticmethod
+    def _toApplication(row):
+        """ Convert a database row into the application dictionary used by the GUI """
+        try:
+            appDate = datetime.strptime(row[8], '%Y-%m-%d %H:%M:%S')
+        except (ValueError, TypeError):
+            appDate = datetime.now()
+        return {
+            'applicationId': row[0],
+            'fName': row[1],
+            'lName': row[2],
+            'mobileNo': row[3],
+            'email': row[4],
+            'initialBal': float(row[5] or 0.0),
+            'bankType': row[6] or 'Savings',
+            'status': row[7],
+            'applicationDate': appDate
+        }
+
+    def add(self, fName, lName, mobileNo, email, initialBal, bankType):
+        """ Insert a new pending application """
+        try:
+            initialBal = float(initialBal) if isinstance(initialBal, str) else initialBal
+            if initialBal < FileHandling.minBal:
+                return False, f"Initial balance must be at least ${FileHandling.minBal:.2f}"
+
+            applicationId = ApplicationRepository._newApplicationId()
+            applicationDate = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with self.lock, self.connection:
+                self.connection.execute(SqliteApplicationRepository.insertSql, (
+                    applicationId, fName, lName, mobileNo, email, initialBal,
+                    bankType, "Pending", applicationDate))
+            return True, applicationId
+        except Exception as e:
+            return False, f"Error saving application: {e}"
+
+    def importAll(self, applications):
+        """ Insert already existing applications, used by the migration tool """
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO applications VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                (app['applicationId'], app['fName'], app['lName'], app['mobileNo'], app['email'],
+                 app['initialBal'], app['bankType'], app['status'],
+                 app['applicationDate'].strftime('%Y-%m-%d %H:%M:%S'))
+                for app in applications))
+
+    def loadAll(self, status=None):
+        """ Load all applications, filtering on the status index when given """
+        if status:
+            cursor = self.database.reader().execute(SqliteApplicationRepository.selectSql + " WHERE status = ?", (status,))
+        else:
+            cursor = self.database.reader().execute(SqliteApplicationRepository.selectSql)
+        return [SqliteApplicationRepository._toApplication(row) for row in cursor]
+
+    def get(self, applicationId):
+        """ Primary key lookup """
+        row = self.database.reader().execute(SqliteApplicationRepository.selectSql + " WHERE application_id = ?",
+                                             (applicationId,)).fetchone()
+        return SqliteApplicationRepository._toApplication(row) if row else None
+
+    def updateStatus(self, applicationId, newStatus, expectedStatus=None):
+        """ Update the status of one application, only if it still has expectedStatus when one is given """
+        if not applicationId:
+            return False, "Invalid application ID"
+
+        if newStatus not in ApplicationRepository.statuses:
+            return False, "Invalid status. Must be Pending, Accepted, or Declined."
+
+        try:
+            with self.lock, self.connection:
+                if expectedStatus is None:
+                    cursor = self.connection.execute("UPDATE applications SET status = ? WHERE application_id = ?",
+                                                     (newStatus, applicationId))
+                else:
+                    cursor = self.connection.execute(
+                        "UPDATE applications SET status = ? WHERE application_id = ? AND status = ?",
+                        (newStatus, applicationId, expectedStatus))
+            if cursor.rowcount == 0:
+                current = self.get(applicationId)
+                if current is not None and expectedStatus is not None:
+                    return False, f"Application {applicationId} was already marked {current['status']}"
+                return False, f"Application with ID {applicationId} not found"
+            return True, f"Application {applicationId} status updated to {newStatus}"
+        except Exception as e:
+            return False, f"Error updating application status: {e}"
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from services.bank import TamBank
+from storage.ledgerschema import LedgerSchema
+from utils.config import Config
+
+def ledgerTotals(ledger, accountNumbers):
+    """ Net amount in cents the ledger moved into each of the accounts """
+    totals = dict.fromkeys(accountNumbers, 0)
+    for row in ledger.scan():
+        for accountNumber in {row['from_account'], row['to_account']}:
+            if accountNumber in totals:
+                totals[accountNumber] += LedgerSchema.signedAmount(row, accountNumber)
+    return totals
+
+def stress(threads=8, operations=2000, accounts=200, seed=1, backend=None):
+    """ Run deposits, withdrawals and transfers from many threads at once against the bank in the current directory,
+        then check that the balances, the ledger and what a new bank loads all agree. Returns the failed checks. """
+    bank = TamBank(backend)
+    try:
+        accountNumbers = [account.accountNumber for account in bank.accounts.values()
+                          if account.status == "Active" and account.accountNumber != "admin"]
+        while len(accountNumbers) < accounts:
+            accountNumbers.append(bank.createAccount("Stress", "Test", 1000, "09123456789", "stress@tambank.ph").accountNumber)
+
+        balancesBefore = {accountNumber: account.cents for accountNumber, account in bank.accounts.items()}
+        ledgerBefore = ledgerTotals(bank.ledgerRepo, balancesBefore)
+        rowsBefore = sum(1 for row in bank.ledgerRepo.scan())
+
+        # per thread: cents deposited minus cents withdrawn, and ledger rows written
+        netCash = [0] * threads
+        posted = [0] * threads
+
+        def work(index):
+            rand = random.Random(seed + index)
+            for i in range(operations):
+                choice = rand.random()
+                accountNumber = rand.choice(accountNumbers)
+                amount = rand.randint(1, 300)
+                if choice < 0.6:
+                    success, message = bank.transaction(accountNumber, rand.choice(accountNumbers), amount, "Stress transfer")
+                elif choice < 0.8:
+                    success, message = bank.deposit(accountNumber, amount)
+                    if success:
+                        netCash[index] += amount * 100
+                else:
+                    success, message = bank.withdraw(accountNumber, amount)
+                    if success:
+                        netCash[index] -= amount * 100
+                if success:
+                    posted[index] += 1
+
+        workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        balancesAfter = {accountNumber: account.cents for accountNumber, account in bank.accounts.items()}
+    finally:
+        bank.close()
+    print(f"{threads * operations} operations from {threads} threads in {elapsed:.1f}s "
+          f"({threads * operations / elapsed:.0f}/s), {sum(posted)} posted")
+
+    reloaded = TamBank(backend)
+    try:
+        balancesLoaded = {accountNumber: account.cents for accountNumber, account in reloaded.accounts.items()}
+        ledgerAfter = ledgerTotals(reloaded.ledgerRepo, balancesAfter)
+        rowsAfter = sum(1 for row in reloaded.ledgerRepo.scan())
+    finally:
+        reloaded.close()
+
+    checks = [
+        ("sum of balances moved by the deposits and withdrawals only",
+         sum(balancesAfter.values()) - sum(balancesBefore.values()) == sum(netCash)),
+        ("no negative balance", min(balancesAfter.values(), default=0) >= 0),
+        ("a new bank loads the same balances", balancesLoaded == balancesAfter),
+        ("one ledger row per posted operation", rowsAfter - rowsBefore == sum(posted)),
+        ("ledger totals of every account moved with its balance",
+         all(ledgerAfter[accountNumber] - ledgerBefore.get(accountNumber, 0) ==
+             balancesAfter[accountNumber] - balancesBefore.get(accountNumber, 0) for accountNumber in balancesAfter)),
+    ]
+    failed = []
+    for name, passed in checks:
+        print(f"{'ok  ' if passed else 'FAIL'} {name}")
+        if not passed:
+            failed.append(name)
+    return failed
+
+def main():
+    """ Entry point: python Tam-Bank/stresstest.py [--threads N] [--operations N] [--backend csv|sqlite] [--in-place] """
+    parser = argparse.ArgumentParser(description="Post concurrent deposits, withdrawals and transfers and check that the "
+                                                 "balances and the ledger stay consistent. Runs on a copy of "
+                                                 "Tam-Bank/userinfo in a temporary directory unless --in-place is given.")
+    parser.add_argument("--threads", type=int, default=8, help="threads posting at the same time")
+    parser.add_argument("--operations", type=int, default=2000, help="operations per thread")
+    parser.add_argument("--accounts", type=int, default=200, help="create test accounts until there are this many")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the first thread")
+    parser.add_argument("--backend", choices=("csv", "sqlite"), default=None, help="storage backend, defaults to TAMBANK_STORAGE")
+    parser.add_argument("--in-place", action="store_true", help="run against the userinfo files of the current directory")
+    args = parser.parse_args()
+    if args.threads < 1 or args.operations < 1:
+        parser.error("--threads and --operations must be at least 1")
+
+    workDirectory = None
+    startDirectory = os.getcwd()
+    if not args.in_place:
+        workDirectory = tempfile.mkdtemp(prefix="tambank-stress-")
+        shutil.copytree(os.path.join(os.path.dirname(os.path.abspath(__file__)), "userinfo"),
+                        os.path.join(workDirectory, "Tam-Bank", "userinfo"),
+                        ignore=shutil.ignore_patterns("*.lock"))
+        os.chdir(workDirectory)
+        if (args.backend or Config.storageBackend) == "sqlite" and not os.path.exists(Config.databaseFile):
+            from migrate import migrate
+            migrate(Config.databaseFile)
+
+    try:
+        failed = stress(args.threads, args.operations, args.accounts, args.seed, args.backend)
+    finally:
+        if workDirectory:
+            os.chdir(startDirectory)
+            shutil.rmtree(workDirectory, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
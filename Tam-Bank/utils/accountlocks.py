@@ -0,0 +1,80 @@
+import zlib
+import threading
+from contextlib import contextmanager
+from utils.filelock import FileLock
+
+class AccountLocks:
+    """ One lock per account number, created on first use, so operations on different accounts run side by side.
+        hold() takes the locks of several accounts in account number order, two transfers between the same
+        accounts in opposite directions therefore wait on each other instead of deadlocking.
+        Each account also locks one byte of lockFile, at the offset of its account number, so other TamBank
+        processes working on the same files wait for it as well. """
+    lockFile = "Tam-Bank/userinfo/account_locks.lock"
+
+    # account numbers that are not numeric lock a byte above every numeric one
+    namedOffset = 10 ** 9
+
+    def __init__(self, lockFile=None):
+        """ lockFile=False keeps the locks inside this process """
+        self.locks = {}
+        self.guard = threading.Lock()
+        # nesting depth of each account held, the byte of the lock file is taken at the first level only
+        self.depths = {}
+        if lockFile is False:
+            self.fileLock = None
+        else:
+            self.fileLock = FileLock(lockFile or AccountLocks.lockFile)
+
+    def lockFor(self, accountNumber):
+        """ The lock of one account, reentrant so a locked operation can call another one on the same account """
+        accountNumber = str(accountNumber)
+        lock = self.locks.get(accountNumber)
+        if lock is None:
+            with self.guard:
+                lock = self.locks.setdefault(accountNumber, threading.RLock())
+        return lock
+
+    @staticmethod
+    def _offset(accountNumber):
+        """ Byte of the lock file standing for an account, the same in every process """
+        if accountNumber.isdigit() and int(accountNumber) < AccountLocks.namedOffset:
+            return int(accountNumber)
+        return AccountLocks.namedOffset + zlib.crc32(accountNumber.encode('utf-8')) % AccountLocks.namedOffset
+
+    def _acquire(self, accountNumber):
+        """ Take the thread lock of an account, then its byte of the lock file when the thread first takes it """
+        lock = self.lockFor(accountNumber)
+        lock.acquire()
+        if accountNumber in self.depths:
+            self.depths[accountNumber] += 1
+            return
+        try:
+            if self.fileLock:
+                self.fileLock.lockRange(AccountLocks._offset(accountNumber))
+        except Exception:
+            lock.release()
+            raise
+        self.depths[accountNumber] = 1
+
+    def _release(self, accountNumber):
+        """ Undo one _acquire """
+        self.depths[accountNumber] -= 1
+        if self.depths[accountNumber] == 0:
+            del self.depths[accountNumber]
+            if self.fileLock:
+                self.fileLock.unlockRange(AccountLocks._offset(accountNumber))
+        self.lockFor(accountNumber).release()
+
+    @contextmanager
+    def hold(self, *accountNumbers):
+        """ Hold the locks of the given accounts for the duration of a with block """
+        numbers = sorted({str(number) for number in accountNumbers})
+        taken = []
+        try:
+            for accountNumber in numbers:
+                self._acquire(accountNumber)
+                taken.append(accountNumber)
+            yield
+        finally:
+            for accountNumber in reversed(taken):
+                self._release(accountNumber)
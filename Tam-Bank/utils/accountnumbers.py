@@ -0,0 +1,90 @@
+import threading
+from utils.config import Config
+from utils.filelock import FileLock
+from utils.atomicfile import AtomicFile
+
+class AccountNumberAllocator:
+    """ Hands out account numbers from a persisted sequence instead of drawing random numbers until one is free.
+        stateFile holds the last number handed out, so allocation is a read, an increment and a write. """
+    stateFile = "Tam-Bank/userinfo/account_number.state"
+
+    # earlier versions drew account numbers at random up to here, the sequence starts after them
+    legacyMax = 20230000
+    maxNumber = 99999999
+
+    # shared by every allocator in the process since they all use the same state file
+    lock = threading.Lock()
+
+    def __init__(self, stateFile=None, checkDigit=None, exists=None):
+        """ exists is an optional callable telling if an account number is already taken, those are skipped """
+        self.stateFile = stateFile or AccountNumberAllocator.stateFile
+        self.checkDigit = Config.accountCheckDigit if checkDigit is None else checkDigit
+        self.exists = exists
+        # other processes allocate from the same state file
+        self.fileLock = FileLock(self.stateFile + ".lock")
+
+    def _readLast(self):
+        """ Last account number handed out """
+        try:
+            with open(self.stateFile, "r") as file:
+                return max(int(file.read().strip() or 0), AccountNumberAllocator.legacyMax)
+        except FileNotFoundError:
+            return AccountNumberAllocator.legacyMax
+        except ValueError as e:
+            print(f"Error reading account number state: {e}")
+            raise
+
+    def _writeLast(self, last):
+        """ Persist the last account number handed out, replacing the state file atomically """
+        # always durable whatever the configured mode, numbers must never be handed out twice after a crash
+        with AtomicFile(self.stateFile, durability="always") as file:
+            file.write(str(last))
+
+    @staticmethod
+    def luhnDigit(base):
+        """ Luhn check digit for a number """
+        total = 0
+        for position, digit in enumerate(reversed(str(base))):
+            digit = int(digit)
+            if position % 2 == 0:
+                digit *= 2
+                if digit > 9:
+                    digit -= 9
+            total += digit
+        return (10 - total % 10) % 10
+
+    @staticmethod
+    def isValid(accountNumber):
+        """ Check the last digit of an account number allocated with check digits """
+        accountNumber = str(accountNumber)
+        if not accountNumber.isdigit() or len(accountNumber) < 2:
+            return False
+        return AccountNumberAllocator.luhnDigit(accountNumber[:-1]) == int(accountNumber[-1])
+
+    def _nextAfter(self, last):
+        """ Account number that follows last in the sequence """
+        if not self.checkDigit:
+            return last + 1
+        base = last // 10 + 1
+        return base * 10 + AccountNumberAllocator.luhnDigit(base)
+
+    def allocate(self):
+        """ Allocate one account number """
+        return self.reserve(1)[0]
+
+    def reserve(self, count):
+        """ Allocate count account numbers at once with a single write of the state file """
+        with AccountNumberAllocator.lock, self.fileLock:
+            last = self._readLast()
+            numbers = []
+            while len(numbers) < count:
+                last = self._nextAfter(last)
+                if last > AccountNumberAllocator.maxNumber:
+                    raise ValueError("No account numbers left to allocate")
+                # numbers an admin gave to an account by hand are skipped
+                if self.exists and self.exists(str(last)):
+                    continue
+                numbers.append(str(last))
+
+            self._writeLast(last)
+            return numbers
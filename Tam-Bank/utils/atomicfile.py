@@ -0,0 +1,119 @@
+import os
+import time
+import atexit
+import threading
+from utils.config import Config
+
+class AtomicFile:
+    """ Rewrite a whole file without ever leaving it half written. Used as a with statement it hands out a
+        temporary file next to the target, which replaces the target with a rename once the block ends without
+        an error. A crash during the write leaves the original untouched. Text mode unless binary is set.
+        How the new contents reach the disk follows the durability mode:
+        "always"  fsyncs the file before the rename and its directory after it, durable once the block ends
+        "batched" fsyncs the file before the rename, so a crash never leaves it torn, and syncs the directories
+                  in the background at most every durabilityInterval seconds, a power loss may roll back the
+                  rewrites of the last interval
+        "async"   only renames, which survives the process crashing but leaves flushing to the operating system """
+    modes = ("always", "batched", "async")
+
+    # directories with renames that still have to be synced in batched mode, and the thread syncing them
+    pending = set()
+    condition = threading.Condition()
+    syncer = None
+
+    def __init__(self, path, newline='', durability=None, binary=False):
+        self.path = path
+        self.newline = newline
+        self.binary = binary
+        durability = durability or Config.durability
+        self.durability = durability if durability in AtomicFile.modes else "always"
+        # unique per thread and process, so concurrent writers never share a temporary file
+        self.tempFile = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.file = None
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.binary:
+            self.file = open(self.tempFile, 'wb')
+        else:
+            self.file = open(self.tempFile, 'w', newline=self.newline)
+        return self.file
+
+    def __exit__(self, excType, excValue, traceback):
+        try:
+            if excType is None:
+                self.file.flush()
+                if self.durability != "async":
+                    os.fsync(self.file.fileno())
+            self.file.close()
+            if excType is None:
+                os.replace(self.tempFile, self.path)
+        except Exception:
+            AtomicFile._remove(self.tempFile)
+            raise
+        if excType is not None:
+            AtomicFile._remove(self.tempFile)
+            return False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if self.durability == "always":
+            AtomicFile.syncDirectory(directory)
+        elif self.durability == "batched":
+            AtomicFile._schedule(directory)
+        return False
+
+    @staticmethod
+    def _remove(path):
+        """ Delete a leftover temporary file """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def syncDirectory(directory):
+        """ Make the renames in a directory durable, Windows cannot open directories and commits renames itself """
+        if os.name == 'nt':
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _schedule(directory):
+        """ Queue a directory for the background syncer, starting it on first use """
+        with AtomicFile.condition:
+            AtomicFile.pending.add(directory)
+            if AtomicFile.syncer is None:
+                AtomicFile.syncer = threading.Thread(target=AtomicFile._run, name="AtomicFileSyncer", daemon=True)
+                AtomicFile.syncer.start()
+                # renames made in the last interval are still synced on exit
+                atexit.register(AtomicFile.flush)
+            AtomicFile.condition.notify_all()
+
+    @staticmethod
+    def _run():
+        """ Syncer thread: sync the queued directories once per interval, however many renames each one had """
+        while True:
+            with AtomicFile.condition:
+                while not AtomicFile.pending:
+                    AtomicFile.condition.wait()
+            # let the renames of the interval pile up
+            time.sleep(Config.durabilityInterval)
+            AtomicFile.flush()
+
+    @staticmethod
+    def flush():
+        """ Sync every directory queued in batched mode now """
+        with AtomicFile.condition:
+            directories = list(AtomicFile.pending)
+            AtomicFile.pending.clear()
+        for directory in directories:
+            try:
+                AtomicFile.syncDirectory(directory)
+            except OSError as e:
+                print(f"Error syncing {directory}: {e}")
@@ -0,0 +1,34 @@
+import os
+
+class Config:
+    """ Application settings, each one can be overridden with an environment variable """
+    # storage backend used by TamBank, either "csv" or "sqlite"
+    storageBackend = os.environ.get("TAMBANK_STORAGE", "csv").lower()
+
+    # database file used by the sqlite backend
+    databaseFile = os.environ.get("TAMBANK_DB", "Tam-Bank/userinfo/tambank.db")
+
+    # append a Luhn check digit to newly allocated account numbers
+    accountCheckDigit = os.environ.get("TAMBANK_ACCOUNT_CHECK_DIGIT", "0").lower() in ("1", "true", "yes")
+
+    # number of accounts whose transaction history is kept in memory at once
+    transactionCacheSize = int(os.environ.get("TAMBANK_TRANSACTION_CACHE", "256"))
+
+    # ledger group commit: rows written per group, longest a row waits for its group in seconds,
+    # and whether each group is fsynced before its callers are acknowledged
+    ledgerGroupSize = int(os.environ.get("TAMBANK_LEDGER_GROUP_SIZE", "256"))
+    ledgerGroupDelay = float(os.environ.get("TAMBANK_LEDGER_GROUP_DELAY", "0"))
+    ledgerFsync = os.environ.get("TAMBANK_LEDGER_FSYNC", "0").lower() in ("1", "true", "yes")
+
+    # how whole-file rewrites of the .csv files reach the disk, "always", "batched" or "async" (see AtomicFile),
+    # and how often batched mode syncs the directories of the renamed files in seconds
+    durability = os.environ.get("TAMBANK_DURABILITY", "always").lower()
+    durabilityInterval = float(os.environ.get("TAMBANK_DURABILITY_INTERVAL", "1"))
+
+    # postings applied in memory by TamBank.postMany before the ledger and the balances are written
+    bulkBatchSize = int(os.environ.get("TAMBANK_BULK_BATCH", "10000"))
+
+    # ledger partitions of months that ended more than this many months ago are compressed into archives by
+    # archive.py, with "zlib" or "lzma"
+    ledgerArchiveMonths = int(os.environ.get("TAMBANK_LEDGER_ARCHIVE_MONTHS", "12"))
+    ledgerArchiveCodec = os.environ.get("TAMBANK_LEDGER_ARCHIVE_CODEC", "zlib").lower()
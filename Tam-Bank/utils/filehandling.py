@@ -1,54 +1,112 @@
 import os
 import csv
 from datetime import datetime
+from utils.money import Money
+from utils.atomicfile import AtomicFile
+from storage.ledgerschema import LedgerSchema
 
 class FileHandling:
     """ File handling of details to .csv files with enhanced account type storage """
     applicationFile = "Tam-Bank/userinfo/applications.csv"
     accountFile = "Tam-Bank/userinfo/accounts.csv"
     transactionFile = "Tam-Bank/userinfo/transactions.csv"
+    # ledger repository the transaction helpers read and append through, TamBank sets its own so the helpers
+    # share its locks and its storage backend
+    ledger = None
     
     minBal = 50.0
 
+    accountHeader = [
+        "Account Number", "First Name", "Last Name", "Mobile Number", 
+        "Email", "Balance", "Date Opened", "Status", "Password Hash", "Account Type"
+    ]
+
+    @staticmethod
+    def accountToRow(account):
+        """ Convert an account into its .csv row """
+        # Format the date to string for consistency
+        formattedDate = account.dateOpened.strftime('%Y-%m-%d %H:%M:%S')
+        
+        passHash = account.passHash if hasattr(account, 'passHash') else ""
+        
+        # Get account type with fallback to "Savings" if not present
+        accountType = getattr(account, 'accountType', "Savings")
+        
+        return [
+            account.accountNumber, account.fName, account.lName, 
+            account.mobileNo, account.email, Money.format(account.cents), 
+            formattedDate, account.status, passHash, accountType
+        ]
+
+    @staticmethod
+    def accountFromRow(row, col=None):
+        """ Build an account object from a .csv row, col maps the header names to their index """
+        from models.account import Account
+
+        cents = 0
+        try:
+            if row[5] not in (None, ""):
+                cents = Money.toCents(row[5])
+        except (ValueError, IndexError):
+            pass
+
+        # Extract password hash if available
+        passHash = row[8] if len(row) > 8 else None
+        
+        accountType = "Savings"  # Default value
+        typeIndex = col.get("Account Type") if col is not None else FileHandling.accountHeader.index("Account Type")
+        if typeIndex is not None and len(row) > typeIndex:
+            accountType = row[typeIndex] or "Savings"
+        
+        # Create account object
+        account = Account(
+            accountNumber=row[0], 
+            fName=row[1], 
+            lName=row[2], 
+            mobileNo=row[3], 
+            email=row[4],
+            passHash=passHash
+        )
+        
+        # the balance is set afterwards so loading an account does not record an initial deposit
+        account.cents = cents
+
+        # Set account type
+        account.accountType = accountType
+
+        # Parse date
+        dateStr = row[6]
+        account.dateOpened = LedgerSchema.parseDate(dateStr)
+        if account.dateOpened is None:
+            # Fallback to current time if date parsing fails
+            account.dateOpened = datetime.now()
+            print(f"Warning: Could not parse date '{dateStr}', using current time")
+        
+        # Set account status
+        account.status = row[7]
+        return account
+
     @staticmethod
     def saveFile(accountList):
         """ Save the account details to the .csv file with account type """
         try:
-            # Check if path exists, if path does not exist, create the directory.
-            os.makedirs(os.path.dirname(FileHandling.accountFile), exist_ok=True)
-            
-            with open(FileHandling.accountFile, "w", newline='') as csvfile:
+            # written to a temporary file that replaces accounts.csv, a crash mid-write keeps the old snapshot
+            with AtomicFile(FileHandling.accountFile) as csvfile:
                 save = csv.writer(csvfile)
                 # write the header
-                save.writerow([
-                    "Account Number", "First Name", "Last Name", "Mobile Number", 
-                    "Email", "Balance", "Date Opened", "Status", "Password Hash", "Account Type"
-                ])
+                save.writerow(FileHandling.accountHeader)
 
                 for account in accountList:
-                    # Format the date to string for consistency
-                    formattedDate = account.dateOpened.strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    passHash = account.passHash if hasattr(account, 'passHash') else ""
-                    
-                    # Get account type with fallback to "Savings" if not present
-                    accountType = getattr(account, 'accountType', "Savings")
-                    
                     # Write row with account type
-                    save.writerow([
-                        account.accountNumber, account.fName, account.lName, 
-                        account.mobileNo, account.email, account.balance, 
-                        formattedDate, account.status, passHash, accountType
-                    ])
+                    save.writerow(FileHandling.accountToRow(account))
             
             return True, f"Accounts saved to {FileHandling.accountFile}"
         except Exception as e:
             return False, f"Error saving accounts to {FileHandling.accountFile}: {e}"
 
     @staticmethod
-    def loadFile():
-        """ Load the account details from the .csv file with account type """
-        from models.account import Account
+    def loadFile(withTransactions=True):
+        """ Load the account details from the .csv file with account type, optionally attaching each account's transactions """
         accounts = []
 
         # Return empty list if file doesn't exist
@@ -71,57 +129,21 @@ class FileHandling:
                         continue
                         
                     try:
-                        initialBal = 0.0
-                        try:
-                            if row[5]:
-                                initialBal = float(row[5])
-                        except (ValueError, IndexError):
-                            pass
-
-                        # Extract password hash if available
-                        passHash = row[8] if len(row) > 8 else None
-                        
-                        accountType = "Savings"  # Default value
-                        typeIndex = col.get("Account Type")
-                        if typeIndex is not None and len(row) > typeIndex:
-                            accountType = row[typeIndex] or "Savings"
-                        
-                        # Create account object
-                        account = Account(
-                            accountNumber=row[0], 
-                            fName=row[1], 
-                            lName=row[2], 
-                            initialBal=initialBal,
-                            mobileNo=row[3], 
-                            email=row[4],
-                            passHash=passHash
-                        )
-                        
-                        # Set account type
-                        account.accountType = accountType
-
-                        # Parse date
-                        dateStr = row[6]
-                        try:
-                            account.dateOpened = datetime.strptime(dateStr, '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            try:
-                                account.dateOpened = datetime.strptime(dateStr, '%Y-%m-%d')
-                            except ValueError:
-                                # Fallback to current time if date parsing fails
-                                account.dateOpened = datetime.now()
-                                print(f"Warning: Could not parse date '{dateStr}', using current time")
-                        
-                        # Set account status
-                        account.status = row[7]
-                        
-                        # Load transactions
-                        account.transactions = FileHandling.loadTransactions(account.accountNumber)
+                        account = FileHandling.accountFromRow(row, col)
                         
                         # Add to accounts list
                         accounts.append(account)
                     except Exception as e:
                         print(f"Error processing account row {row}: {e}")
+
+            # Load transactions, the whole ledger is read once instead of re-scanning it for every account
+            if withTransactions:
+                ledger = FileHandling.loadAllTransactions({account.accountNumber for account in accounts})
+                for account in accounts:
+                    history = ledger.get(account.accountNumber)
+                    if history is not None:
+                        history.fillBalances(account.cents)
+                    account.transactions = history if history is not None else []
             return accounts
         except Exception as e:
             print(f"Error loading accounts: {e}")
@@ -129,85 +151,90 @@ class FileHandling:
     
     @staticmethod
     def saveTransactions(accountNumber, transactions):
-        """ Save the transactions to the .csv file """
+        """ Append transactions in the Account.transactions format to the ledger, money going out is recorded as
+            sent to CASH the way withdrawals are """
         try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(FileHandling.transactionFile), exist_ok=True)
-            
-            # Check if file exists
-            fileExists = os.path.exists(FileHandling.transactionFile) and os.path.getsize(FileHandling.transactionFile) > 0
-            
-            with open(FileHandling.transactionFile, "a", newline='') as csvfile:
-                save = csv.writer(csvfile)
-                if not fileExists:
-                    save.writerow(["Account Number", "Date", "Description", "Amount", "Balance"])
-                
-                for transaction in transactions:
-                    accNum = transaction.get('accountNumber', accountNumber)
-                    formattedDate = transaction['date'].strftime('%Y-%m-%d %H:%M:%S')
-                    save.writerow([accNum, formattedDate, transaction['description'], 
-                                  transaction['amount'], transaction['balance']])
+            from utils.transacid import TransactionIdGenerator
+
+            transacIds = TransactionIdGenerator()
+            rows = []
+            for transaction in transactions:
+                accNum = transaction.get('accountNumber', accountNumber)
+                cents = Money.toCents(transaction['amount'])
+                rows.append({
+                    'transacId': transacIds.next(), 'date': transaction['date'], 'from_account': accNum,
+                    'to_account': accNum if cents >= 0 else "CASH", 'amount': abs(cents),
+                    'description': transaction['description']
+                })
+
+            FileHandling._ledger().appendMany(rows)
             return True
         except Exception as e:
-            print(f"Error saving transactions to {FileHandling.transactionFile}: {e}")
+            print(f"Error saving transactions to the ledger: {e}")
             return False
 
+    @staticmethod
+    def _ledger():
+        """ The ledger repository of the configured backend, created once when TamBank did not set one """
+        if FileHandling.ledger is None:
+            from storage.repository import createRepositories
+            FileHandling.ledger = createRepositories()[1]
+        return FileHandling.ledger
+
+    @staticmethod
+    def _addHistoryRow(history, row, accountNumber):
+        """ Add a ledger row to a TransactionHistory in cents, its running balance is filled in afterwards """
+        history.appendCents(row['date'] or datetime.now(), row['description'],
+                            LedgerSchema.signedAmount(row, accountNumber))
+
     @staticmethod
     def loadTransactions(accountNumber):
-        """Load transactions for a specific account"""
-        transactions = []
-        if not os.path.exists(FileHandling.transactionFile):
-            return transactions
-        
-        try:
-            with open(FileHandling.transactionFile, 'r', newline='') as csvfile:
-                reader = csv.reader(csvfile)
-                header = next(reader, None)
-                if not header:
-                    return transactions
-                
-                cols = {name: i for i, name in enumerate(header)}
-                accIdx = cols.get("Account Number", 0)
-                dateIdx = cols.get("Date", 1)
-                descIdx = cols.get("Description", 2)
-                amtIdx = cols.get("Amount", 3)
-                balIdx = cols.get("Balance", 4)
+        """Load transactions for a specific account, as a TransactionHistory"""
+        from models.transactionhistory import TransactionHistory
 
-                for row in reader:
-                    # Skip processing if row is too short
-                    if len(row) <= max(accIdx, dateIdx, descIdx, amtIdx, balIdx):
-                        continue
-                        
-                    # Only process transactions for the specified account
-                    if row[accIdx] == accountNumber:
-                        try:
-                            # Parse date
-                            dateStr = row[dateIdx]
-                            try:
-                                trans_date = datetime.strptime(dateStr, '%Y-%m-%d %H:%M:%S.%f')
-                            except ValueError:
-                                try:
-                                    trans_date = datetime.strptime(dateStr, '%Y-%m-%d %H:%M:%S')
-                                except ValueError:
-                                    # Fallback to current time
-                                    trans_date = datetime.now()
-                            
-                            # Construct transaction dictionary
-                            transaction = {
-                                'date': trans_date,
-                                'description': row[descIdx],
-                                'amount': float(row[amtIdx]),
-                                'balance': float(row[balIdx]),
-                                'accountNumber': accountNumber
-                            }
-                            transactions.append(transaction)
-                        except Exception as e:
-                            print(f"Error processing transaction row {row}: {e}")
+        transactions = TransactionHistory(accountNumber)
+        try:
+            for row in FileHandling._ledger().forAccount(accountNumber):
+                FileHandling._addHistoryRow(transactions, row, accountNumber)
             return transactions
         except Exception as e:
             print(f"Error loading transactions: {e}")
             return []
+
+    @staticmethod
+    def loadAllTransactions(accountNumbers=None):
+        """ Load the transactions of every account in a single pass over the ledger partitions, a TransactionHistory
+            by account number. accountNumbers optionally limits the result to a set of known accounts. """
+        from models.transactionhistory import TransactionHistory
+
+        grouped = {}
+        try:
+            for row in FileHandling._ledgerRows(accountNumbers):
+                fromAccount, toAccount = row['from_account'], row['to_account']
+                for accountNumber in ((fromAccount,) if fromAccount == toAccount else (fromAccount, toAccount)):
+                    if accountNumbers is not None and accountNumber not in accountNumbers:
+                        continue
+                    # Bucket the row under its account so each account gets its list without another scan
+                    bucket = grouped.get(accountNumber)
+                    if bucket is None:
+                        bucket = grouped[accountNumber] = TransactionHistory(accountNumber)
+                    FileHandling._addHistoryRow(bucket, row, accountNumber)
+            return grouped
+        except Exception as e:
+            print(f"Error loading transactions: {e}")
+            return {}
     
+    @staticmethod
+    def _ledgerRows(accountNumbers=None):
+        """ Iterate over the ledger rows, a partitioned ledger skips the rows of other accounts before they are decoded """
+        ledger = FileHandling._ledger()
+        if not hasattr(ledger, 'readers'):
+            yield from ledger.scan()
+            return
+        for reader in ledger.readers():
+            with reader as scanner:
+                yield from scanner.rowsOfAccounts(accountNumbers)
+
     @staticmethod
     def saveApplication(fName, lName, mobileNo, email, initialBal, bankType):
         """Save a new application to the applications.csv file"""
@@ -297,8 +324,8 @@ class FileHandling:
             return []
     
     @staticmethod
-    def updateApplicationStatus(applicationId, newStatus):
-        """Update the status of an application (Pending, Accepted, Declined)"""
+    def updateApplicationStatus(applicationId, newStatus, expectedStatus=None):
+        """Update the status of an application (Pending, Accepted, Declined), only if it still has expectedStatus when one is given"""
         # Input validation
         if not applicationId:
             return False, "Invalid application ID"
@@ -320,6 +347,9 @@ class FileHandling:
                 
                 for row in reader:
                     if row['Application ID'] == applicationId:
+                        # another admin may have handled the application since it was read
+                        if expectedStatus is not None and row['Status'] != expectedStatus:
+                            return False, f"Application {applicationId} was already marked {row['Status']}"
                         row['Status'] = newStatus
                         updated = True
                     applications.append(row)
@@ -328,7 +358,7 @@ class FileHandling:
                 return False, f"Application with ID {applicationId} not found"
                 
             # Write back to file
-            with open(FileHandling.applicationFile, "w", newline='') as csvfile:
+            with AtomicFile(FileHandling.applicationFile) as csvfile:
                 writer = csv.DictWriter(csvfile, fieldnames=headers)
                 writer.writeheader()
                 writer.writerows(applications)
@@ -0,0 +1,134 @@
+import os
+import time
+import errno
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """ Advisory lock shared by the TamBank processes working on the same files, and by the threads of this one.
+        Used as a with statement it is an exclusive lock, reentrant for the thread holding it. The lock file
+        also holds a generation counter that writers bump, so a process can tell that a store it keeps in memory
+        was changed by another process. lockRange/unlockRange lock single bytes of the file, one per record. """
+
+    # byte locked for the whole file on Windows, where locked bytes cannot be read by other processes
+    # and the generation counter is kept at the start of the file
+    wholeFileOffset = 2 ** 31 - 2
+
+    # seconds before taking a byte again after the kernel reported a false deadlock
+    deadlockRetryDelay = 0.001
+
+    def __init__(self, path):
+        self.path = path
+        self.threadLock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+        # Windows locks bytes at the file position, which the threads share
+        self.seekLock = threading.Lock()
+
+    def _open(self):
+        """ File descriptor of the lock file, opened once and kept for the life of the process """
+        if self.fd is None:
+            with self.seekLock:
+                if self.fd is None:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self.fd
+
+    def _lockByte(self, offset, exclusive=True):
+        """ Lock or unlock one byte of the lock file for this process, blocking until it is free """
+        fd = self._open()
+        if fcntl:
+            while True:
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN, 1, offset)
+                    return
+                except OSError as e:
+                    # the kernel tracks byte locks per process, so two processes whose threads wait on each
+                    # other's bytes look deadlocked even though the threads take the bytes in order
+                    if e.errno != errno.EDEADLK:
+                        raise
+                    time.sleep(FileLock.deadlockRetryDelay)
+        with self.seekLock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK if exclusive else msvcrt.LK_UNLCK, 1)
+
+    def acquire(self):
+        """ Take the lock, waiting for other threads and other processes """
+        self.threadLock.acquire()
+        if self.depth == 0:
+            try:
+                if fcntl:
+                    fcntl.flock(self._open(), fcntl.LOCK_EX)
+                else:
+                    self._lockByte(FileLock.wholeFileOffset)
+            except Exception:
+                self.threadLock.release()
+                raise
+        self.depth += 1
+
+    def release(self):
+        """ Give the lock back, other processes can take it once the outermost with block ends """
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                self._lockByte(FileLock.wholeFileOffset, exclusive=False)
+        self.threadLock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
+        return False
+
+    def lockRange(self, offset):
+        """ Lock the byte at offset against other processes, threads of this process are not excluded """
+        self._lockByte(offset)
+
+    def unlockRange(self, offset):
+        """ Release a byte locked with lockRange """
+        self._lockByte(offset, exclusive=False)
+
+    def generation(self):
+        """ Generation counter of the store, 0 until a writer bumps it """
+        fd = self._open()
+        with self.seekLock:
+            os.lseek(fd, 0, os.SEEK_SET)
+            data = os.read(fd, 32)
+        try:
+            return int(data.decode('ascii').strip() or 0)
+        except ValueError:
+            return 0
+
+    def bump(self):
+        """ Increment the generation counter, called by writers while they hold the lock """
+        generation = self.generation() + 1
+        fd = self._open()
+        with self.seekLock:
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, str(generation).encode('ascii'))
+            os.ftruncate(fd, len(str(generation)))
+        return generation
+
+    def close(self):
+        """ Close the lock file, releasing every lock this process holds on it """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,159 @@
+import os
+import io
+import csv
+from datetime import datetime
+from utils.filehandling import FileHandling
+from utils.money import Money
+
+class AccountJournal:
+    """ Append-only journal of account changes that gets compacted back into accounts.csv """
+    journalFile = "Tam-Bank/userinfo/accounts_journal.csv"
+
+    # number of journal entries allowed before the snapshot is rewritten
+    compactThreshold = 1000
+
+    # account attributes that can be journaled and how to read them back
+    fields = {
+        'balance': Money.parse,
+        'status': str,
+        'fName': str,
+        'lName': str,
+        'mobileNo': str,
+        'email': str,
+        'passHash': str,
+        'accountType': str
+    }
+    # the balance is written as the exact decimal of its cents and read back into cents, it never goes through
+    # a float. Journals written with float balances read back the same way.
+    writers = {'balance': lambda account: Money.format(account.cents)}
+    attributes = {'balance': 'cents'}
+
+    def __init__(self, journalFile=None):
+        """ Initialize the journal, entries counts the rows written since the last compaction and offset is the
+            number of bytes of the journal file already applied """
+        self.journalFile = journalFile or AccountJournal.journalFile
+        self.entries = 0
+        self.offset = 0
+
+    def _size(self):
+        """ Size of the journal file, 0 if there is none """
+        try:
+            return os.path.getsize(self.journalFile)
+        except OSError:
+            return 0
+
+    def _append(self, rows):
+        """ Append rows to the journal file """
+        os.makedirs(os.path.dirname(self.journalFile), exist_ok=True)
+        caughtUp = self._size() == self.offset
+        with open(self.journalFile, "a", newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerows(rows)
+        self.entries += len(rows)
+        # our own rows are already applied, unless other processes appended rows before them that are not
+        if caughtUp:
+            self.offset = self._size()
+
+    def _readRows(self, start):
+        """ Rows of the journal from the byte offset start up to its last complete line, and the offset after them """
+        with open(self.journalFile, "rb") as file:
+            file.seek(start)
+            data = file.read()
+        end = data.rfind(b"\n") + 1
+        return list(csv.reader(io.StringIO(data[:end].decode('utf-8'), newline=''))), start + end
+
+    def _apply(self, accounts, row, skip=None):
+        """ Apply one journal row to a dictionary of accounts, returns the account number it changed.
+            With skip the accounts are already in memory: the ones in skip are left alone and creates only add
+            accounts that are missing. """
+        if len(row) < 3:
+            return None
+        self.entries += 1
+
+        operation = row[1]
+        try:
+            if operation == 'create':
+                if skip is not None and (row[2] in skip or row[2] in accounts):
+                    return None
+                account = FileHandling.accountFromRow(row[2:])
+                accounts[account.accountNumber] = account
+                return account.accountNumber
+            elif operation == 'set' and len(row) >= 5:
+                # values are stored as the state after the change, so replaying twice is harmless
+                account = accounts.get(row[2])
+                parse = AccountJournal.fields.get(row[3])
+                if account and parse and (skip is None or row[2] not in skip):
+                    setattr(account, AccountJournal.attributes.get(row[3], row[3]), parse(row[4]))
+                    return row[2]
+        except Exception as e:
+            print(f"Error replaying journal row {row}: {e}")
+        return None
+
+    def recordCreate(self, account):
+        """ Record a newly created account with all of its details """
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._append([[timestamp, 'create'] + FileHandling.accountToRow(account)])
+
+    def recordChange(self, account, *fieldNames):
+        """ Record the new value of each changed field of an account """
+        self.recordChanges([account], *fieldNames)
+
+    def recordChanges(self, accounts, *fieldNames):
+        """ Record the changed fields of many accounts with a single append """
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for field in fieldNames:
+            if field not in AccountJournal.fields:
+                raise ValueError(f"Field {field} cannot be journaled")
+        rows = []
+        for account in accounts:
+            for field in fieldNames:
+                writer = AccountJournal.writers.get(field)
+                value = writer(account) if writer else getattr(account, field)
+                rows.append([timestamp, 'set', account.accountNumber, field, value])
+        self._append(rows)
+
+    def replay(self, accounts):
+        """ Apply the journal on top of the accounts loaded from the snapshot, returns the number of entries applied """
+        self.entries = 0
+        self.offset = 0
+        if not os.path.exists(self.journalFile):
+            return 0
+
+        try:
+            rows, self.offset = self._readRows(0)
+            for row in rows:
+                self._apply(accounts, row)
+        except Exception as e:
+            print(f"Error loading account journal: {e}")
+
+        return self.entries
+
+    def replayTail(self, accounts, skip=()):
+        """ Apply the rows other processes appended since the last replay to accounts already in memory, leaving
+            the accounts in skip alone. Returns the account numbers changed, or None if the journal was cleared
+            and the accounts have to be loaded again. """
+        if self._size() < self.offset:
+            return None
+        changed = set()
+        rows, self.offset = self._readRows(self.offset) if self.offset < self._size() else ([], self.offset)
+        for row in rows:
+            accountNumber = self._apply(accounts, row, set(skip))
+            if accountNumber:
+                changed.add(accountNumber)
+        return changed
+
+    def needsCompaction(self):
+        """ Check if the journal has grown enough to be folded back into the snapshot """
+        return self.entries >= AccountJournal.compactThreshold
+
+    def clear(self):
+        """ Empty the journal after the snapshot has been rewritten """
+        try:
+            if os.path.exists(self.journalFile):
+                os.remove(self.journalFile)
+            self.entries = 0
+            self.offset = 0
+            return True
+        except Exception as e:
+            print(f"Error clearing account journal: {e}")
+            return False
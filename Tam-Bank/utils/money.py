@@ -0,0 +1,47 @@
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+class Money:
+    """ Fixed point money helpers, amounts are kept as integer cents so sums and comparisons are exact """
+
+    @staticmethod
+    def parse(text):
+        """ Parse a decimal string like "1234.5" or "-0.07" into cents, rounding half up past two decimals """
+        text = str(text).strip()
+        whole, dot, fraction = text.partition('.')
+        digits = whole.lstrip('+-')
+
+        # plain "123", "123.4" and "123.45" are handled with int(), anything else goes through Decimal
+        plain = (len(whole) - len(digits) <= 1 and (digits.isdigit() or (dot and not digits and fraction))
+                 and len(fraction) <= 2 and (not fraction or fraction.isdigit()))
+        if plain:
+            cents = int(digits or "0") * 100 + int((fraction + "00")[:2])
+            return -cents if whole.startswith('-') else cents
+
+        try:
+            return int((Decimal(text) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {text!r}")
+
+    @staticmethod
+    def toCents(value):
+        """ Convert an amount in pesos (str, int, float or Decimal) into cents """
+        if isinstance(value, str):
+            return Money.parse(value)
+        if isinstance(value, int):
+            return value * 100
+        if isinstance(value, Decimal):
+            return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        # floats go through their shortest repr, so 0.1 + 0.2 becomes 30 cents and not 30.000000000000004
+        return Money.parse(repr(round(float(value), 2)))
+
+    @staticmethod
+    def format(cents):
+        """ Plain decimal string of cents with two decimals, the form written to the .csv files """
+        sign = "-" if cents < 0 else ""
+        whole, fraction = divmod(abs(int(cents)), 100)
+        return f"{sign}{whole}.{fraction:02d}"
+
+    @staticmethod
+    def toUnits(cents):
+        """ Cents as a float amount in pesos, for display and for callers that expect floats """
+        return cents / 100
@@ -0,0 +1,82 @@
+import time
+import threading
+from utils.filelock import FileLock
+from utils.atomicfile import AtomicFile
+
+class TransactionIdGenerator:
+    """ Time ordered transaction IDs in the style of Snowflake IDs: milliseconds since epoch followed by a
+        per-millisecond sequence. IDs are zero padded to a fixed width so sorting them as text matches their order.
+        The generator leases a window of future milliseconds in stateFile, so after a restart, or when the clock
+        goes backwards, it continues above every ID it may have handed out before. Processes sharing the state file
+        lease disjoint windows: one that finds a newer lease written by another process continues above it, so IDs
+        may run ahead of the clock by a few leases while several processes allocate at once. """
+    stateFile = "Tam-Bank/userinfo/transac_id.state"
+
+    # 2024-01-01 00:00:00 UTC in milliseconds
+    epoch = 1704067200000
+    sequenceBits = 12
+    width = 19
+
+    # milliseconds reserved in the state file at a time
+    leaseMs = 5000
+
+    def __init__(self, stateFile=None):
+        self.stateFile = stateFile or TransactionIdGenerator.stateFile
+        self.lock = threading.Lock()
+        self.fileLock = FileLock(self.stateFile + ".lock")
+        self.lease = self._readLease()
+        # every ID issued by an earlier run is below the start of its lease
+        self.lastId = (self.lease << TransactionIdGenerator.sequenceBits) - 1
+
+    def _readLease(self):
+        """ Read the leased millisecond from the state file, 0 if there is none """
+        try:
+            with open(self.stateFile, "r") as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError as e:
+            print(f"Error reading transaction ID state, starting from the clock: {e}")
+            return 0
+
+    def _writeLease(self, lease):
+        """ Persist a new lease, replacing the state file atomically """
+        # always durable whatever the configured mode, numbers must never be handed out twice after a crash
+        with AtomicFile(self.stateFile, durability="always") as file:
+            file.write(str(lease))
+        self.lease = lease
+
+    def nextId(self):
+        """ Allocate the next ID as an integer """
+        with self.lock:
+            now = int(time.time() * 1000) - TransactionIdGenerator.epoch
+            # the sequence borrows from the next millisecond when it runs out, the clock catches up later
+            transacId = max(now << TransactionIdGenerator.sequenceBits, self.lastId + 1)
+            millisecond = transacId >> TransactionIdGenerator.sequenceBits
+
+            if millisecond >= self.lease:
+                with self.fileLock:
+                    # another process may have leased the window after ours, its IDs are not ours to hand out
+                    leased = self._readLease()
+                    if leased > self.lease:
+                        transacId = max(transacId, leased << TransactionIdGenerator.sequenceBits)
+                        millisecond = transacId >> TransactionIdGenerator.sequenceBits
+                    self._writeLease(millisecond + TransactionIdGenerator.leaseMs)
+
+            self.lastId = transacId
+            return transacId
+
+    def next(self):
+        """ Allocate the next ID in its fixed width text form """
+        return TransactionIdGenerator.format(self.nextId())
+
+    @staticmethod
+    def format(transacId):
+        """ Text form of an ID as stored in the ledger """
+        return str(transacId).zfill(TransactionIdGenerator.width)
+
+    @staticmethod
+    def timestamp(transacId):
+        """ Time in seconds since the Unix epoch encoded in an ID, at most leaseMs ahead of when it was allocated """
+        millisecond = int(transacId) >> TransactionIdGenerator.sequenceBits
+        return (millisecond + TransactionIdGenerator.epoch) / 1000